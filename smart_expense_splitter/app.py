@@ -1,67 +1,215 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import Flask, Blueprint, Response, current_app, g, render_template, request, redirect, url_for, session, flash, send_file, abort, jsonify
 from functools import wraps
 from models import User, Expense, Budget, ExpenseGroup
-from storage import load_group, save_group
+from storage import load_group, save_group, save_header, user_in_other_partitions, changes_since, TenantLock
+from indexes import (partition_index, store_partition_index, user_index, duplicate_index, store_duplicate_index,
+                     near_duplicate_pairs)
 from models import User, Group
 from splitter import calculate_balances, settle_debts
-from auth import register_user, verify_user, user_exists
+from auth import UserStore, TelemetryBuffer, register_user, verify_user, user_exists
+from hashing import PasswordHasher
+from config import app_config
+from decorators import rate_limit, idempotent
+from idempotency import IdempotencyStore, new_key
+from ratelimit import create_backend
+import metrics
+import assets
+import compression
+from pagecache import PageCache, cached_page
+from downsample import downsample, GRANULARITIES
+from live import EventLog, EventHub, stream_events
+from localstore import get_store
+from logging_setup import setup_logging
+from utils import file_content_hash
+from duplicates import find_duplicates
+from scheduler import RecurringScheduler, make_recurring, materialize_group
 import os
+import shutil
+import logging
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime, timedelta
 import csv
 import io
+import heapq
 from io import BytesIO
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    HAS_REPORTLAB = True
-except ImportError:
-    HAS_REPORTLAB = False
-
-app = Flask(__name__)
-# Configure upload folder
-UPLOAD_FOLDER = 'static/receipts'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
-
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+logger = logging.getLogger(__name__)
+bp = Blueprint("main", __name__)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-# Secret key for session management - in production, use a secure random key
-app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production-2024')
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 # FILE_PATH is now dynamic per user
-def get_current_group():
-    """Helper to get the group for the current logged-in user"""
+def group_file(username):
+    """Return the data file holding a user's group"""
+    # Sanitize username for filename
+    safe_username = "".join([c for c in username if c.isalnum() or c in (' ', '.', '_')]).strip()
+    return os.path.join("data", f"expenses_{safe_username}.json")
+
+def get_current_group(for_update=None):
+    """Helper to get the group for the current logged-in user.
+
+    Requests that may write (anything but GET/HEAD, or for_update=True) take
+    the tenant lock before loading and keep it until the request ends, so
+    concurrent load -> mutate -> save cycles cannot lose each other's writes.
+    """
     username = session.get('username')
     if not username:
         return None
-    # Sanitize username for filename
-    safe_username = "".join([c for c in username if c.isalnum() or c in (' ', '.', '_')]).strip()
-    user_file = os.path.join("data", f"expenses_{safe_username}.json")
+    user_file = group_file(username)
+    if for_update is None:
+        for_update = request.method not in ("GET", "HEAD")
+    if for_update and "tenant_lock" not in g:
+        lock = TenantLock(user_file)
+        lock.acquire()
+        g.tenant_lock = lock
     return load_group(user_file), user_file
 
+@bp.teardown_app_request
+def release_tenant_lock(exc):
+    lock = g.pop("tenant_lock", None)
+    if lock is not None:
+        lock.release()
+
+# Rendered read-only pages, revalidated against the group's files on disk;
+# the cache itself is app.extensions["page_cache"]
+cached = cached_page(group_file)
+cached_json = cached_page(group_file, flashes=False)
+
+def expense_payload(expense):
+    return {
+        "id": expense.id,
+        "description": expense.description,
+        "amount": round(float(expense.amount), 2),
+        "payer_id": expense.payer.id,
+        "payer": expense.payer.name,
+        "participants": [p.name for p in expense.participants],
+        "date": expense.date,
+        "category": expense.category,
+        "paid": expense.paid
+    }
+
+def save_changes(group, file_path, changed=(), deleted=(), users=()):
+    """Save a mutated group, update its indexes in place and publish the deltas.
+
+    The indexes are fetched before saving, while they are still keyed to the
+    old segment; add/remove are idempotent, so a freshly built one is fine too.
+    `users` are ids of members added, renamed or removed by the change.
+    """
+    index = partition_index(group, build=False)
+    # Balances as saved on disk; unknown if the index has to be built from the mutated group
+    before = index.balance_map() if index is not None else None
+    if index is None:
+        index = partition_index(group)
+    duplicates = duplicate_index(group, current_app.config["DUPLICATE_THRESHOLD"], build=False)
+    # The tenant lock (get_current_group) keeps other writers out; the index
+    # lock keeps readers from seeing it half updated.
+    with index.lock:
+        save_group(group, file_path)
+        for expense in changed:
+            index.update(expense)
+        for expense_id in deleted:
+            index.remove(expense_id)
+        store_partition_index(group, index)
+        after = index.balance_map()
+    if current_app.config["RECURRING_SCHEDULER_ENABLED"]:
+        # New or re-armed templates reach the scheduler's heap without a rescan
+        scheduler = current_app.extensions["recurring_scheduler"]
+        for expense in changed:
+            if expense.is_recurring:
+                scheduler.schedule(file_path, expense.next_due_date, group.loaded_partition)
+    if duplicates is not None:
+        with duplicates.lock:
+            for expense in changed:
+                duplicates.update(expense)
+            for expense_id in deleted:
+                duplicates.remove(expense_id)
+            store_duplicate_index(group, duplicates)
+
+    if not current_app.config["LIVE_UPDATES"]:
+        return
+    events = [("expense", {"op": "upsert", **expense_payload(e)}) for e in changed]
+    events += [("expense", {"op": "delete", "id": expense_id}) for expense_id in deleted]
+    if changed or deleted:
+        events.append(("totals", {
+            "total": round(index.total, 2),
+            "count": index.count,
+            "average": round(index.total / index.count, 2) if index.count else 0
+        }))
+    events += balance_events(group, before, after, users)
+    if not events:
+        return
+    # Streams are per tenant file; pages drop events for a group they are not showing
+    group_id = group.loaded_partition or "default"
+    events = [(kind, {**data, "group_id": group_id}) for kind, data in events]
+    try:
+        current_app.extensions["event_hub"].log.publish(file_path, events)
+    except Exception as e:
+        # The save succeeded; open tabs just miss this update until their next reload
+        logger.warning("Publishing live events failed: %s", e)
+
+def balance_events(group, before, after, users=()):
+    """Return the balances and settlements events for rows that changed between two balance maps.
+
+    Only members whose balance moved (or who are in `users`) and settlements
+    that appeared, changed or disappeared are sent. Without `before`, both
+    events carry every row and are marked full.
+    """
+    if before is None:
+        return [
+            ("balances", {**balance_columns(group, after), "full": True}),
+            ("settlements", {**settlement_columns(group, after), "full": True})
+        ]
+
+    renamed = set(users)
+    touched = renamed | {u for u in set(before) | set(after) if before.get(u, 0) != after.get(u, 0)}
+    if not touched:
+        return []
+    members = {u.id: u for u in group.users}
+    rows = balance_columns(group, after, only=touched)
+    rows["removed"] = sorted(u for u in touched if u not in members)
+
+    old = {(s["from_id"], s["to_id"]): s for s in settle_debts(dict(before), members)}
+    new = {(s["from_id"], s["to_id"]): s for s in settle_debts(dict(after), members)}
+    moved = [s for key, s in new.items()
+             if key not in old or old[key]["amount"] != s["amount"] or renamed.intersection(key)]
+    gone = [key for key in old if key not in new]
+    settlements = _settlement_rows(moved)
+    settlements["removed_from"] = [from_id for from_id, _ in gone]
+    settlements["removed_to"] = [to_id for _, to_id in gone]
+
+    events = [("balances", rows)]
+    if moved or gone:
+        events.append(("settlements", settlements))
+    return events
+
 # Authentication decorator
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'username' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_login_required(f):
+    """Like login_required, but answers 401 instead of redirecting"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'username' not in session:
+            return jsonify(error="authentication required"), 401
         return f(*args, **kwargs)
     return decorated_function
 
 # ---------------- HOME ----------------
-@app.route("/")
+@bp.route("/")
 def home_redirect():
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
 
-@app.route("/dashboard")
+@bp.route("/dashboard")
 @login_required
+@cached
 def dashboard():
     group, file_path = get_current_group()
     search_query = request.args.get('search', '').strip().lower()
@@ -69,11 +217,13 @@ def dashboard():
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
 
+    index = partition_index(group)
     expenses = group.expenses
 
     # --- SEARCH ---
     if search_query:
-        expenses = [e for e in expenses if search_query in e.description.lower()]
+        matches = index.search(search_query)
+        expenses = [e for e in expenses if e.id in matches]
 
     # --- FILTER BY PAYER ---
     if filter_payer:
@@ -86,15 +236,17 @@ def dashboard():
         expenses = [e for e in expenses if e.date <= end_date]
 
     # --- STATS (always from ALL expenses) ---
-    total_amount = sum(float(e.amount) for e in group.expenses)
-    expense_count = len(group.expenses)
+    total_amount = index.total
+    expense_count = index.count
     user_count = len(group.users)
     avg_expense = total_amount / expense_count if expense_count else 0
 
     # --- TOP SPENDER ---
     spent_map = {}
-    for e in group.expenses:
-        spent_map[e.payer.name] = spent_map.get(e.payer.name, 0) + float(e.amount)
+    for payer_id, amount in index.paid_by().items():
+        payer = group.get_user_by_id(payer_id)
+        if payer:
+            spent_map[payer.name] = spent_map.get(payer.name, 0) + amount
 
     if spent_map:
         top_spender = max(spent_map, key=spent_map.get)
@@ -114,15 +266,17 @@ def dashboard():
         expense_count=expense_count,
         top_spender=top_spender,
         top_amount=round(top_amount, 2),
+        active_group=group.get_group_by_id(group.active_group),
         username=session.get('username')
     )
 
 # ---------------- LOGIN ----------------
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
+@rate_limit(limit="LOGIN_RATE_LIMIT", methods=("POST",))
 def login():
     # If already logged in, redirect to home
     if 'username' in session:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     if request.method == "POST":
         username = request.form.get("username", "").strip()
@@ -140,18 +294,19 @@ def login():
         if success:
             session['username'] = username
             flash("Login successful! Welcome back.", "success")
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             return render_template("login.html", error=message)
     
     return render_template("login.html")
 
 # ---------------- REGISTER ----------------
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
+@rate_limit(limit="REGISTER_RATE_LIMIT", methods=("POST",))
 def register():
     # If already logged in, redirect to home
     if 'username' in session:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     if request.method == "POST":
         username = request.form.get("username", "").strip()
@@ -173,37 +328,38 @@ def register():
         
         if success:
             flash("Registration successful! Please login.", "success")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         else:
             return render_template("register.html", error=message)
     
     return render_template("register.html")
 
 # ---------------- LOGOUT ----------------
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     session.pop('username', None)
     flash("You have been logged out successfully.", "info")
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
 # ---------------- ADD USER ----------------
-@app.route("/add-user", methods=["POST"])
+@bp.route("/add-user", methods=["POST"])
 @login_required
 def add_user():
     group, file_path = get_current_group()
     name = request.form["name"].strip()
     if not name:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     user = User(name)
     group.users.append(user)
-    save_group(group, file_path)
-    return redirect(url_for("dashboard"))
+    save_changes(group, file_path, users=[user.id])
+    return redirect(url_for("main.dashboard"))
 
 # ---------------- ADD EXPENSE ----------------
-@app.route("/add-expense", methods=["GET", "POST"])
+@bp.route("/add-expense", methods=["GET", "POST"])
 @login_required
+@idempotent("main.dashboard")
 def add_expense():
     group, file_path = get_current_group()
     if request.method == "POST":
@@ -214,12 +370,12 @@ def add_expense():
 
         payer = group.get_user_by_id(payer_id)
         if not payer:
-            return redirect(url_for("dashboard"))
+            flash("❌ Payer not found", "danger")
+            return redirect(url_for("main.dashboard"))
 
         participants = [
-            group.get_user_by_id(pid)
-            for pid in participant_ids
-            if group.get_user_by_id(pid)
+            user for user in map(group.get_user_by_id, dict.fromkeys(participant_ids))
+            if user
         ]
 
         # Validate participants
@@ -236,7 +392,8 @@ def add_expense():
                 # Use a safe, unique filename
                 ext = file.filename.rsplit('.', 1)[1].lower()
                 receipt_filename = f"receipt_{uuid.uuid4()}_{secure_filename(file.filename)}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], receipt_filename))
+                os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+                file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], receipt_filename))
 
         # Get category and notes
         category = request.form.get("category", "Other")
@@ -245,8 +402,14 @@ def add_expense():
 
         try:
             expense = Expense(desc, amount, payer, participants, receipt_filename, category, notes, tags)
+            expense.group_id = group.loaded_partition
+            if current_app.config["ENABLE_DUPLICATE_DETECTION"]:
+                duplicate = duplicate_index(group, current_app.config["DUPLICATE_THRESHOLD"]).first_match(expense)
+                if duplicate:
+                    flash(f"⚠️ This looks like a duplicate of '{duplicate.description}' "
+                          f"(₹{duplicate.amount:.2f} on {duplicate.date})", "warning")
             group.expenses.append(expense)
-            save_group(group, file_path)
+            save_changes(group, file_path, changed=[expense])
             flash("Expense added successfully!", "success")
             return redirect("/")
         except ValueError as e:
@@ -255,36 +418,124 @@ def add_expense():
 
     return render_template("add_expense.html", group=group)
 
+# ---------------- RECEIPTS ----------------
+@bp.route("/receipts/<path:filename>")
+@login_required
+def receipt(filename):
+    """Serve an uploaded receipt with a content-hash ETag, Range support and immutable caching"""
+    group, _ = get_current_group()
+    if not any(e.receipt_filename == filename for e in group.expenses):
+        abort(404)  # only receipts of the caller's current group are served
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    # Receipt names carry a uuid and are never rewritten, so the content hash
+    # is a strong validator and the response can be cached forever.
+    # send_file hands the open file to wsgi.file_wrapper, which gunicorn
+    # turns into sendfile(), and answers If-None-Match / Range itself.
+    response = send_file(
+        path,
+        etag=file_content_hash(path),
+        conditional=True,
+        max_age=current_app.config["RECEIPT_CACHE_MAX_AGE"]
+    )
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
+
 # ---------------- DELETE USER ----------------
-@app.route("/delete-user/<user_id>", methods=["POST"])
+@bp.route("/delete-user/<user_id>", methods=["POST"])
 @login_required
 def delete_user(user_id):
     group, file_path = get_current_group()
     user = group.get_user_by_id(user_id)
 
     if not user:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     # 🚫 Prevent delete if user is used in any expense
     for e in group.expenses:
         if e.payer.id == user_id or user in e.participants:
             return "❌ Cannot delete user. User is used in expenses."
+    if user_in_other_partitions(group, file_path, user_id):
+        return "❌ Cannot delete user. User is used in expenses of another group."
 
     group.users = [u for u in group.users if u.id != user_id]
-    save_group(group, file_path)
-    return redirect(url_for("dashboard"))
+    save_changes(group, file_path, users=[user_id])
+    return redirect(url_for("main.dashboard"))
 
 # ---------------- DELETE EXPENSE ----------------
-@app.route("/delete-expense/<expense_id>", methods=["POST"])
+@bp.route("/delete-expense/<expense_id>", methods=["POST"])
 @login_required
 def delete_expense(expense_id):
     group, file_path = get_current_group()
     group.expenses = [e for e in group.expenses if e.id != expense_id]
-    save_group(group, file_path)
-    return redirect(url_for("dashboard"))
+    save_changes(group, file_path, deleted=[expense_id])
+    return redirect(url_for("main.dashboard"))
+
+# ---------------- BULK EXPENSE OPERATIONS ----------------
+BULK_OPERATIONS = {
+    "delete": "deleted",
+    "mark_paid": "marked as paid",
+    "mark_unpaid": "marked as unpaid",
+    "set_category": "recategorized",
+    "add_tag": "tagged"
+}
+
+@bp.route("/bulk-expenses", methods=["POST"])
+@login_required
+def bulk_expenses():
+    """Apply one operation to the selected expenses with a single load and save"""
+    group, file_path = get_current_group()
+    operation = request.form.get("operation", "")
+    value = request.form.get("value", "").strip()
+    ids = set(request.form.getlist("expense_ids"))
+
+    if operation not in BULK_OPERATIONS:
+        flash("⚠️ Unknown bulk operation", "warning")
+        return redirect(url_for("main.dashboard"))
+    if not ids:
+        flash("⚠️ Select at least one expense", "warning")
+        return redirect(url_for("main.dashboard"))
+    if operation in ("set_category", "add_tag") and not value:
+        flash("⚠️ Enter a category or tag", "warning")
+        return redirect(url_for("main.dashboard"))
+
+    selected = [e for e in group.expenses if e.id in ids]
+    if operation == "delete":
+        group.expenses = [e for e in group.expenses if e.id not in ids]
+        save_changes(group, file_path, deleted=[e.id for e in selected])
+        flash(f"🗑️ {len(selected)} expense(s) deleted", "success")
+        return redirect(url_for("main.dashboard"))
+
+    changed = []
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    for expense in selected:
+        if operation in ("mark_paid", "mark_unpaid"):
+            paid = operation == "mark_paid"
+            if expense.paid == paid:
+                continue
+            expense.paid = paid
+            expense.paid_date = now if paid else None
+        elif operation == "set_category":
+            if expense.category == value:
+                continue
+            expense.category = value
+        else:
+            if value in expense.tags:
+                continue
+            expense.tags = expense.tags + [value]
+        changed.append(expense)
+
+    if changed:
+        save_changes(group, file_path, changed=changed)
+    flash(f"✅ {len(changed)} expense(s) {BULK_OPERATIONS[operation]}", "success")
+    return redirect(url_for("main.dashboard"))
 
 # ---------------- EDIT USER  AND EDIT EXPENSE ----------------
-@app.route("/edit-user/<user_id>", methods=["GET", "POST"])
+@bp.route("/edit-user/<user_id>", methods=["GET", "POST"])
 @login_required
 def edit_user(user_id):
     group, file_path = get_current_group()
@@ -292,7 +543,7 @@ def edit_user(user_id):
 
     if not user:
         flash("❌ User not found", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     if request.method == "POST":
         new_name = request.form.get("name", "").strip()
@@ -314,15 +565,15 @@ def edit_user(user_id):
 
         # ✅ Update
         user.name = new_name
-        save_group(group, file_path)
+        save_changes(group, file_path, users=[user.id])
 
         flash("✅ User updated successfully", "success")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     return render_template("edit_user.html", user=user)
 
 
-@app.route("/edit-expense/<expense_id>", methods=["GET", "POST"])
+@bp.route("/edit-expense/<expense_id>", methods=["GET", "POST"])
 @login_required
 def edit_expense(expense_id):
     group, file_path = get_current_group()
@@ -330,7 +581,7 @@ def edit_expense(expense_id):
 
     if not expense:
         flash("❌ Expense not found", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     if request.method == "POST":
         description = request.form.get("description", "").strip()
@@ -352,16 +603,16 @@ def edit_expense(expense_id):
         # ✅ Update
         expense.description = description
         expense.amount = amount
-        save_group(group, file_path)
+        save_changes(group, file_path, changed=[expense])
 
         flash("✅ Expense updated successfully", "success")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     return render_template("edit_expense.html", expense=expense)
 
 
 # ---------------- TOGGLE PAYMENT STATUS ----------------
-@app.route("/toggle-payment/<expense_id>", methods=["POST"])
+@bp.route("/toggle-payment/<expense_id>", methods=["POST"])
 @login_required
 def toggle_payment(expense_id):
     group, file_path = get_current_group()
@@ -374,79 +625,31 @@ def toggle_payment(expense_id):
         else:
             expense.paid_date = None
             flash(f"⏳ Expense '{expense.description}' marked as UNPAID", "info")
-        save_group(group, file_path)
-    return redirect(url_for("dashboard"))
+        save_changes(group, file_path, changed=[expense])
+    return redirect(url_for("main.dashboard"))
 
 # ---------------- ANALYTICS ----------------
-@app.route("/analytics")
+@bp.route("/analytics")
 @login_required
+@cached
 def analytics():
-    group, file_path = get_current_group()
-    # Data source: group.expenses (dynamic data from storage)
-    
-    # 1. Total paid per user (amount)
-    totals = {}
-    # 2. Expense count per user
-    expense_counts = {}
-    # 3. Expenses over time (by date)
-    expenses_by_date = {}
-    # 4. All expense amounts for distribution analysis
-    all_amounts = []
-    
-    for e in group.expenses:
-        payer_name = e.payer.name
-        
-        # Total amount paid per user
-        totals[payer_name] = totals.get(payer_name, 0) + float(e.amount)
-        
-        # Count of expenses per user
-        expense_counts[payer_name] = expense_counts.get(payer_name, 0) + 1
-        
-        # Expenses by date
-        date = getattr(e, 'date', None)
-        if date:
-            expenses_by_date[date] = expenses_by_date.get(date, 0) + float(e.amount)
-        
-        # Collect all amounts
-        all_amounts.append(float(e.amount))
-    
-    # Sort dates chronologically
-    sorted_dates = sorted(expenses_by_date.keys())
-    date_labels = sorted_dates
-    date_values = [expenses_by_date[d] for d in sorted_dates]
-    
-    # Calculate statistics
-    total_expenses = sum(totals.values())
-    avg_expense = total_expenses / len(group.expenses) if group.expenses else 0
-    
-    labels = list(totals.keys())
-    values = list(totals.values())
-    count_values = [expense_counts.get(name, 0) for name in labels]
+    # The charts load their data from /api/analytics/*
+    return render_template("analytics.html")
 
-    return render_template(
-        "analytics.html",
-        labels=labels,
-        values=values,
-        count_values=count_values,
-        date_labels=date_labels,
-        date_values=date_values,
-        total_expenses=total_expenses,
-        avg_expense=avg_expense,
-        expense_count=len(group.expenses)
-    )
-
-@app.route("/settlements")
+@bp.route("/settlements")
 @login_required
+@cached
 def settlements():
     group, file_path = get_current_group()
     try:
-        balances = calculate_balances(group)
+        balances = partition_index(group).balance_map()
 
         users_map = {u.id: u for u in group.users}
         settlements_list = settle_debts(balances, users_map)
 
         return render_template(
             "settlements.html",
+            group=group,
             settlements=settlements_list
         )
     except Exception as e:
@@ -457,8 +660,9 @@ def settlements():
 
 # ============ SETTLEMENT ROUTES ============
 
-@app.route("/settle-full/<from_id>/<to_id>/<amount>", methods=["POST"])
+@bp.route("/settle-full/<from_id>/<to_id>/<amount>", methods=["POST"])
 @login_required
+@idempotent("main.settlements")
 def settle_full(from_id, to_id, amount):
     """Settle the full debt amount"""
     group, file_path = get_current_group()
@@ -487,7 +691,7 @@ def settle_full(from_id, to_id, amount):
         expense.paid_date = datetime.now().strftime("%Y-%m-%d %H:%M")
         
         group.expenses.append(expense)
-        save_group(group, file_path)
+        save_changes(group, file_path, changed=[expense])
         
         flash(f"✅ Full settlement recorded: {payer.name} paid {recipient.name} ₹{amount}", "success")
         
@@ -496,8 +700,9 @@ def settle_full(from_id, to_id, amount):
         
     return redirect("/settlements")
 
-@app.route("/settle-partial/<from_id>/<to_id>/<amount>", methods=["GET", "POST"])
+@bp.route("/settle-partial/<from_id>/<to_id>/<amount>", methods=["GET", "POST"])
 @login_required
+@idempotent("main.settlements")
 def settle_partial(from_id, to_id, amount):
     """Settle a partial debt amount"""
     group, file_path = get_current_group()
@@ -533,7 +738,7 @@ def settle_partial(from_id, to_id, amount):
         expense.paid_date = datetime.now().strftime("%Y-%m-%d %H:%M")
         
         group.expenses.append(expense)
-        save_group(group, file_path)
+        save_changes(group, file_path, changed=[expense])
         
         flash(f"✅ Partial settlement recorded: {payer.name} paid {recipient.name} ₹{pay_amount}", "success")
         return redirect("/settlements")
@@ -543,7 +748,7 @@ def settle_partial(from_id, to_id, amount):
 
 # ============ EXPORT ROUTES ============
 
-@app.route("/export-csv")
+@bp.route("/export-csv")
 @login_required
 def export_csv():
     """Export expenses as CSV"""
@@ -570,20 +775,21 @@ def export_csv():
         download_name=f'expenses_{datetime.now().strftime("%Y%m%d")}.csv'
     )
 
-@app.route("/export-pdf")
+@bp.route("/export-pdf")
 @login_required
 def export_pdf():
     """Export expenses as PDF"""
     group, file_path = get_current_group()
-    if not HAS_REPORTLAB:
+    # reportlab is heavy to import, so only PDF exports pay for it
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+    except ImportError:
         flash("PDF export requires reportlab. Install with: pip install reportlab", "warning")
         return redirect("/")
-    
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
 
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
@@ -632,7 +838,7 @@ def export_pdf():
 
 # ============ BUDGET ROUTES ============
 
-@app.route("/set-budget/<user_id>", methods=["GET", "POST"])
+@bp.route("/set-budget/<user_id>", methods=["GET", "POST"])
 @login_required
 def set_budget(user_id):
     """Set budget for a user"""
@@ -652,32 +858,30 @@ def set_budget(user_id):
         # Add new budget
         budget = Budget(user_id, amount, period)
         group.add_budget(budget)
-        save_group(group, file_path)
+        save_changes(group, file_path)
         
         flash(f"✅ Budget set for {user.name}: ₹{amount}/{period}", "success")
         return redirect("/")
     
     return render_template("set_budget.html", user=user, group=group)
 
-@app.route("/view-budgets")
+@bp.route("/view-budgets")
 @login_required
+@cached
 def view_budgets():
     """View budget vs actual spending"""
     group, file_path = get_current_group()
     budget_data = []
+    index = partition_index(group)
     
     for budget in group.budgets:
         user = group.get_user_by_id(budget.user_id)
         if user:
             # Calculate spending for the period
             if budget.period == "monthly":
-                current_month = datetime.now().strftime("%Y-%m")
-                spent = sum(float(e.amount) for e in group.expenses 
-                           if e.payer.id == budget.user_id and e.date.startswith(current_month))
+                spent = index.spent_by_payer(budget.user_id, datetime.now().strftime("%Y-%m"))
             else:
-                current_year = datetime.now().strftime("%Y")
-                spent = sum(float(e.amount) for e in group.expenses 
-                           if e.payer.id == budget.user_id and e.date.startswith(current_year))
+                spent = index.spent_by_payer(budget.user_id, datetime.now().strftime("%Y"))
             
             budget_data.append({
                 'user': user.name,
@@ -691,25 +895,23 @@ def view_budgets():
 
 # ============ CATEGORIES ROUTES ============
 
-@app.route("/categories")
+@bp.route("/categories")
 @login_required
+@cached
 def categories():
     """View and manage categories"""
     group, file_path = get_current_group()
-    categories_list = set(getattr(e, 'category', 'Other') for e in group.expenses)
-    
-    # Calculate spending by category
-    category_spending = {}
-    for e in group.expenses:
-        cat = getattr(e, 'category', 'Other')
-        category_spending[cat] = category_spending.get(cat, 0) + float(e.amount)
+    # Spending by category comes straight from the partition index
+    category_spending = partition_index(group).by_category()
+    categories_list = set(category_spending)
     
     return render_template("categories.html", categories=categories_list, spending=category_spending)
 
 # ============ MONTHLY REPORTS ============
 
-@app.route("/monthly-report")
+@bp.route("/monthly-report")
 @login_required
+@cached
 def monthly_report():
     """View monthly expense reports"""
     group, file_path = get_current_group()
@@ -731,7 +933,7 @@ def monthly_report():
 
 # ============ TRIP/EVENT GROUPS ============
 
-@app.route("/create-group", methods=["GET", "POST"])
+@bp.route("/create-group", methods=["GET", "POST"])
 @login_required
 def create_group_route():
     """Create a new trip/event group"""
@@ -740,28 +942,40 @@ def create_group_route():
         name = request.form.get("name")
         description = request.form.get("description", "")
         
-        new_group = ExpenseGroup(None, name, description)
+        try:
+            new_group = ExpenseGroup(None, name, description)
+        except ValueError as e:
+            flash(f"⚠️ {e}", "warning")
+            return render_template("create_group.html")
         group.add_group(new_group)
-        save_group(group, file_path)
+        group.active_group = new_group.id
+        save_header(group, file_path)
         
         flash(f"✅ Group '{name}' created!", "success")
         return redirect("/")
     
     return render_template("create_group.html")
 
-@app.route("/switch-group/<group_id>")
+@bp.route("/switch-group/<group_id>")
 @login_required
 def switch_group(group_id):
     """Switch to a different trip/event group"""
-    group, file_path = get_current_group()
+    group, file_path = get_current_group(for_update=True)
+    if group_id == "default":
+        group.active_group = None
+        save_header(group, file_path)
+        flash("✅ Switched to your main expenses", "success")
+        return redirect("/")
+
     target_group = group.get_group_by_id(group_id)
     if target_group:
+        # Only the header changes; no expense segment is read or rewritten
         group.active_group = group_id
-        save_group(group, file_path)
+        save_header(group, file_path)
         flash(f"✅ Switched to group: {target_group.name}", "success")
     return redirect("/")
 
-@app.route("/view-groups")
+@bp.route("/view-groups")
 @login_required
 def view_groups():
     """View all trip/event groups"""
@@ -770,7 +984,7 @@ def view_groups():
 
 # ============ RECURRING EXPENSES ============
 
-@app.route("/recurring-expenses")
+@bp.route("/recurring-expenses")
 @login_required
 def recurring_expenses():
     """View and manage recurring expenses"""
@@ -778,58 +992,340 @@ def recurring_expenses():
     recurring = [e for e in group.expenses if getattr(e, 'is_recurring', False)]
     return render_template("recurring_expenses.html", expenses=recurring)
 
-@app.route("/add-recurring/<expense_id>", methods=["POST"])
+@bp.route("/add-recurring/<expense_id>", methods=["POST"])
 @login_required
 def add_recurring(expense_id):
     """Mark expense as recurring"""
     group, file_path = get_current_group()
     expense = next((e for e in group.expenses if e.id == expense_id), None)
     if expense:
-        expense.is_recurring = True
-        expense.recurrence_type = request.form.get("recurrence_type", "monthly")
-        save_group(group, file_path)
-        flash(f"✅ Expense marked as {expense.recurrence_type} recurring", "success")
+        already_recurring = expense.is_recurring
+        make_recurring(expense, request.form.get("recurrence_type", "monthly"))
+        save_changes(group, file_path, changed=[expense])
+        if already_recurring:
+            flash(f"✅ Expense now repeats {expense.recurrence_type}, next on {expense.next_due_date}", "success")
+        else:
+            flash(f"✅ Expense marked as {expense.recurrence_type} recurring", "success")
     
     return redirect("/recurring-expenses")
 
+@bp.route("/stop-recurring/<expense_id>", methods=["POST"])
+@login_required
+def stop_recurring(expense_id):
+    """Stop generating new instances of a recurring expense"""
+    group, file_path = get_current_group()
+    expense = next((e for e in group.expenses if e.id == expense_id), None)
+    if expense:
+        expense.is_recurring = False
+        expense.next_due_date = None
+        save_changes(group, file_path, changed=[expense])
+        flash(f"⏹️ '{expense.description}' will no longer recur", "info")
+    return redirect("/recurring-expenses")
+
+@bp.route("/run-recurring", methods=["POST"])
+@login_required
+def run_recurring():
+    """Materialize all due recurring expenses for the current user now"""
+    group, file_path = get_current_group()
+    created = materialize_group(group, max_catchup=current_app.config["RECURRING_MAX_CATCHUP"])
+    if created:
+        save_changes(group, file_path, changed=created)
+    flash(f"✅ Created {len(created)} recurring expense(s)", "success")
+    return redirect("/recurring-expenses")
+
+# ============ DUPLICATE DETECTION ============
+
+@bp.route("/duplicates")
+@login_required
+def duplicates():
+    """Report likely duplicate expenses across the whole group"""
+    group, file_path = get_current_group()
+    expenses = [e for e in group.expenses if e.category != "Settlement"]
+    clusters = find_duplicates(expenses, current_app.config["DUPLICATE_THRESHOLD"])
+    return render_template("duplicates.html", clusters=clusters)
+
+@bp.route("/near-duplicates")
+@login_required
+def near_duplicates():
+    """Review expenses with similar descriptions close in date and amount"""
+    group, file_path = get_current_group()
+    pairs, current = near_duplicate_pairs(
+        group,
+        threshold=current_app.config["NEAR_DUPLICATE_SIMILARITY"],
+        date_window=current_app.config["NEAR_DUPLICATE_DATE_WINDOW"],
+        amount_tolerance=current_app.config["NEAR_DUPLICATE_AMOUNT_TOLERANCE"],
+        limit=current_app.config["NEAR_DUPLICATE_REVIEW_LIMIT"],
+        inline_limit=current_app.config["NEAR_DUPLICATE_INLINE_LIMIT"]
+    )
+    return render_template("near_duplicates.html", pairs=pairs, current=current)
+
 # ============ ADVANCED ANALYTICS ============
 
-@app.route("/advanced-analytics")
+@bp.route("/advanced-analytics")
 @login_required
+@cached
 def advanced_analytics():
     """Advanced analytics dashboard"""
+    # The tables load their data from /api/analytics/*
+    return render_template("advanced_analytics.html")
+
+# ============ JSON API ============
+# Column-oriented payloads ({"name": [...], "amount": [...]}) built from the
+# cached partition index. Responses carry the same weak ETags as the pages.
+API_VERSION = 1
+
+def balance_columns(group, balances, only=None):
+    users = [u for u in group.users if only is None or u.id in only]
+    return {
+        "user_id": [u.id for u in users],
+        "name": [u.name for u in users],
+        "balance": [round(float(balances.get(u.id, 0)), 2) for u in users]
+    }
+
+def _settlement_rows(settlements_list):
+    return {
+        "from_id": [s["from_id"] for s in settlements_list],
+        "from": [s["from"] for s in settlements_list],
+        "to_id": [s["to_id"] for s in settlements_list],
+        "to": [s["to"] for s in settlements_list],
+        "amount": [s["amount"] for s in settlements_list]
+    }
+
+def settlement_columns(group, balances):
+    return _settlement_rows(settle_debts(dict(balances), {u.id: u for u in group.users}))
+
+@bp.route("/api/analytics/summary")
+@api_login_required
+@cached_json
+def api_analytics_summary():
     group, file_path = get_current_group()
-    # Category distribution
-    category_data = {}
-    for e in group.expenses:
-        cat = getattr(e, 'category', 'Other')
-        category_data[cat] = category_data.get(cat, 0) + float(e.amount)
-    
-    # Monthly trends
-    monthly_data = {}
-    for e in group.expenses:
-        month = e.date[:7]
-        monthly_data[month] = monthly_data.get(month, 0) + float(e.amount)
-    
-    # Top expenses
-    top_expenses = sorted(group.expenses, key=lambda x: float(x.amount), reverse=True)[:5]
-    
-    # Paid vs unpaid
-    paid_total = sum(float(e.amount) for e in group.expenses if e.paid)
-    unpaid_total = sum(float(e.amount) for e in group.expenses if not e.paid)
-    
-    return render_template(
-        "advanced_analytics.html",
-        category_data=category_data,
-        monthly_data=monthly_data,
-        top_expenses=top_expenses,
-        paid_total=paid_total,
-        unpaid_total=unpaid_total
+    index = partition_index(group)
+    counts_by_payer = index.count_by_payer()
+    payers = [(group.get_user_by_id(payer_id), amount) for payer_id, amount in index.paid_by().items()]
+    payers = [(payer, amount) for payer, amount in payers if payer]
+    categories = sorted(index.by_category().items(), key=lambda item: item[1], reverse=True)
+    top_expenses = heapq.nlargest(5, group.expenses, key=lambda x: float(x.amount))
+
+    return jsonify(
+        version=API_VERSION,
+        total=round(index.total, 2),
+        count=index.count,
+        average=round(index.total / index.count, 2) if index.count else 0,
+        paid_total=round(index.paid_total, 2),
+        unpaid_total=round(index.unpaid_total, 2),
+        payers={
+            "id": [p.id for p, _ in payers],
+            "name": [p.name for p, _ in payers],
+            "paid": [round(amount, 2) for _, amount in payers],
+            "count": [counts_by_payer.get(p.id, 0) for p, _ in payers]
+        },
+        categories={
+            "name": [name for name, _ in categories],
+            "amount": [round(amount, 2) for _, amount in categories]
+        },
+        top_expenses={
+            "description": [e.description for e in top_expenses],
+            "amount": [round(float(e.amount), 2) for e in top_expenses]
+        }
+    )
+
+@bp.route("/api/analytics/timeseries")
+@api_login_required
+@cached_json
+def api_analytics_timeseries():
+    """Spending over time, bucketed by calendar and thinned to at most `points` with LTTB"""
+    granularity = request.args.get("granularity", "auto")
+    if granularity != "auto" and granularity not in GRANULARITIES:
+        return jsonify(error=f"granularity must be auto or one of {', '.join(GRANULARITIES)}"), 400
+    points = request.args.get("points", current_app.config["TIMESERIES_MAX_POINTS"], type=int)
+    points = max(3, min(points, current_app.config["TIMESERIES_POINTS_LIMIT"]))
+
+    group, file_path = get_current_group()
+    granularity, labels, amounts = downsample(partition_index(group), points, granularity)
+    return jsonify(version=API_VERSION, granularity=granularity, date=labels, amount=amounts)
+
+@bp.route("/api/balances")
+@api_login_required
+@cached_json
+def api_balances():
+    group, file_path = get_current_group()
+    return jsonify(version=API_VERSION, **balance_columns(group, partition_index(group).balance_map()))
+
+@bp.route("/api/settlements")
+@api_login_required
+@cached_json
+def api_settlements():
+    group, file_path = get_current_group()
+    return jsonify({"version": API_VERSION, **settlement_columns(group, partition_index(group).balance_map())})
+
+@bp.route("/api/users/search")
+@api_login_required
+@cached_json
+def api_users_search():
+    """Members whose name, or a word of it, starts with q; for the participant picker"""
+    limit = request.args.get("limit", 10, type=int)
+    limit = max(1, min(limit, current_app.config["USER_SEARCH_LIMIT"]))
+    file_path = group_file(session["username"])
+    matches = user_index(file_path, lambda: load_group(file_path).users).search(request.args.get("q", ""), limit)
+    return jsonify(
+        version=API_VERSION,
+        id=[user_id for user_id, _ in matches],
+        name=[name for _, name in matches]
     )
 
-print("REGISTERED ROUTES:")
-for rule in app.url_map.iter_rules():
-    print(rule)
+@bp.route("/api/changes")
+@api_login_required
+@cached_json
+def api_changes():
+    """Expenses inserted, updated or deleted in the active partition since sequence number `since`.
+
+    Page through with since=next while has_more is true. since=0 is a full
+    snapshot of the live rows (no tombstones), paged with
+    since=0&after=<after>&through=<through>; once has_more is false, follow
+    the feed from since=next. A `since` between 0 and the tombstone horizon
+    answers 410: deletions may be missing, so the client must resync from
+    a snapshot.
+    """
+    since = request.args.get("since", 0, type=int)
+    limit = request.args.get("limit", current_app.config["CHANGE_FEED_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, current_app.config["CHANGE_FEED_PAGE_LIMIT"]))
+
+    group, file_path = get_current_group()
+    if since <= 0:
+        # `through` pins the seq the snapshot started at, so deletions made
+        # while it is being paged still reach the client through the feed
+        after = request.args.get("after", 0, type=int)
+        through = request.args.get("through", group.seq, type=int)
+        changes, has_more = changes_since(group, after, limit, tombstones=False)
+        return jsonify(
+            version=API_VERSION,
+            group_id=group.loaded_partition,
+            seq=group.seq,
+            horizon=group.change_horizon,
+            snapshot=True,
+            changes=changes,
+            after=changes[-1]["seq"] if changes else after,
+            through=through,
+            next=through,
+            has_more=has_more
+        )
+
+    if since < group.change_horizon:
+        return jsonify(version=API_VERSION, error="since is older than the change horizon",
+                       resync=True, horizon=group.change_horizon, seq=group.seq), 410
+    changes, has_more = changes_since(group, since, limit)
+    return jsonify(
+        version=API_VERSION,
+        group_id=group.loaded_partition,
+        seq=group.seq,
+        horizon=group.change_horizon,
+        snapshot=False,
+        changes=changes,
+        next=changes[-1]["seq"] if changes else since,
+        has_more=has_more
+    )
+
+# ============ LIVE UPDATES ============
+
+@bp.route("/events")
+@login_required
+def events():
+    """Server-Sent Events stream of the user's group changes (LIVE_UPDATES)"""
+    if not current_app.config["LIVE_UPDATES"]:
+        abort(404)
+    file_path = group_file(session["username"])
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    # A plain generator, not stream_with_context: the stream must not hold the request context open
+    response = Response(
+        stream_events(current_app.extensions["event_hub"], file_path, last_event_id,
+                      heartbeat=current_app.config["LIVE_HEARTBEAT"]),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx/Render proxies must not buffer the stream
+    return response
+
+def move_legacy_receipts(legacy_folder, upload_folder):
+    """Move receipts uploaded under static/ (where anyone could fetch them) into the upload folder"""
+    if not os.path.isdir(legacy_folder):
+        return
+    os.makedirs(upload_folder, exist_ok=True)
+    moved = 0
+    for name in os.listdir(legacy_folder):
+        source = os.path.join(legacy_folder, name)
+        if os.path.isfile(source) and not os.path.exists(os.path.join(upload_folder, name)):
+            shutil.move(source, os.path.join(upload_folder, name))  # the data folder may be another disk
+            moved += 1
+    if moved:
+        logger.info("Moved %d receipts from %s to %s", moved, legacy_folder, upload_folder)
+
+def create_app(config=None):
+    """Build the Flask app; config defaults to config.app_config"""
+    config = config or app_config
+    setup_logging(config.LOG_LEVEL)
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    # Resolved once: send_file would take a relative path from app.root_path, not the working directory
+    app.config["UPLOAD_FOLDER"] = os.path.abspath(config.UPLOAD_FOLDER)
+    move_legacy_receipts(os.path.join(app.root_path, config.LEGACY_UPLOAD_FOLDER), app.config["UPLOAD_FOLDER"])
+    # Secret key for session management - in production, use a secure random key
+    app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production-2024')
+
+    if config.TRUSTED_PROXY_COUNT:
+        # request.remote_addr becomes the client address the proxies saw
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXY_COUNT)
+
+    app.register_blueprint(bp)
+    app.jinja_env.globals["live_updates"] = config.LIVE_UPDATES
+    app.jinja_env.globals["idempotency_key"] = new_key
+    app.jinja_env.globals["user_picker_threshold"] = config.USER_PICKER_THRESHOLD
+    store = get_store(config.LOCAL_STORE_PATH)
+    metrics.init_app(app, store=store, publish_interval=config.METRICS_PUBLISH_INTERVAL)
+    assets.init_app(app, max_age=config.STATIC_CACHE_MAX_AGE)
+    compression.init_app(app, level=config.COMPRESSION_LEVEL, min_size=config.COMPRESSION_MIN_SIZE)
+
+    # Per-app components, built from this config rather than the import-time one
+    user_store = UserStore(config.USERS_DB, legacy_file=config.USERS_FILE)
+    app.extensions["user_store"] = user_store
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=config.PASSWORD_HASH_METHOD,
+        workers=config.PASSWORD_HASH_WORKERS,
+        max_queue=config.PASSWORD_HASH_QUEUE_DEPTH,
+        timeout=config.PASSWORD_HASH_TIMEOUT
+    )
+    app.extensions["login_telemetry"] = TelemetryBuffer(
+        user_store,
+        interval=config.LOGIN_TELEMETRY_FLUSH_INTERVAL,
+        max_pending=config.LOGIN_TELEMETRY_MAX_PENDING
+    )
+    app.extensions["page_cache"] = PageCache(config.PAGE_CACHE_ENTRIES, config.PAGE_CACHE_MAX_BYTES)
+    app.extensions["rate_limit_backend"] = create_backend(config, store)
+    app.extensions["idempotency"] = IdempotencyStore(
+        store, ttl=config.IDEMPOTENCY_TTL, max_keys=config.IDEMPOTENCY_MAX_KEYS)
+    if config.LIVE_UPDATES:
+        # Events go through the host-local store so every worker's open streams see them
+        app.extensions["event_hub"] = EventHub(
+            EventLog(store, retention=config.LIVE_EVENT_RETENTION), poll_interval=config.LIVE_POLL_INTERVAL)
+
+    # Background materialization of recurring expenses (one runner per host)
+    app.extensions["recurring_scheduler"] = RecurringScheduler(
+        config.DATA_FOLDER,
+        interval=config.RECURRING_SCHEDULER_INTERVAL,
+        max_catchup=config.RECURRING_MAX_CATCHUP,
+        store=store
+    )
+    if config.RECURRING_SCHEDULER_ENABLED:
+        app.extensions["recurring_scheduler"].start()
+
+    if config.PRINT_ROUTES:
+        print("REGISTERED ROUTES:")
+        for rule in app.url_map.iter_rules():
+            print(rule)
+    return app
+
+# Module-level app for `gunicorn app:app`
+app = create_app()
 
 # ✅ THIS MUST BE LAST
 if __name__ == "__main__":
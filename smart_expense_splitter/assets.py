@@ -0,0 +1,122 @@
+# assets.py - Bundled, fingerprinted stylesheets and scripts with precompressed variants
+#
+#   python assets.py        (build static/dist ahead of time; the app also builds at startup)
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+
+# bundle name -> source files in static/, concatenated in order
+BUNDLES = {
+    "app.css": ["style.css", "darkmode.css", "progressbars.css", "button_fix.css"],
+    "auth.css": ["auth_background.css"],
+    "idempotency.js": ["idempotency.js"],
+    "live.js": ["live.js"],
+    "picker.js": ["picker.js"],
+}
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_SPACE = re.compile(r"\s+")
+_AROUND = re.compile(r"\s*([{};,])\s*")
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace"""
+    css = _COMMENT.sub("", css)
+    css = _SPACE.sub(" ", css)
+    css = _AROUND.sub(r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Write every bundle as name.<hash>.ext (+ .gz, + .br); return {bundle: file name}"""
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding="utf-8") as f:
+                parts.append(f.read())
+        data = "\n".join(parts)
+        if name.endswith(".css"):
+            data = minify_css(data)  # scripts ship as written
+        data = data.encode("utf-8")
+
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        manifest[name] = hashed
+        path = os.path.join(dist_dir, hashed)
+        if os.path.exists(path):
+            continue  # content-addressed, so an existing file is already current
+
+        variants = {path: data, f"{path}.gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[f"{path}.br"] = brotli.compress(data, quality=11)
+        for target, payload in variants.items():
+            tmp = f"{target}.tmp.{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, target)  # several workers may build at once
+        logger.info("Built %s (%d bytes)", hashed, len(data))
+
+    manifest_path = os.path.join(dist_dir, "manifest.json")
+    with open(f"{manifest_path}.tmp.{os.getpid()}", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp.{os.getpid()}", manifest_path)
+    return manifest
+
+
+def init_app(app, max_age=365 * 24 * 3600):
+    """Build the bundles and serve them from /assets with immutable caching.
+
+    Templates get asset_url('app.css'), which points at the fingerprinted
+    file, so browsers never revalidate it and a change ships under a new URL.
+    """
+    from flask import request, send_file, abort, url_for
+
+    manifest = build()
+
+    def asset_url(name):
+        return url_for("assets", filename=manifest[name])
+
+    app.jinja_env.globals["asset_url"] = asset_url
+
+    @app.route("/assets/<filename>")
+    def assets(filename):
+        if filename not in manifest.values():
+            abort(404)
+        path = os.path.join(DIST_DIR, filename)
+        suffixes = {"br": ".br", "gzip": ".gz"}
+        # Offered in preference order; q-values (br;q=0) are honoured like in compression.py
+        offered = [e for e, suffix in suffixes.items() if os.path.exists(path + suffix)]
+        encoding = request.accept_encodings.best_match(offered)
+        if encoding:
+            path += suffixes[encoding]
+
+        mimetype = mimetypes.guess_type(filename)[0]
+        response = send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(build(), indent=2))
@@ -3,13 +3,13 @@ import json
 import os
 import logging
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+import sqlite3
+import atexit
+import threading
 from datetime import datetime
+from flask import current_app
+from hashing import HashingBusy
 
-AUTH_FILE = "data/users.json"
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AuthError(Exception):
@@ -45,51 +45,280 @@ def validate_password(password):
     
     return password
 
-def load_users():
-    """Load users from JSON file with error handling"""
-    if not os.path.exists(AUTH_FILE):
-        logger.info("Auth file does not exist, creating new")
+class UserStore:
+    """Account store in SQLite, indexed by username (primary key).
+
+    Lookups are a single indexed query instead of parsing every account, and
+    writes touch one row. Connections are per thread and re-opened after a
+    fork. On first use the legacy users.json file is imported.
+    """
+
+    COLUMNS = ("password", "created_at", "last_login", "is_active")
+
+    def __init__(self, db_path, legacy_file=None):
+        # Resolved now: threads open their connections later, whatever the working directory is then
+        self.db_path = os.path.abspath(db_path)
+        self.legacy_file = os.path.abspath(legacy_file) if legacy_file else None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._create_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL,
+                    created_at TEXT,
+                    last_login TEXT,
+                    is_active INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            self._import_legacy(conn)
+
+    def _import_legacy(self, conn):
+        """Copy accounts from the old users.json file, if there is one"""
+        users = _read_users_json(self.legacy_file) if self.legacy_file else None
+        if not users:
+            return
+        rows = []
+        for username, data in users.items():
+            # Handle old format where user_data might just be a string (password)
+            if isinstance(data, str):
+                data = {"password": data}
+            rows.append(self._row(username, data))
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password, created_at, last_login, is_active) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+        logger.info("Imported %s users from %s", len(rows), self.legacy_file)
+
+    @staticmethod
+    def _row(username, data):
+        return (
+            username,
+            data["password"],
+            data.get("created_at"),
+            data.get("last_login"),
+            1 if data.get("is_active", True) else 0
+        )
+
+    @staticmethod
+    def _record(row):
+        return {
+            "password": row["password"],
+            "created_at": row["created_at"],
+            "last_login": row["last_login"],
+            "is_active": bool(row["is_active"])
+        }
+
+    def get(self, username):
+        """Return one account record, or None"""
+        row = self._connection().execute(
+            "SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return self._record(row) if row else None
+
+    def exists(self, username):
+        return self._connection().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def insert(self, username, data):
+        """Add an account; return False if the username is taken"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO users (username, password, created_at, last_login, is_active) "
+                "VALUES (?, ?, ?, ?, ?)", self._row(username, data))
+        return cursor.rowcount == 1
+
+    def update(self, username, **fields):
+        """Update some columns of one account"""
+        unknown = set(fields) - set(self.COLUMNS)
+        if unknown:
+            raise AuthError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        if "is_active" in fields:
+            fields["is_active"] = 1 if fields["is_active"] else 0
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connection()
+        with conn:
+            conn.execute(f"UPDATE users SET {assignments} WHERE username = ?",
+                         (*fields.values(), username))
+
+    def update_many(self, updates):
+        """Apply {username: {column: value}} in a single transaction"""
+        by_columns = {}
+        for username, fields in updates.items():
+            unknown = set(fields) - set(self.COLUMNS)
+            if unknown:
+                raise AuthError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+            columns = tuple(sorted(fields))
+            by_columns.setdefault(columns, []).append(
+                (*(fields[c] for c in columns), username))
+
+        conn = self._connection()
+        with conn:
+            for columns, rows in by_columns.items():
+                assignments = ", ".join(f"{name} = ?" for name in columns)
+                conn.executemany(f"UPDATE users SET {assignments} WHERE username = ?", rows)
+
+    def all(self):
+        """Return every account as {username: record}"""
+        rows = self._connection().execute("SELECT * FROM users")
+        return {row["username"]: self._record(row) for row in rows}
+
+    def replace_all(self, users):
+        """Upsert every account in `users` (bulk import / legacy save_users)"""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, password, created_at, last_login, is_active) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self._row(u, d if isinstance(d, dict) else {"password": d}) for u, d in users.items()))
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+class TelemetryBuffer:
+    """Write-behind buffer for per-user telemetry such as last_login.
+
+    record() only updates an in-memory dict, so the login path never writes
+    to disk. A background thread flushes the pending rows in one batched
+    transaction every `interval` seconds, or sooner once `max_pending` users
+    are waiting, and a final flush runs at interpreter shutdown. A crash
+    loses at most one interval of telemetry.
+    """
+
+    def __init__(self, store, interval=5.0, max_pending=500):
+        self.store = store
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def record(self, username, **fields):
+        """Buffer new values for some of a user's columns"""
+        with self._lock:
+            self._pending.setdefault(username, {}).update(fields)
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def pending(self, username):
+        """Return buffered, not yet flushed values for a user"""
+        with self._lock:
+            return dict(self._pending.get(username, {}))
+
+    def flush(self):
+        """Write every pending update in one transaction; return the number of users flushed"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            self.store.update_many(batch)
+        except Exception as e:
+            logger.error("Failed to flush user telemetry: %s", e)
+            with self._lock:
+                # Keep the failed batch, but let newer values win
+                for username, fields in batch.items():
+                    self._pending[username] = {**fields, **self._pending.get(username, {})}
+            return 0
+        return len(batch)
+
+    def _ensure_thread(self):
+        # The flusher is started lazily and again in a forked child, where
+        # the parent's thread does not exist.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="auth-telemetry", daemon=True)
+            self._thread.start()
+
+    def after_fork(self):
+        """Drop the parent's lock and pending rows in a forked child (the parent flushes those)"""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._thread = None
+        self._pid = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def _store():
+    return current_app.extensions["user_store"]
+
+def _hasher():
+    return current_app.extensions["password_hasher"]
+
+def _read_users_json(path):
+    """Load users from the legacy JSON file with error handling"""
+    if not os.path.exists(path):
         return {}
     
     try:
-        if os.path.getsize(AUTH_FILE) == 0:
+        if os.path.getsize(path) == 0:
             logger.warning("Auth file is empty")
             return {}
         
-        with open(AUTH_FILE, "r", encoding='utf-8') as f:
+        with open(path, "r", encoding='utf-8') as f:
             content = f.read().strip()
             if not content:
                 return {}
             return json.loads(content)
     except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error in auth file: {e}")
+        logger.error("JSON decode error in auth file: %s", e)
         return {}
     except Exception as e:
-        logger.error(f"Error loading users: {e}")
+        logger.error("Error loading users: %s", e)
+        return {}
+
+def load_users():
+    """Load every user as {username: record} (prefer store.get for single lookups)"""
+    try:
+        return _store().all()
+    except sqlite3.Error as e:
+        logger.error("Error loading users: %s", e)
         return {}
 
 def save_users(users):
-    """Save users to JSON file with backup"""
+    """Save users in bulk (prefer store.insert / store.update for single records)"""
     try:
-        os.makedirs("data", exist_ok=True)
-        
-        # Create backup before saving
-        if os.path.exists(AUTH_FILE):
-            backup_path = f"{AUTH_FILE}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            try:
-                with open(AUTH_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_path, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                logger.info(f"Backup created: {backup_path}")
-            except Exception as e:
-                logger.warning(f"Could not create backup: {e}")
-        
-        with open(AUTH_FILE, "w", encoding='utf-8') as f:
-            json.dump(users, f, indent=2, ensure_ascii=False)
-        
+        _store().replace_all(users)
         logger.info("Users saved successfully")
-    except Exception as e:
-        logger.error(f"Failed to save users: {e}")
+    except sqlite3.Error as e:
+        logger.error("Failed to save users: %s", e)
         raise AuthError(f"Failed to save users: {e}")
 
 def register_user(username, password):
@@ -99,30 +328,33 @@ def register_user(username, password):
         username = validate_username(username)
         password = validate_password(password)
         
-        users = load_users()
-        
-        if username in users:
-            logger.warning(f"Registration failed: Username '{username}' already exists")
+        store = _store()
+        if store.exists(username):
+            logger.warning("Registration failed: Username '%s' already exists", username)
             return False, "Username already exists"
         
-        # Hash the password using Werkzeug's default method (scrypt)
-        hashed_password = generate_password_hash(password)
-        users[username] = {
+        # Hash the password in the bounded hashing pool (scrypt by default)
+        hashed_password = _hasher().hash(password)
+        created = store.insert(username, {
             "password": hashed_password,
             "created_at": datetime.now().isoformat(),
             "last_login": None,
             "is_active": True
-        }
+        })
+        if not created:
+            # Lost a race with a concurrent registration of the same name
+            return False, "Username already exists"
         
-        save_users(users)
-        logger.info(f"User '{username}' registered successfully")
+        logger.info("User '%s' registered successfully", username)
         return True, "User registered successfully"
     
     except AuthError as e:
-        logger.warning(f"Registration validation error: {e}")
+        logger.warning("Registration validation error: %s", e)
+        return False, str(e)
+    except HashingBusy as e:
         return False, str(e)
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         return False, "An error occurred during registration"
 
 def verify_user(username, password):
@@ -131,49 +363,36 @@ def verify_user(username, password):
         if not username or not password:
             return False, "Username and password are required"
         
-        users = load_users()
+        user_data = _store().get(username)
         
-        if username not in users:
-            logger.warning(f"Login attempt with non-existent username: {username}")
+        if user_data is None:
+            logger.warning("Login attempt with non-existent username: %s", username)
             return False, "Invalid username or password"
         
-        user_data = users[username]
-        
-        # Handle old format where user_data might just be a string (password)
-        if isinstance(user_data, str):
-            # Old format: migrate to new format
-            user_data = {
-                "password": user_data,
-                "created_at": None,
-                "last_login": None,
-                "is_active": True
-            }
-            users[username] = user_data
-        
         # Check if user is active (default to True if field missing)
         if not user_data.get("is_active", True):
-            logger.warning(f"Login attempt for inactive user: {username}")
+            logger.warning("Login attempt for inactive user: %s", username)
             return False, "This account is inactive"
         
         # Check password hash
-        if check_password_hash(user_data["password"], password):
-            # Update last login
-            users[username]["last_login"] = datetime.now().isoformat()
-            save_users(users)
-            logger.info(f"User '{username}' logged in successfully")
+        if _hasher().verify(user_data["password"], password):
+            # Update last login (buffered, written in the next batch)
+            current_app.extensions["login_telemetry"].record(username, last_login=datetime.now().isoformat())
+            logger.info("User '%s' logged in successfully", username)
             return True, "Login successful"
         else:
-            logger.warning(f"Failed login attempt for user: {username}")
+            logger.warning("Failed login attempt for user: %s", username)
             return False, "Invalid username or password"
     
+    except HashingBusy as e:
+        return False, str(e)
     except Exception as e:
-        logger.error(f"Verification error: {e}")
+        logger.error("Verification error: %s", e)
         return False, "An error occurred during login"
 
 def user_exists(username):
     """Check if user exists"""
-    users = load_users()
-    return username in users
+    return _store().exists(username)
 
 def change_password(username, old_password, new_password):
     """Change user password"""
@@ -189,33 +408,29 @@ def change_password(username, old_password, new_password):
         if old_password == new_password:
             return False, "New password must be different from current password"
         
-        users = load_users()
-        users[username]["password"] = generate_password_hash(new_password)
-        save_users(users)
+        _store().update(username, password=_hasher().hash(new_password))
         
-        logger.info(f"Password changed for user: {username}")
+        logger.info("Password changed for user: %s", username)
         return True, "Password changed successfully"
     
-    except AuthError as e:
+    except (AuthError, HashingBusy) as e:
         return False, str(e)
     except Exception as e:
-        logger.error(f"Password change error: {e}")
+        logger.error("Password change error: %s", e)
         return False, "An error occurred while changing password"
 
 def deactivate_user(username):
     """Deactivate a user account"""
     try:
-        users = load_users()
-        
-        if username not in users:
+        store = _store()
+        if not store.exists(username):
             return False, "User not found"
         
-        users[username]["is_active"] = False
-        save_users(users)
+        store.update(username, is_active=False)
         
-        logger.info(f"User deactivated: {username}")
+        logger.info("User deactivated: %s", username)
         return True, "User deactivated successfully"
     
     except Exception as e:
-        logger.error(f"Error deactivating user: {e}")
+        logger.error("Error deactivating user: %s", e)
         return False, "An error occurred while deactivating user"
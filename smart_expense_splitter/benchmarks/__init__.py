@@ -0,0 +1,7 @@
+# benchmarks - Synthetic-data benchmarks for the expense splitter
+#
+# Run from the smart_expense_splitter directory, e.g.
+#   python -m benchmarks.suite                 (storage, splitter, utils, routes)
+#   python -m benchmarks.bench_near_duplicates
+#   python -m benchmarks.bench_startup         (import time budget for CI)
+#   python -m benchmarks.bench_compression     (bytes on wire / CPU per compression level)
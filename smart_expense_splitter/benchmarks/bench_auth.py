@@ -0,0 +1,57 @@
+# bench_auth.py - User store lookups and registrations with many accounts
+#
+#   python -m benchmarks.bench_auth [num_accounts]
+import os
+import sys
+import time
+import random
+import tempfile
+from werkzeug.security import generate_password_hash
+from auth import UserStore
+
+
+def main(num_accounts=1_000_000, lookups=100_000, registrations=1_000):
+    tmp = tempfile.mkdtemp()
+    store = UserStore(os.path.join(tmp, "users.db"), legacy_file=os.path.join(tmp, "missing.json"))
+    # One real hash shared by every account: hashing 1M passwords would
+    # dominate the run and is not what this benchmark measures.
+    password = generate_password_hash("benchmark-password")
+
+    start = time.perf_counter()
+    batch = 50_000
+    for offset in range(0, num_accounts, batch):
+        store.replace_all({
+            f"user{i:07d}": {"password": password, "created_at": "2026-01-01T00:00:00", "is_active": True}
+            for i in range(offset, min(offset + batch, num_accounts))
+        })
+    print(f"populate accounts={store.count()} time={time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(1)
+    names = [f"user{rng.randrange(num_accounts):07d}" for _ in range(lookups)]
+    start = time.perf_counter()
+    for name in names:
+        store.get(name)
+    elapsed = time.perf_counter() - start
+    print(f"get: {lookups} lookups in {elapsed:.2f}s ({elapsed / lookups * 1e6:.1f} us/lookup)")
+
+    start = time.perf_counter()
+    for name in names:
+        store.exists(name)
+    elapsed = time.perf_counter() - start
+    print(f"exists: {elapsed / lookups * 1e6:.1f} us/lookup")
+
+    start = time.perf_counter()
+    for i in range(registrations):
+        store.insert(f"new{i:07d}", {"password": password, "created_at": "2026-01-01T00:00:00"})
+    elapsed = time.perf_counter() - start
+    print(f"insert: {registrations} registrations in {elapsed:.2f}s ({elapsed / registrations * 1e3:.2f} ms each)")
+
+    start = time.perf_counter()
+    for name in names[:registrations]:
+        store.update(name, last_login="2026-01-02T00:00:00")
+    elapsed = time.perf_counter() - start
+    print(f"update last_login: {elapsed / registrations * 1e3:.2f} ms each")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,89 @@
+# bench_compression.py - Bytes on the wire and CPU cost of response compression
+#
+#   python -m benchmarks.bench_compression [--repeat 5]
+#
+# Renders the heaviest pages for a small, medium and huge synthetic tenant
+# and compresses each body at several levels, reporting the compressed size,
+# ratio and CPU milliseconds per response.
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.synthetic import make_group
+from storage import save_group
+import compression
+
+TENANTS = {"small": 50, "medium": 2_000, "huge": 50_000}
+ROUTES = ["/dashboard", "/analytics", "/settlements"]
+LEVELS = [1, 6, 9]
+
+
+def render_pages(workdir):
+    """Return {(tenant, route): identity body}"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.makedirs("data", exist_ok=True)
+        from app import app
+        page_cache = app.extensions["page_cache"]
+        client = app.test_client()
+        bodies = {}
+        for tenant, expenses in TENANTS.items():
+            save_group(make_group(num_users=20, num_expenses=expenses), os.path.join("data", f"expenses_{tenant}.json"))
+            with client.session_transaction() as session:
+                session["username"] = tenant
+            for route in ROUTES:
+                page_cache.clear()
+                response = client.get(route, headers={"Accept-Encoding": "identity"})
+                assert response.status_code == 200, f"{route} returned {response.status_code}"
+                bodies[(tenant, route)] = response.get_data()
+        return bodies
+    finally:
+        os.chdir(cwd)
+
+
+def cpu_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        samples.append((time.process_time() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    bodies = render_pages(tempfile.mkdtemp(prefix="bench_compression_"))
+    results = []
+    for (tenant, route), body in bodies.items():
+        for encoding in compression.available_encodings():
+            for level in LEVELS:
+                compressed = compression.compress(body, encoding, level)
+                results.append({
+                    "tenant": tenant,
+                    "route": route,
+                    "encoding": f"{encoding}:{level}",
+                    "bytes": len(body),
+                    "wire_bytes": len(compressed),
+                    "ratio": round(len(body) / len(compressed), 1),
+                    "cpu_ms": round(cpu_ms(lambda: compression.compress(body, encoding, level), args.repeat), 2),
+                })
+        # Streaming mode pays for a sync flush per chunk; use 8KB chunks like a template stream
+        chunks = [body[i:i + 8192] for i in range(0, len(body), 8192)]
+        streamed = b"".join(compression.compress_stream(chunks, "gzip"))
+        results.append({
+            "tenant": tenant, "route": route, "encoding": "gzip:6 streamed",
+            "bytes": len(body), "wire_bytes": len(streamed), "ratio": round(len(body) / len(streamed), 1),
+            "cpu_ms": round(cpu_ms(lambda: b"".join(compression.compress_stream(chunks, "gzip")), args.repeat), 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
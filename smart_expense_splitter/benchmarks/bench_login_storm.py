@@ -0,0 +1,121 @@
+# bench_login_storm.py - Dashboard latency during a login storm
+#
+#   python -m benchmarks.bench_login_storm [seconds]
+#
+# Serves the app with a fixed number of request slots (like gunicorn sync
+# workers), hammers /login from many threads and samples /dashboard latency,
+# once with inline hashing and once through the bounded hashing pool.
+import os
+import sys
+import time
+import tempfile
+import threading
+import statistics
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from werkzeug.serving import make_server
+
+REQUEST_SLOTS = 4
+STORM_THREADS = 16
+
+
+class LimitedConcurrency:
+    """WSGI middleware allowing only `slots` requests in flight, like sync workers"""
+
+    def __init__(self, app, slots):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(slots)
+
+    def __call__(self, environ, start_response):
+        with self.slots:
+            return list(self.app(environ, start_response))
+
+
+def _opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def _login(opener, base, username, password):
+    data = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    with opener.open(f"{base}/login", data) as response:
+        return response.read()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run(base, seconds):
+    dashboard = _opener()
+    _login(dashboard, base, "viewer", "viewer-password")
+
+    stop = threading.Event()
+    logins = {"ok": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def storm(i):
+        opener = _opener()
+        while not stop.is_set():
+            body = _login(opener, base, f"storm{i:03d}", "storm-password")
+            with lock:
+                logins["busy" if b"busy" in body else "ok"] += 1
+            opener = _opener()  # log in again from a fresh session
+
+    threads = [threading.Thread(target=storm, args=(i,), daemon=True) for i in range(STORM_THREADS)]
+    for t in threads:
+        t.start()
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with dashboard.open(f"{base}/dashboard") as response:
+            response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+    return {
+        "login_per_s": round(logins["ok"] / seconds, 1),
+        "rejected_per_s": round(logins["busy"] / seconds, 1),
+        "dashboard_p50_ms": round(statistics.median(latencies), 1),
+        "dashboard_p99_ms": round(percentile(latencies, 99), 1),
+        "samples": len(latencies),
+    }
+
+
+def main(seconds=10):
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("data", exist_ok=True)
+
+    import auth
+    from app import app
+    from hashing import PasswordHasher
+
+    app.extensions["password_hasher"] = PasswordHasher(workers=0)
+    with app.app_context():
+        auth.register_user("viewer", "viewer-password")
+        for i in range(STORM_THREADS):
+            auth.register_user(f"storm{i:03d}", "storm-password")
+
+    server = make_server("127.0.0.1", 0, LimitedConcurrency(app, REQUEST_SLOTS), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    modes = {
+        "inline": PasswordHasher(workers=0),
+        "pool": PasswordHasher(workers=2, max_queue=0),
+    }
+    for name, hasher in modes.items():
+        app.extensions["password_hasher"] = hasher
+        print(name, run(base, seconds))
+        hasher.shutdown()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
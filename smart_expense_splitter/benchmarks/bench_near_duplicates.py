@@ -0,0 +1,57 @@
+# bench_near_duplicates.py - MinHash/LSH near-duplicate detection on large ledgers
+#
+#   python -m benchmarks.bench_near_duplicates [num_expenses]
+import sys
+import time
+import random
+from datetime import date, timedelta
+from models import Expense
+from near_duplicates import MinHashLSH, find_near_duplicates
+from benchmarks.synthetic import make_group
+
+VARIANTS = [
+    lambda d: d.lower(),
+    lambda d: d.replace(" ", " to ", 1),
+    lambda d: d.upper(),
+    lambda d: d + "!",
+]
+
+
+def inject_near_duplicates(group, count, seed=7):
+    """Append `count` perturbed copies of random expenses; return their (original, copy) id pairs"""
+    rng = random.Random(seed)
+    truth = set()
+    originals = rng.sample(group.expenses, count)
+    for i, original in enumerate(originals):
+        copy = Expense(
+            rng.choice(VARIANTS)(original.description),
+            round(original.amount * rng.uniform(0.98, 1.02), 2),
+            original.payer,
+            original.participants,
+            category=original.category
+        )
+        copy.id = f"dup{i:07d}"
+        shifted = date.fromisoformat(original.date) + timedelta(days=rng.randint(0, 2))
+        copy.date = shifted.isoformat()
+        group.expenses.append(copy)
+        truth.add(tuple(sorted((original.id, copy.id))))
+    return truth
+
+
+def main(num_expenses=100_000):
+    group = make_group(num_users=50, num_expenses=num_expenses, days=730)
+    truth = inject_near_duplicates(group, num_expenses // 100)
+
+    lsh = MinHashLSH()
+    start = time.perf_counter()
+    pairs = find_near_duplicates(group.expenses, lsh=lsh)
+    elapsed = time.perf_counter() - start
+
+    found = {tuple(sorted((a.id, b.id))) for a, b, _ in pairs}
+    recall = len(truth & found) / len(truth) if truth else 1.0
+    print(f"expenses={len(group.expenses)} distinct_descriptions={len(lsh._signatures)}")
+    print(f"time={elapsed:.2f}s pairs={len(pairs)} injected={len(truth)} recall={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
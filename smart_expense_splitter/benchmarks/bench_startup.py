@@ -0,0 +1,78 @@
+# bench_startup.py - Worker boot cost of `import app`, checked against a budget
+#
+#   python -m benchmarks.bench_startup [--budget-ms 750] [--runs 5] [--top 15]
+#
+# Imports the app in fresh interpreters under `python -X importtime`, reports
+# the median total and the slowest modules, and exits 1 if the median is over
+# budget or a module that should load lazily (reportlab, ...) was imported.
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only be imported on first use, never at boot
+LAZY_MODULES = ("reportlab", "numpy", "pandas")
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile():
+    """Import the app once; return {module: (self_us, cumulative_us, depth)}"""
+    workdir = tempfile.mkdtemp(prefix="startup_")
+    env = dict(os.environ, PYTHONPATH=APP_DIR, PRINT_ROUTES="0")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app import time")
+    parser.add_argument("--budget-ms", type=float, default=750, help="fail if the median import exceeds this")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    args = parser.parse_args(argv)
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    totals = [p["app"][1] / 1000 for p in profiles]
+    median_ms = statistics.median(totals)
+    last = profiles[-1]
+    slowest = sorted(last.items(), key=lambda item: item[1][1], reverse=True)
+    eager = sorted({name.split(".")[0] for name in last if name.split(".")[0] in LAZY_MODULES})
+
+    report = {
+        "median_ms": round(median_ms, 1),
+        "runs_ms": [round(t, 1) for t in totals],
+        "budget_ms": args.budget_ms,
+        "modules_imported": len(last),
+        "eager_heavy_modules": eager,
+        "slowest": [{"module": name, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+                    for name, (s, c, _) in slowest[:args.top]],
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print(f"FAIL: import took {median_ms:.0f}ms, budget {args.budget_ms:.0f}ms", file=sys.stderr)
+        failed = True
+    if eager:
+        print(f"FAIL: imported at boot: {', '.join(eager)}", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# loadtest.py - Concurrent load test against a locally started server
+#
+#   python -m benchmarks.loadtest [--users 20] [--duration 30] [--workers 4] [--processes 1]
+#
+# Starts gunicorn with the app's gunicorn.conf.py and --workers as
+# WEB_CONCURRENCY (or werkzeug's threaded server if gunicorn is missing) in a
+# scratch directory, registers --users accounts, then drives a mixed workload
+# from a pool of client threads (optionally spread over several processes)
+# and reports throughput, latency percentiles and error rate per route.
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# route name -> weight in the mix
+WORKLOAD = {
+    "GET /dashboard": 40,
+    "POST /add-expense": 20,
+    "GET /settlements": 15,
+    "POST /settle-full": 5,
+    "GET /export-csv": 10,
+    "GET /analytics": 10,
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, port):
+    """Start the app in a scratch directory; return (process or None, base url)"""
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    env = dict(os.environ, RATE_LIMIT_ENABLED="0", WEB_CONCURRENCY=str(workers), PYTHONPATH=APP_DIR)
+    try:
+        import gunicorn  # noqa: F401
+        # Same settings as production (worker class, threads, preload and warmup hooks)
+        cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(APP_DIR, "gunicorn.conf.py"),
+               "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"]
+        process = subprocess.Popen(cmd, cwd=workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except ImportError:
+        code = ("import sys; sys.path.insert(0, %r); from app import app; "
+                "app.run(port=%d, threaded=True)" % (APP_DIR, port))
+        process = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{base}/login", timeout=1).read()
+            return process, base
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+
+class Client:
+    """One simulated user with its own session cookie"""
+
+    def __init__(self, base, username, password="loadtest-pw"):
+        self.base = base
+        self.username = username
+        self.password = password
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.member_ids = []
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        with self.opener.open(f"{self.base}{path}", body, timeout=30) as response:
+            return response.read().decode("utf-8", "replace")
+
+    def setup(self):
+        form = {"username": self.username, "password": self.password, "confirm_password": self.password}
+        self.request("/register", form)
+        self.request("/login", {"username": self.username, "password": self.password})
+        for name in ("Asha", "Ben", "Chen"):
+            self.request("/add-user", {"name": name})
+        self.member_ids = re.findall(r"/edit-user/([\w-]+)", self.request("/dashboard"))
+
+    def step(self, rng, route):
+        if route == "GET /dashboard":
+            self.request("/dashboard")
+        elif route == "POST /add-expense":
+            payer = rng.choice(self.member_ids)
+            self.request("/add-expense", {
+                "description": f"Load test {rng.randrange(1000)}",
+                "amount": f"{rng.uniform(10, 500):.2f}",
+                "payer": payer,
+                "participants": rng.sample(self.member_ids, 2),
+                "category": "Other",
+            })
+        elif route == "GET /settlements":
+            self.request("/settlements")
+        elif route == "POST /settle-full":
+            links = re.findall(r'action="(/settle-full/[^"]+)"', self.request("/settlements"))
+            if links:
+                self.request(links[0], {})
+        elif route == "GET /export-csv":
+            self.request("/export-csv")
+        elif route == "GET /analytics":
+            self.request("/analytics")
+
+
+def run_clients(base, usernames, duration, seed):
+    """Drive the workload from one thread per user; return (route, seconds, ok) samples"""
+    samples = []
+    lock = threading.Lock()
+    routes, weights = zip(*WORKLOAD.items())
+
+    def worker(index, username):
+        rng = random.Random(seed + index)
+        client = Client(base, username)
+        client.setup()
+        deadline = time.perf_counter() + duration
+        local = []
+        while time.perf_counter() < deadline:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                client.step(rng, route)
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            local.append((route, time.perf_counter() - start, ok))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i, u)) for i, u in enumerate(usernames)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def summarize(samples, duration):
+    report = {}
+    for route in WORKLOAD:
+        latencies = sorted(s for r, s, ok in samples if r == route and ok)
+        errors = sum(1 for r, _, ok in samples if r == route and not ok)
+        total = len(latencies) + errors
+        if not total:
+            continue
+        report[route] = {
+            "requests": total,
+            "rps": round(total / duration, 1),
+            "error_rate": round(errors / total, 4),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the expense splitter")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per user")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--processes", type=int, default=1, help="client processes")
+    parser.add_argument("--base", help="test an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    process = None
+    base = args.base
+    if not base:
+        process, base = start_server(args.workers, _free_port())
+    try:
+        run_id = f"{int(time.time()) % 100000:05d}"
+        usernames = [f"load{run_id}_{i:04d}" for i in range(args.users)]
+        chunks = [usernames[i::args.processes] for i in range(args.processes)]
+        started = time.perf_counter()
+        if args.processes == 1:
+            samples = run_clients(base, usernames, args.duration, args.seed)
+        else:
+            with ProcessPoolExecutor(args.processes) as pool:
+                futures = [pool.submit(run_clients, base, chunk, args.duration, args.seed + i * 1000)
+                           for i, chunk in enumerate(chunks) if chunk]
+                samples = [s for f in futures for s in f.result()]
+        elapsed = time.perf_counter() - started
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(json.dumps({
+        "users": args.users,
+        "workers": args.workers,
+        "duration_s": round(elapsed, 1),
+        "total_rps": round(len(samples) / elapsed, 1),
+        "routes": summarize(samples, elapsed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# suite.py - Micro and route benchmarks on synthetic data, with baseline comparison
+#
+#   python -m benchmarks.suite [--expenses N] [--users N] [--output results.json]
+#                              [--baseline benchmarks/baseline.json] [--save-baseline]
+#
+# Every benchmark is run --repeat times; the JSON report keeps min and
+# median seconds. Routes are timed cold (page cache cleared before each
+# request) and warm (" (warm)" suffix, served from the cache). With --baseline the run fails (exit 1) if any benchmark's
+# median is slower than the baseline by more than --tolerance.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+import utils
+from storage import load_group, save_group
+from splitter import calculate_balances, settle_debts
+from indexes import PartitionIndex
+from benchmarks.synthetic import make_group
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+ROUTES = ["/dashboard", "/dashboard?search=uber", "/analytics", "/settlements", "/categories",
+          "/advanced-analytics", "/view-budgets", "/export-csv",
+          "/api/analytics/summary", "/api/analytics/timeseries", "/api/analytics/timeseries?granularity=day"]
+
+
+def measure(fn, repeat):
+    """Run `fn` `repeat` times and return {min, median} in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def micro_benchmarks(group, workdir, repeat):
+    path = os.path.join(workdir, "bench_group.json")
+    save_group(group, path)
+    users_map = {u.id: u for u in group.users}
+    balances = calculate_balances(group)
+    user_id = group.users[0].id
+    dates = sorted(e.date for e in group.expenses)
+
+    cases = {
+        "storage.load_group": lambda: load_group(path),
+        "storage.save_group": lambda: save_group(group, path),
+        "splitter.calculate_balances": lambda: calculate_balances(group),
+        "splitter.settle_debts": lambda: settle_debts(balances, users_map),
+        "indexes.PartitionIndex.build": lambda: PartitionIndex.build(group.expenses),
+        "utils.calculate_expense_summary": lambda: utils.calculate_expense_summary(group),
+        "utils.get_expense_by_category": lambda: utils.get_expense_by_category(group),
+        "utils.get_user_spending": lambda: utils.get_user_spending(group, user_id),
+        "utils.get_user_share": lambda: utils.get_user_share(group, user_id),
+        "utils.get_date_range_expenses": lambda: utils.get_date_range_expenses(
+            group, dates[len(dates) // 4], dates[3 * len(dates) // 4]),
+        "utils.export_expenses_to_csv": lambda: utils.export_expenses_to_csv(group),
+    }
+    return {name: measure(fn, repeat) for name, fn in cases.items()}
+
+
+def route_benchmarks(group, workdir, repeat):
+    """Time routes end to end through Flask's test client, with a cold and a warm page cache"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.makedirs("data", exist_ok=True)
+        save_group(group, os.path.join("data", "expenses_bench.json"))
+        from app import app
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["username"] = "bench"
+
+        page_cache = app.extensions["page_cache"]
+
+        results = {}
+        for route in ROUTES:
+            def request(route=route):
+                response = client.get(route)
+                assert response.status_code == 200, f"{route} returned {response.status_code}"
+
+            def cold(route=route):
+                page_cache.clear()
+                request(route)
+
+            # Cold renders every time; warm is served from the page cache after the first run
+            results[f"route GET {route}"] = measure(cold, repeat)
+            request()
+            results[f"route GET {route} (warm)"] = measure(request, repeat)
+        return results
+    finally:
+        os.chdir(cwd)
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (name, baseline, current, ratio) for regressions"""
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or not previous["median"]:
+            continue
+        ratio = current["median"] / previous["median"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, previous["median"], current["median"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expense splitter benchmark suite")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--expenses", type=int, default=10_000)
+    parser.add_argument("--participants", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-routes", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    group = make_group(num_users=args.users, num_expenses=args.expenses,
+                       participants_per_expense=args.participants, days=args.days, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+
+    benchmarks = micro_benchmarks(group, workdir, args.repeat)
+    if not args.skip_routes:
+        benchmarks.update(route_benchmarks(group, workdir, args.repeat))
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: getattr(args, k) for k in ("users", "expenses", "participants", "days", "seed", "repeat")},
+        "benchmarks": benchmarks,
+    }
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print("⚠️ Baseline was recorded with different parameters", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after, ratio in regressions:
+            print(f"❌ {name}: {before * 1000:.2f}ms -> {after * 1000:.2f}ms ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+# synthetic.py - Seeded synthetic group generator for benchmarks
+import random
+from datetime import date, timedelta
+from models import Group, User, Expense
+
+CATEGORIES = ["Food", "Transport", "Accommodation", "Entertainment", "Shopping",
+              "Activities", "Utilities", "Other"]
+
+MERCHANTS = ["Uber", "Ola", "Starbucks", "Dominos", "Airbnb", "Marriott", "Netflix", "Amazon",
+             "Zomato", "Swiggy", "IndiGo", "Decathlon", "PVR", "Big Bazaar", "Shell", "Airtel"]
+
+PURPOSES = ["airport", "dinner", "lunch", "breakfast", "groceries", "tickets", "hotel night",
+            "fuel", "snacks", "drinks", "museum", "taxi home", "rent", "internet bill", "gift"]
+
+
+def make_description(rng):
+    """Return a plausible expense description"""
+    return f"{rng.choice(MERCHANTS)} {rng.choice(PURPOSES)}"
+
+
+def make_group(num_users=20, num_expenses=1000, participants_per_expense=3, categories=CATEGORIES,
+               days=365, start=date(2025, 1, 1), seed=42, name="Benchmark Group"):
+    """Generate a reproducible group of users and expenses"""
+    rng = random.Random(seed)
+    group = Group(name)
+    for i in range(num_users):
+        group.users.append(User(f"user{i:05d}", user_id=f"u{i:05d}"))
+
+    k = min(participants_per_expense, num_users)
+    for i in range(num_expenses):
+        payer = rng.choice(group.users)
+        participants = rng.sample(group.users, k)
+        expense = Expense(
+            make_description(rng),
+            round(rng.uniform(50, 5000), 2),
+            payer,
+            participants,
+            category=rng.choice(categories)
+        )
+        expense.id = f"e{i:07d}"
+        expense.date = (start + timedelta(days=rng.randrange(days))).isoformat()
+        expense.paid = rng.random() < 0.3
+        group.expenses.append(expense)
+    return group
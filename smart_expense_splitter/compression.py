@@ -0,0 +1,85 @@
+# compression.py - gzip/brotli compression of dynamic HTML and JSON responses
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/html", "application/json", "text/csv", "text/plain", "text/css", "application/javascript")
+
+
+def available_encodings():
+    """Encodings this process can produce, preferred first"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data, encoding, level=6):
+    """Compress a whole body; level is the gzip level (brotli uses level + 2, capped at 11)"""
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level + 2, 11))
+    # wbits 31 = gzip container
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level=6):
+    """Compress an iterable of chunks, flushing after each so the client sees them as they come"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=min(level + 2, 11))
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            compressor.process(chunk)
+            yield compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def init_app(app, level=6, min_size=1024, types=COMPRESSIBLE_TYPES):
+    """Compress responses the client accepts, skipping small and already encoded ones.
+
+    Buffered bodies under `min_size` bytes go out as-is; streamed bodies
+    (generators) are compressed chunk by chunk since their size is unknown.
+    """
+    from flask import request
+
+    encodings = available_encodings()
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+                or response.direct_passthrough  # send_file: receipts, precompressed assets
+                or "Content-Encoding" in response.headers
+                or "Content-Range" in response.headers
+                or response.mimetype not in types):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress(data, encoding, level))
+
+        response.headers["Content-Encoding"] = encoding
+        # The compressed bytes differ from the identity ones, so a strong ETag no longer holds
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -13,30 +13,96 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     
     # Upload configuration
-    UPLOAD_FOLDER = 'static/receipts'
+    UPLOAD_FOLDER = os.path.join('data', 'receipts')  # not under static/: served only to the owner
+    LEGACY_UPLOAD_FOLDER = 'static/receipts'  # moved into UPLOAD_FOLDER at startup
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+    RECEIPT_CACHE_MAX_AGE = 365 * 24 * 3600  # receipts are immutable, cache for a year
+    STATIC_CACHE_MAX_AGE = 365 * 24 * 3600  # bundles are fingerprinted (assets.py)
+    PAGE_CACHE_ENTRIES = 256  # rendered read-only pages kept per worker (pagecache.py)
+    PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # gzip 1-9 (compression.py)
+    COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent as-is
+    TIMESERIES_MAX_POINTS = 200  # default chart points (downsample.py); ?points= overrides
+    TIMESERIES_POINTS_LIMIT = 2000
+    CHANGE_FEED_PAGE_SIZE = 200  # /api/changes records per page; ?limit= overrides
+    CHANGE_FEED_PAGE_LIMIT = 1000
+    USER_PICKER_THRESHOLD = 50  # members above which add-expense uses the search picker
+    USER_SEARCH_LIMIT = 50  # most matches /api/users/search returns
+
+    # Live updates over Server-Sent Events (live.py); needs an async worker class, see gunicorn.conf.py
+    LIVE_UPDATES = os.environ.get('LIVE_UPDATES') == '1'
+    LIVE_POLL_INTERVAL = 0.5  # seconds between event log reads per worker
+    LIVE_HEARTBEAT = 15.0  # seconds between keep-alive comments on an idle stream
+    LIVE_EVENT_RETENTION = 3600  # seconds of events a reconnecting client can replay
     
     # Database
     DATA_FOLDER = 'data'
     EXPENSES_FILE = os.path.join(DATA_FOLDER, 'expenses.json')
     USERS_FILE = os.path.join(DATA_FOLDER, 'users.json')
+    USERS_DB = os.path.join(DATA_FOLDER, 'users.db')
     
     # Logging
     LOG_LEVEL = 'INFO'
     LOG_FILE = 'app.log'
+    PRINT_ROUTES = os.environ.get('PRINT_ROUTES') == '1'  # or `flask --app app routes`
+
+    # Warm-up before gunicorn forks workers (gunicorn.conf.py, --preload)
+    WARMUP_TENANTS = int(os.environ.get('WARMUP_TENANTS', 20))  # largest tenants to preload; 0 disables
+
+    # Metrics (/metrics); set METRICS_TOKEN to require "Authorization: Bearer <token>",
+    # otherwise only scrapes from this host are answered
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_PUBLISH_INTERVAL = 5.0  # seconds between a worker's snapshots for cross-worker scrapes
     
     # Security
     PASSWORD_MIN_LENGTH = 6
     PASSWORD_MAX_LENGTH = 128
     USERNAME_MIN_LENGTH = 3
     USERNAME_MAX_LENGTH = 50
+    PASSWORD_HASH_METHOD = 'scrypt'  # werkzeug method string, e.g. 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = 2  # processes per app worker; 0 hashes inline
+    PASSWORD_HASH_QUEUE_DEPTH = 16  # waiting hashes before new logins are rejected
+    PASSWORD_HASH_TIMEOUT = 10.0  # seconds
+    GUNICORN_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 4))  # worker processes (gunicorn.conf.py)
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))  # request threads per gthread worker
+    LOGIN_TELEMETRY_FLUSH_INTERVAL = 5.0  # seconds of last_login updates a crash can lose
+    LOGIN_TELEMETRY_MAX_PENDING = 500  # flush early once this many users are buffered
     
+    # Cross-worker state (rate limits, idempotency keys, ...)
+    LOCAL_STORE_PATH = os.path.join(DATA_FOLDER, 'local_state.db')
+
+    # Idempotency keys on form submissions (idempotency.py)
+    IDEMPOTENCY_TTL = 24 * 3600  # seconds a submission can be replayed
+    IDEMPOTENCY_MAX_KEYS = 100  # remembered submissions per user
+
+    # Reverse proxies in front of the app (Render has one). Their X-Forwarded-For
+    # entries are trusted so rate limits key on the client, not the proxy; 0
+    # trusts none, which is right when clients connect directly.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+    # Rate limiting (token bucket per IP)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'  # load tests turn it off
+    RATE_LIMIT_BACKEND = 'sqlite'  # 'sqlite' (shared by all workers) or 'memory'
+    RATE_LIMIT_TTL = 3600  # seconds before an idle IP's bucket is dropped
+    LOGIN_RATE_LIMIT = (10, 60)  # requests, seconds
+    REGISTER_RATE_LIMIT = (5, 3600)
+
     # Features
     ENABLE_EMAIL_NOTIFICATIONS = False
     ENABLE_DUPLICATE_DETECTION = True
     DUPLICATE_THRESHOLD = 0.01  # $0.01
+    NEAR_DUPLICATE_SIMILARITY = 0.6  # estimated Jaccard over description shingles
+    NEAR_DUPLICATE_DATE_WINDOW = 3  # days
+    NEAR_DUPLICATE_AMOUNT_TOLERANCE = 0.05  # 5% relative difference
+    NEAR_DUPLICATE_REVIEW_LIMIT = 200
+    NEAR_DUPLICATE_INLINE_LIMIT = 5000  # larger partitions are scanned in the background
     
+    # Recurring expenses
+    RECURRING_SCHEDULER_ENABLED = False  # or run `python scheduler.py` from cron
+    RECURRING_SCHEDULER_INTERVAL = 3600  # seconds
+    RECURRING_MAX_CATCHUP = 366  # instances per template after downtime
+
     # Export
     EXPORT_FORMAT_CSV = 'csv'
     EXPORT_FORMAT_PDF = 'pdf'
@@ -54,6 +120,7 @@ class ProductionConfig(Config):
     TESTING = False
     SESSION_COOKIE_SECURE = True
     ENABLE_EMAIL_NOTIFICATIONS = True
+    RECURRING_SCHEDULER_ENABLED = True
 
 class TestingConfig(Config):
     """Testing configuration"""
@@ -62,6 +129,11 @@ class TestingConfig(Config):
     DATA_FOLDER = 'test_data'
     EXPENSES_FILE = os.path.join(DATA_FOLDER, 'expenses_test.json')
     USERS_FILE = os.path.join(DATA_FOLDER, 'users_test.json')
+    USERS_DB = os.path.join(DATA_FOLDER, 'users_test.db')
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast hashes keep tests quick
+    PASSWORD_HASH_WORKERS = 0
+    LOCAL_STORE_PATH = os.path.join(DATA_FOLDER, 'local_state_test.db')
+    RATE_LIMIT_BACKEND = 'memory'
 
 # Get config based on environment
 env = os.environ.get('FLASK_ENV', 'development')
@@ -1,21 +1,18 @@
 # decorators.py - Custom decorators and middleware
 from functools import wraps
-from flask import session, redirect, url_for, request, flash
-from datetime import datetime, timedelta
+from flask import current_app, session, redirect, url_for, request, flash
 import logging
+from idempotency import PENDING
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting dictionary - in production, use Redis
-rate_limit_store = {}
-
 def login_required(f):
     """Decorator to require login"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'username' not in session:
             flash('You must be logged in to access this page', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -25,44 +22,91 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'username' not in session:
             flash('You must be logged in', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         # Check if user is admin (can be implemented with database)
         # For now, just check if logged in
         return f(*args, **kwargs)
     return decorated_function
 
-def rate_limit(max_requests=10, time_window=3600):
-    """Decorator to implement rate limiting per IP"""
+def rate_limit(max_requests=10, time_window=3600, methods=None, scope=None, backend=None, limit=None):
+    """Decorator to rate limit a view per IP with a token bucket.
+
+    Allows bursts of `max_requests` and refills at max_requests/time_window
+    per second; `limit` instead names a config entry holding that pair.
+    Only requests whose method is in `methods` are counted (all if None).
+    The bucket lives in `backend`, by default the app's shared backend, so
+    the limit holds across gunicorn workers. RATE_LIMIT_ENABLED turns it off.
+    """
     def decorator(f):
+        key_prefix = scope or f.__name__
+
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            config = current_app.config
+            if not config.get("RATE_LIMIT_ENABLED", True) or (methods and request.method not in methods):
+                return f(*args, **kwargs)
+
+            capacity, window = config[limit] if limit else (max_requests, time_window)
             client_ip = request.remote_addr
-            current_time = datetime.now()
-            
-            # Initialize or get rate limit data
-            if client_ip not in rate_limit_store:
-                rate_limit_store[client_ip] = []
-            
-            # Remove old requests outside time window
-            rate_limit_store[client_ip] = [
-                req_time for req_time in rate_limit_store[client_ip]
-                if (current_time - req_time).total_seconds() < time_window
-            ]
+            allowed, retry_after = (backend or current_app.extensions["rate_limit_backend"]).hit(
+                f"{key_prefix}:{client_ip}", capacity, capacity / window)
             
             # Check if limit exceeded
-            if len(rate_limit_store[client_ip]) >= max_requests:
-                logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-                flash('Too many requests. Please try again later.', 'error')
-                return redirect(url_for('dashboard'))
-            
-            # Add current request
-            rate_limit_store[client_ip].append(current_time)
+            if not allowed:
+                logger.warning("Rate limit exceeded for IP: %s on %s", client_ip, key_prefix)
+                flash(f'Too many requests. Please try again in {int(retry_after) + 1} seconds.', 'error')
+                return redirect(url_for('main.dashboard'))
             
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+def idempotent(fallback, store=None):
+    """Decorator to answer a replayed form submission with its original redirect.
+
+    Forms carry a hidden `idempotency_key` (see idempotency.new_key). A POST
+    whose key was already handled for this user is redirected as the first
+    one was, without running the view; one still in flight is sent to the
+    `fallback` endpoint. Only redirects that flashed 'success' are recorded,
+    so a rejected or failed submission can be retried with the same key.
+    Forms on cached pages get their key client-side (static/idempotency.js).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.form.get("idempotency_key", "").strip()[:64]
+            username = session.get("username")
+            if request.method != "POST" or not key or not username:
+                return f(*args, **kwargs)
+
+            keys = store or current_app.extensions["idempotency"]
+            earlier = keys.claim(username, key)
+            if earlier is not None:
+                status, location = earlier
+                logger.info("Replayed submission %s for %s on %s", key, username, f.__name__)
+                if status == PENDING:
+                    flash("⏳ This form is already being processed", "info")
+                    return redirect(url_for(fallback))
+                flash("ℹ️ This form was already submitted", "info")
+                return redirect(location, status)
+
+            pending = len(session.get("_flashes", []))
+            try:
+                response = f(*args, **kwargs)
+            except Exception:
+                keys.release(username, key)
+                raise
+            status = getattr(response, "status_code", 200)
+            succeeded = any(category == "success" for category, _ in session.get("_flashes", [])[pending:])
+            if 300 <= status < 400 and succeeded:
+                keys.complete(username, key, status, response.headers["Location"])
+            else:
+                keys.release(username, key)  # a re-rendered form, a rejection or an error: let the user retry
+            return response
+        return decorated_function
+    return decorator
+
 def validate_json(f):
     """Decorator to validate JSON requests"""
     @wraps(f)
@@ -73,7 +117,7 @@ def validate_json(f):
             except Exception as e:
                 logger.error(f"Invalid JSON request: {e}")
                 flash('Invalid request format', 'error')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -86,11 +130,11 @@ def handle_exceptions(f):
         except ValueError as e:
             logger.warning(f"Validation error: {e}")
             flash(f'Validation error: {str(e)}', 'error')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         except Exception as e:
             logger.error(f"Unexpected error in {f.__name__}: {e}")
             flash('An unexpected error occurred. Please try again.', 'error')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
     return decorated_function
 
 def require_method(*methods):
@@ -101,7 +145,7 @@ def require_method(*methods):
             if request.method not in methods:
                 logger.warning(f"Invalid method {request.method} for {f.__name__}")
                 flash('Invalid request method', 'error')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
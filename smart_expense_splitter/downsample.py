@@ -0,0 +1,97 @@
+# downsample.py - Calendar bucketing and LTTB downsampling for time-series charts
+from datetime import date, timedelta
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def _parse(day):
+    try:
+        return date.fromisoformat(day[:10])
+    except ValueError:
+        return None
+
+
+def bucket(by_date, granularity):
+    """Roll {YYYY-MM-DD: amount} up to days, ISO weeks (keyed by Monday) or months"""
+    if granularity == "day":
+        return dict(by_date)
+    buckets = {}
+    for day, amount in by_date.items():
+        if granularity == "month":
+            key = day[:7]
+        else:
+            start = _parse(day)
+            if start is None:
+                continue
+            key = (start - timedelta(days=start.weekday())).isoformat()
+        buckets[key] = buckets.get(key, 0) + amount
+    return buckets
+
+
+def choose_granularity(by_date, target):
+    """Pick the finest calendar bucket that keeps the series near `target` points"""
+    days = sorted(d for d in map(_parse, by_date) if d)
+    if not days:
+        return "day"
+    span = (days[-1] - days[0]).days + 1
+    if len(by_date) <= target:
+        return "day"
+    if span / 7 <= target:
+        return "week"
+    return "month"
+
+
+def _x(label):
+    # Position on a common axis: day ordinal, or the first of the month
+    day = _parse(label if len(label) == 10 else f"{label}-01")
+    return day.toordinal() if day else None
+
+
+def lttb(labels, values, threshold):
+    """Largest-Triangle-Three-Buckets: keep `threshold` points that preserve the line's shape.
+
+    The first and last points are always kept; from every bucket in
+    between, the point forming the largest triangle with the previously
+    kept point and the next bucket's average is chosen.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return labels, values
+    xs = [_x(label) for label in labels]
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        span = max(next_end - next_start, 1)
+        avg_x = sum(xs[next_start:next_end]) / span if next_end > next_start else xs[-1]
+        avg_y = sum(values[next_start:next_end]) / span if next_end > next_start else values[-1]
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (values[j] - values[a]) - (xs[a] - xs[j]) * (avg_y - values[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return [labels[i] for i in keep], [values[i] for i in keep]
+
+
+def downsample(index, target=200, granularity="auto"):
+    """Return (granularity, labels, values) for a partition index's spending over time.
+
+    Works from the index's per-date rollup, never the raw expenses. With
+    granularity "auto" the calendar bucket is chosen from the date range;
+    whatever is still above `target` points is thinned with LTTB.
+    """
+    by_date = index.by_date()
+    if granularity == "auto":
+        granularity = choose_granularity(by_date, target)
+    buckets = index.by_month() if granularity == "month" else bucket(by_date, granularity)
+    labels = sorted(k for k in buckets if k and _x(k) is not None)
+    values = [round(buckets[k], 2) for k in labels]
+    labels, values = lttb(labels, values, target)
+    return granularity, labels, values
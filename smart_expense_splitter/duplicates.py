@@ -0,0 +1,173 @@
+# duplicates.py - Hash-bucketed duplicate expense detection
+import logging
+import threading
+from utils import amount_bucket, generate_expense_hash, is_duplicate_expense, synchronized
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """What the index keeps of an expense: enough to match and describe it.
+
+    Plain values rather than the Expense itself, so an index cached across
+    requests does not keep old requests' objects alive.
+    """
+    __slots__ = ("id", "description", "amount", "date", "payer_id")
+
+    def __init__(self, expense):
+        self.id = expense.id
+        self.description = expense.description
+        self.amount = expense.amount
+        self.date = expense.date
+        self.payer_id = expense.payer.id
+
+
+class _Bucket:
+    """Expenses sharing one duplicate hash, plus the cheapest and dearest member"""
+    __slots__ = ("members", "lowest", "highest")
+
+    def __init__(self, entry):
+        self.members = [entry]
+        self.lowest = entry
+        self.highest = entry
+
+    def add(self, entry):
+        self.members.append(entry)
+        if entry.amount < self.lowest.amount:
+            self.lowest = entry
+        if entry.amount > self.highest.amount:
+            self.highest = entry
+
+    def remove(self, entry):
+        self.members.remove(entry)
+        if self.members and entry in (self.lowest, self.highest):
+            self.lowest = min(self.members, key=lambda e: e.amount)
+            self.highest = max(self.members, key=lambda e: e.amount)
+
+
+class DuplicateIndex:
+    """Index of expenses keyed by normalized description + amount bucket + payer.
+
+    add() / remove() keep it current incrementally, so a cached index (see
+    indexes.duplicate_index) can follow edits without being rebuilt. Its
+    methods hold `lock`, since the cached index is shared between threads.
+    """
+
+    def __init__(self, threshold=0.01):
+        self.lock = threading.RLock()
+        self.threshold = threshold
+        self.buckets = {}
+        self._entries = {}
+
+    @classmethod
+    def from_expenses(cls, expenses, threshold=0.01):
+        """Build an index over an iterable of expenses"""
+        index = cls(threshold)
+        for expense in expenses:
+            index.add(expense)
+        return index
+
+    @synchronized
+    def add(self, expense):
+        """Add an expense to the index (re-indexes it if already present)"""
+        if expense.id in self._entries:
+            self.remove(expense.id)
+        key = generate_expense_hash(expense, self.threshold)
+        entry = _Entry(expense)
+        self._entries[expense.id] = (key, entry)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = _Bucket(entry)
+        else:
+            bucket.add(entry)
+
+    @synchronized
+    def remove(self, expense_id):
+        """Drop an expense from the index"""
+        found = self._entries.pop(expense_id, None)
+        if found is None:
+            return
+        key, entry = found
+        bucket = self.buckets[key]
+        bucket.remove(entry)
+        if not bucket.members:
+            del self.buckets[key]
+
+    @synchronized
+    def update(self, expense):
+        """Re-index an expense after it was edited"""
+        self.add(expense)
+
+    def _probe(self, expense):
+        """Yield (bucket, offset) for the expense's own and neighbouring amount buckets"""
+        center = amount_bucket(expense.amount, self.threshold)
+        for offset in (0, -1, 1):
+            bucket = self.buckets.get(generate_expense_hash(expense, bucket=center + offset))
+            if bucket is not None:
+                yield bucket, offset
+
+    @synchronized
+    def find_matches(self, expense, limit=5):
+        """Return up to `limit` indexed expenses that are likely duplicates of `expense`"""
+        matches = []
+        for bucket, _ in self._probe(expense):
+            for other in bucket.members:
+                if other.id != expense.id and is_duplicate_expense(expense, other, self.threshold):
+                    matches.append(other)
+                    if len(matches) >= limit:
+                        return matches
+        return matches
+
+    def closest_matches(self, expense):
+        """Yield at most one likely duplicate per probed amount bucket, each in O(1)"""
+        for bucket, offset in self._probe(expense):
+            # Same bucket: every member is within threshold, so any one but the
+            # probed expense itself will do. Neighbour buckets: only the member
+            # closest to our bucket can be within threshold.
+            if offset == 0:
+                candidate = next((m for m in bucket.members if m.id != expense.id), None)
+            else:
+                candidate = bucket.highest if offset < 0 else bucket.lowest
+            if (candidate is not None and candidate.id != expense.id
+                    and is_duplicate_expense(expense, candidate, self.threshold)):
+                yield candidate
+
+    @synchronized
+    def first_match(self, expense):
+        """Return one likely duplicate of `expense`, or None"""
+        return next(self.closest_matches(expense), None)
+
+def find_duplicates(expenses, threshold=0.01):
+    """Group likely duplicate expenses into clusters in near-linear time.
+
+    Each expense is linked to the closest earlier match in its own and both
+    neighbouring amount buckets; members of one bucket are always linked to
+    each other, so this is enough for union-find to merge whole clusters
+    without pairwise comparison. Returns a list of
+    clusters (lists of expenses, oldest first) with at least two members.
+    """
+    index = DuplicateIndex(threshold)
+    parent = {}
+
+    def find(expense_id):
+        while parent[expense_id] != expense_id:
+            parent[expense_id] = parent[parent[expense_id]]
+            expense_id = parent[expense_id]
+        return expense_id
+
+    by_id = {}
+    for expense in expenses:
+        by_id[expense.id] = expense
+        parent[expense.id] = expense.id
+        for match in index.closest_matches(expense):
+            parent[find(expense.id)] = find(match.id)
+        index.add(expense)
+
+    clusters = {}
+    for expense_id, expense in by_id.items():
+        clusters.setdefault(find(expense_id), []).append(expense)
+
+    result = [sorted(c, key=lambda e: e.date) for c in clusters.values() if len(c) > 1]
+    result.sort(key=lambda c: (-len(c), c[0].date))
+    logger.info("Found %d duplicate clusters in %d expenses", len(result), len(by_id))
+    return result
@@ -0,0 +1,46 @@
+# gunicorn.conf.py - Preloaded, warmed-up workers
+#
+#   gunicorn --chdir smart_expense_splitter --config gunicorn.conf.py app:app
+#
+# The app is imported once in the master, which then compiles templates and
+# preloads the largest tenants (WARMUP_TENANTS) before forking; workers start
+# with those caches already in memory and share them copy-on-write.
+# Set WEB_CONCURRENCY to change the number of workers.
+from config import app_config
+
+if app_config.LIVE_UPDATES:
+    # preload_app imports the app in the master, before the gevent worker
+    # would patch anything; patch first so the locks, queues and threads the
+    # app creates at import time are gevent-aware in every worker.
+    from gevent import monkey
+    monkey.patch_all()
+
+preload_app = True
+workers = app_config.GUNICORN_WORKERS
+
+if app_config.LIVE_UPDATES:
+    # Every open /events stream is a long-lived request; with gevent each one
+    # is a greenlet waiting on its queue rather than a whole sync worker.
+    worker_class = "gevent"
+    worker_connections = 1000
+else:
+    # Threads keep a worker serving while others wait on I/O or on the
+    # password hashing pool (hashing.py), which a sync worker cannot do.
+    worker_class = "gthread"
+    threads = app_config.GUNICORN_THREADS
+
+
+def when_ready(server):
+    from app import app
+    import warmup
+
+    # Background threads must not run in the master; workers start their own.
+    app.extensions["recurring_scheduler"].stop()
+    warmup.warm(app)
+
+
+def post_fork(server, worker):
+    from app import app
+    import warmup
+
+    warmup.after_fork(app)
@@ -0,0 +1,87 @@
+# hashing.py - Bounded process pool for password hashing and verification
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated and the request is rejected"""
+    pass
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class PasswordHasher:
+    """Runs scrypt/pbkdf2 hashing in a small process pool.
+
+    Hashing is CPU-bound and slow by design, so running it inline lets a
+    login burst occupy every request worker. Here at most `workers` hashes
+    run at once and at most `max_queue` more may wait; anything beyond that
+    fails immediately with HashingBusy instead of queueing behind the burst.
+    With `workers=0` hashing runs inline (tests, tiny deployments).
+
+    This only frees the request worker if it has other threads or
+    greenlets to run meanwhile (gunicorn's gthread or gevent worker class,
+    see gunicorn.conf.py). The pool processes come from a forkserver (or
+    spawn), never a plain fork of a process already running logging and
+    telemetry threads.
+    """
+
+    def __init__(self, method="scrypt", workers=2, max_queue=16, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Each forked gunicorn worker gets its own pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Password hashing pool saturated, rejecting request")
+            raise HashingBusy("Server is busy, please try again in a moment")
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash really finishes, even if this caller gives up waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy("Password check timed out, please try again")
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash (any supported method)"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
@@ -0,0 +1,72 @@
+# idempotency.py - Replay protection for form submissions
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+PENDING = 0  # status of a key whose first submission is still being handled
+
+
+def new_key():
+    """Return a fresh key for a form's hidden idempotency_key field"""
+    return uuid.uuid4().hex
+
+
+class IdempotencyStore:
+    """Outcomes of recent form submissions per (user, key), in the host-local store.
+
+    The first request with a key claims it; once it finishes with a redirect
+    the redirect is recorded, and a replay of the same key gets it back
+    without touching the user's data. Keys expire after `ttl` seconds and
+    each user keeps at most `max_keys`.
+    """
+
+    def __init__(self, store, ttl=24 * 3600, max_keys=100, cleanup_every=500):
+        self.store = store
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.cleanup_every = cleanup_every
+        self._claims = 0
+        self._ready = False
+
+    def _table(self):
+        if not self._ready:
+            self.store.ensure_table(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                "user TEXT NOT NULL, key TEXT NOT NULL, status INTEGER NOT NULL, "
+                "location TEXT, created REAL NOT NULL, PRIMARY KEY (user, key))")
+            self._ready = True
+
+    def claim(self, user, key, now=None):
+        """Reserve a key; return None if it is new, else the earlier (status, location)"""
+        now = time.time() if now is None else now
+        self._table()
+        with self.store.transaction() as conn:
+            row = conn.execute(
+                "SELECT status, location FROM idempotency_keys WHERE user = ? AND key = ? AND created >= ?",
+                (user, key, now - self.ttl)).fetchone()
+            if row is not None:
+                return row
+            conn.execute("INSERT OR REPLACE INTO idempotency_keys (user, key, status, location, created) "
+                         "VALUES (?, ?, ?, NULL, ?)", (user, key, PENDING, now))
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE user = ? AND key NOT IN ("
+                "SELECT key FROM idempotency_keys WHERE user = ? ORDER BY created DESC LIMIT ?)",
+                (user, user, self.max_keys))
+
+            self._claims += 1
+            if self._claims % self.cleanup_every == 0:
+                conn.execute("DELETE FROM idempotency_keys WHERE created < ?", (now - self.ttl,))
+        return None
+
+    def complete(self, user, key, status, location):
+        with self.store.transaction() as conn:
+            conn.execute("UPDATE idempotency_keys SET status = ?, location = ? WHERE user = ? AND key = ?",
+                         (status, location, user, key))
+
+    def release(self, user, key):
+        """Forget a claimed key so the submission can be retried"""
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE user = ? AND key = ?", (user, key))
+
@@ -0,0 +1,437 @@
+# indexes.py - Per-partition balance, aggregate and search indexes
+import os
+import json
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from splitter import expense_balance_deltas
+from duplicates import DuplicateIndex
+from near_duplicates import find_near_duplicates
+from metrics import timed
+from utils import synchronized
+
+logger = logging.getLogger(__name__)
+
+
+def _cents(amount):
+    """Convert an amount to integer cents so incremental sums stay exact"""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _bump(counter, key, amount):
+    """Add to a counter, dropping rows that fall back to zero"""
+    value = counter.get(key, 0) + amount
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PartitionIndex:
+    """Balances, aggregates and a description search index for one partition.
+
+    Holds only ids and numbers (never Expense objects), so an index built on
+    one request stays valid for later requests until the segment changes.
+    Every aggregate is kept in integer cents and updated incrementally by
+    add() / remove(); the public accessors return floats like the routes
+    always have. A cached index is shared by every thread of the worker, so
+    each method holds `lock`; save_changes holds it across a whole update.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._entries = {}
+        self.balances = defaultdict(Decimal)
+        self._total = 0
+        self._paid = 0
+        self._by_payer = {}
+        self._count_by_payer = {}
+        self._by_category = {}
+        self._by_month = {}
+        self._by_date = {}
+        self._by_payer_month = {}
+        self._descriptions = {}
+        self._postings = defaultdict(set)
+
+    @classmethod
+    def build(cls, expenses):
+        """Build an index over a partition's expenses"""
+        index = cls()
+        for expense in expenses:
+            index.add(expense)
+        return index
+
+    # ---------------- MUTATIONS ----------------
+
+    @synchronized
+    def add(self, expense):
+        """Index an expense (re-indexes it if already present)"""
+        if expense.id in self._entries:
+            self.remove(expense.id)
+
+        cents = _cents(expense.amount)
+        date = expense.date or ""
+        month = date[:7]
+        category = getattr(expense, 'category', None) or 'Other'
+        deltas = expense_balance_deltas(expense)
+        description = expense.description.lower()
+        entry = (expense.payer.id, cents, category, month, date, bool(expense.paid), deltas, description)
+        self._apply(entry, 1)
+        self._entries[expense.id] = entry
+
+        self._descriptions[expense.id] = description
+        for gram in _trigrams(description):
+            self._postings[gram].add(expense.id)
+
+    @synchronized
+    def remove(self, expense_id):
+        """Drop an expense from the index"""
+        entry = self._entries.pop(expense_id, None)
+        if entry is None:
+            return
+        self._apply(entry, -1)
+
+        self._descriptions.pop(expense_id, None)
+        for gram in _trigrams(entry[7]):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(expense_id)
+                if not ids:
+                    del self._postings[gram]
+
+    @synchronized
+    def update(self, expense):
+        """Re-index an expense after it was edited"""
+        self.add(expense)
+
+    def _apply(self, entry, sign):
+        payer_id, cents, category, month, date, paid, deltas, _ = entry
+        amount = sign * cents
+        self._total += amount
+        if paid:
+            self._paid += amount
+        _bump(self._by_payer, payer_id, amount)
+        _bump(self._count_by_payer, payer_id, sign)
+        _bump(self._by_category, category, amount)
+        _bump(self._by_month, month, amount)
+        _bump(self._by_date, date, amount)
+        _bump(self._by_payer_month, (payer_id, month), amount)
+        for user_id, delta in deltas:
+            self.balances[user_id] += delta if sign > 0 else -delta
+
+    # ---------------- AGGREGATES ----------------
+
+    @synchronized
+    def balance_map(self):
+        """A copy of the balances, safe to use while other threads update the index"""
+        return dict(self.balances)
+
+    @property
+    def count(self):
+        return len(self._entries)
+
+    @property
+    def total(self):
+        return self._total / 100
+
+    @property
+    def paid_total(self):
+        return self._paid / 100
+
+    @property
+    def unpaid_total(self):
+        return (self._total - self._paid) / 100
+
+    @synchronized
+    def paid_by(self):
+        """Total paid per payer id"""
+        return {k: v / 100 for k, v in self._by_payer.items()}
+
+    @synchronized
+    def count_by_payer(self):
+        """Number of expenses per payer id"""
+        return dict(self._count_by_payer)
+
+    @synchronized
+    def by_category(self):
+        return {k: v / 100 for k, v in self._by_category.items()}
+
+    @synchronized
+    def by_month(self):
+        return {k: v / 100 for k, v in self._by_month.items()}
+
+    @synchronized
+    def by_date(self):
+        return {k: v / 100 for k, v in self._by_date.items() if k}
+
+    @synchronized
+    def spent_by_payer(self, payer_id, period_prefix):
+        """Amount paid by one payer in a month (YYYY-MM) or year (YYYY)"""
+        if len(period_prefix) == 7:
+            return self._by_payer_month.get((payer_id, period_prefix), 0) / 100
+        return sum(self._by_payer_month.get((payer_id, f"{period_prefix}-{m:02d}"), 0)
+                   for m in range(1, 13)) / 100
+
+    # ---------------- SEARCH ----------------
+
+    @synchronized
+    def search(self, query):
+        """Return the ids of expenses whose description contains `query` (case-insensitive)"""
+        query = query.lower()
+        grams = _trigrams(query)
+        if not grams:
+            return {i for i, d in self._descriptions.items() if query in d}
+
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                break
+        return {i for i in candidates if query in self._descriptions[i]}
+
+
+# segment path -> ((mtime_ns, size), PartitionIndex), least recently used first
+_cache = OrderedDict()
+_CACHE_SIZE = 256
+
+
+def _segment_version(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except (OSError, TypeError):
+        return None
+
+
+# Guards the LRU dicts below; the indexes themselves have their own locks
+_cache_lock = threading.Lock()
+
+
+def _lookup(cache, path, version):
+    """Return the cached value for `path` if it was stored for `version`, else None"""
+    if version is None:
+        return None
+    with _cache_lock:
+        cached = cache.get(path)
+        if cached is None or cached[0] != version:
+            return None
+        cache.move_to_end(path)
+        return cached[1]
+
+
+def _remember(cache, path, version, index):
+    if version is not None:
+        with _cache_lock:
+            cache[path] = (version, index)
+            cache.move_to_end(path)
+            while len(cache) > _CACHE_SIZE:
+                cache.popitem(last=False)
+
+
+def store_partition_index(group, index):
+    """Keep an index that was updated in place as current for the segment just saved"""
+    _remember(_cache, group.segment_path, _segment_version(group.segment_path), index)
+
+
+def partition_index(group, build=True):
+    """Return the index for a group's loaded partition, reusing it while the segment is unchanged.
+
+    With build=False only a cached index is returned (else None); it still
+    reflects the segment on disk, even if the loaded group was since mutated.
+    """
+    path = group.segment_path
+    version = _segment_version(path)
+    cached = _lookup(_cache, path, version)
+    if cached is not None:
+        return cached
+    if not build:
+        return None
+
+    with timed("build_partition_index"):
+        index = PartitionIndex.build(group.expenses)
+    _remember(_cache, path, version, index)
+    return index
+
+
+# segment path -> ((mtime_ns, size), DuplicateIndex)
+_duplicate_cache = OrderedDict()
+
+
+def duplicate_index(group, threshold, build=True):
+    """Return the duplicate index for a group's loaded partition, reusing it while the segment is unchanged.
+
+    With build=False only an index that is already cached is returned (else
+    None), so callers that merely keep it current never pay for a build.
+    """
+    path = group.segment_path
+    version = _segment_version(path)
+    cached = _lookup(_duplicate_cache, path, version)
+    if cached is not None and cached.threshold == threshold:
+        return cached
+    if not build:
+        return None
+
+    with timed("build_duplicate_index"):
+        index = DuplicateIndex.from_expenses(group.expenses, threshold)
+    _remember(_duplicate_cache, path, version, index)
+    return index
+
+
+def store_duplicate_index(group, index):
+    """Keep a duplicate index that was updated in place as current for the segment just saved"""
+    _remember(_duplicate_cache, group.segment_path, _segment_version(group.segment_path), index)
+
+
+# segment path -> ((mtime_ns, size), (params, [(first id, second id, score)]))
+_near_duplicate_cache = OrderedDict()
+_near_duplicate_jobs = set()
+_near_duplicate_executor = None
+
+
+def _near_duplicates_file(path):
+    # Next to the segment, but not *.json, so page ETags (pagecache.data_version) ignore it
+    return f"{path}.near"
+
+
+def _read_near_duplicates(path):
+    """Return the persisted (version, params, pairs) for a segment, or None"""
+    try:
+        with open(_near_duplicates_file(path), encoding="utf-8") as f:
+            data = json.load(f)
+        return tuple(data["version"]), tuple(data["params"]), [tuple(p) for p in data["pairs"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def compute_near_duplicates(path, version, expenses, params):
+    """Run the MinHash/LSH scan over `expenses` of the segment at `path` and persist the result.
+
+    The result is written next to the segment, keyed by the segment version
+    the expenses were loaded at, and cached in memory; returns the id pairs.
+    """
+    threshold, date_window, amount_tolerance, limit = params
+    with timed("near_duplicate_scan"):
+        pairs = find_near_duplicates(expenses, threshold=threshold, date_window=date_window,
+                                     amount_tolerance=amount_tolerance, limit=limit)
+    found = [(first.id, second.id, score) for first, second, score in pairs]
+    if version is not None:
+        target = _near_duplicates_file(path)
+        with open(f"{target}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": list(version), "params": list(params), "pairs": found}, f)
+        os.replace(f"{target}.tmp", target)
+        _remember(_near_duplicate_cache, path, version, (params, found))
+    return found
+
+
+def _scan_in_background(path, version, expenses, params):
+    global _near_duplicate_executor
+    with _cache_lock:
+        if (path, version) in _near_duplicate_jobs:
+            return
+        _near_duplicate_jobs.add((path, version))
+        if _near_duplicate_executor is None:
+            _near_duplicate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="near-duplicates")
+
+    def job():
+        try:
+            compute_near_duplicates(path, version, expenses, params)
+        except Exception as e:
+            logger.warning("Near-duplicate scan of %s failed: %s", path, e)
+        finally:
+            with _cache_lock:
+                _near_duplicate_jobs.discard((path, version))
+
+    _near_duplicate_executor.submit(job)
+
+
+def near_duplicate_pairs(group, threshold, date_window, amount_tolerance, limit=None, inline_limit=0):
+    """Return (pairs, current): near-duplicate (first, second, score) pairs among non-settlement expenses.
+
+    Results are reused from memory or from the file the batch job
+    (python near_duplicates.py) and earlier scans persisted for this segment
+    version. On a miss, partitions of up to `inline_limit` expenses are
+    scanned in the request; larger ones in a background thread, and until it
+    finishes the last persisted result is returned with current=False.
+    """
+    path = group.segment_path
+    version = _segment_version(path)
+    params = (threshold, date_window, amount_tolerance, limit)
+    found, current = [], False
+
+    cached = _lookup(_near_duplicate_cache, path, version)
+    if cached is not None and cached[0] == params:
+        found, current = cached[1], True
+    else:
+        stored = _read_near_duplicates(path)
+        if stored is not None and stored[1] == params:
+            found, current = stored[2], stored[0] == version
+            if current:
+                _remember(_near_duplicate_cache, path, version, (params, found))
+
+    if not current:
+        expenses = [e for e in group.expenses if e.category != "Settlement"]
+        if len(expenses) <= inline_limit:
+            found, current = compute_near_duplicates(path, version, expenses, params), True
+        else:
+            _scan_in_background(path, version, expenses, params)
+
+    by_id = {e.id: e for e in group.expenses}
+    pairs = [(by_id[a], by_id[b], score) for a, b, score in found if a in by_id and b in by_id]
+    return pairs, current
+
+
+class UserNameIndex:
+    """Prefix search over member names: a sorted list of (word, name, id), searched with bisect.
+
+    Every word of a name is indexed, so "smi" finds "John Smith". Like
+    PartitionIndex it holds only strings, never User objects.
+    """
+
+    def __init__(self, users):
+        keys = set()
+        for user in users:
+            name = user.name.casefold()
+            for word in {name, *name.split()}:
+                keys.add((word, name, user.id))
+        self._keys = sorted(keys)
+        self._names = {user.id: user.name for user in users}
+
+    def search(self, query, limit=10):
+        """Return up to `limit` (id, name) pairs whose name or a word of it starts with `query`"""
+        query = query.strip().casefold()
+        matches = {}
+        i = bisect_left(self._keys, (query,))
+        while i < len(self._keys) and len(matches) < limit:
+            word, _, user_id = self._keys[i]
+            if not word.startswith(query):
+                break
+            matches.setdefault(user_id, self._names[user_id])
+            i += 1
+        return sorted(matches.items(), key=lambda item: item[1].casefold())
+
+
+# header path -> ((mtime_ns, size), UserNameIndex)
+_user_cache = OrderedDict()
+
+
+def user_index(file_path, load_users):
+    """Return the member name index for a group's header file, reusing it while the file is unchanged.
+
+    `load_users` is only called on a miss, so a search usually reads no JSON at all.
+    """
+    version = _segment_version(file_path)
+    cached = _lookup(_user_cache, file_path, version)
+    if cached is not None:
+        return cached
+
+    index = UserNameIndex(load_users())
+    _remember(_user_cache, file_path, version, index)
+    return index
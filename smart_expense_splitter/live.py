@@ -0,0 +1,163 @@
+# live.py - Per-user change events and Server-Sent Events fan-out
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EventLog:
+    """Append-only event table in the host-local store, readable by every worker.
+
+    A mutation in one gunicorn worker is published here and picked up by
+    the pollers of all workers, which forward it to their open streams.
+    """
+
+    def __init__(self, store, retention=3600, prune_every=500):
+        self.store = store
+        self.retention = retention
+        self.prune_every = prune_every
+        self._published = 0
+        store.ensure_table(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, tenant TEXT NOT NULL, "
+            "type TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)")
+        store.ensure_table("CREATE INDEX IF NOT EXISTS events_tenant ON events (tenant, id)")
+
+    def publish(self, tenant, events):
+        """Append [(type, data), ...] for a tenant; return the last event id"""
+        now = time.time()
+        rows = [(tenant, kind, json.dumps(data, separators=(",", ":")), now) for kind, data in events]
+        with self.store.transaction() as conn:
+            for row in rows:
+                cursor = conn.execute("INSERT INTO events (tenant, type, data, created) VALUES (?, ?, ?, ?)", row)
+            last_id = cursor.lastrowid
+        self._published += 1
+        if self._published % self.prune_every == 0:
+            self.prune(now)
+        return last_id
+
+    def after(self, last_id, tenant=None, limit=1000):
+        """Return (id, tenant, type, data) rows newer than last_id, oldest first"""
+        if tenant is None:
+            sql, args = "SELECT id, tenant, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+        else:
+            sql = "SELECT id, tenant, type, data FROM events WHERE tenant = ? AND id > ? ORDER BY id LIMIT ?"
+            args = (tenant, last_id, limit)
+        return self.store.connection().execute(sql, args).fetchall()
+
+    def latest_id(self):
+        row = self.store.connection().execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+
+
+class _Stream(queue.Queue):
+    overflowed = False
+
+
+class EventHub:
+    """Fans events out to the streams open in this process.
+
+    One poller thread per process reads new rows from the event log and
+    hands them to per-stream queues, so an idle stream costs a queue, not
+    a thread. Holding thousands of streams needs an async worker class
+    (gevent), where each stream is a greenlet.
+    """
+
+    def __init__(self, log, poll_interval=0.5, max_queue=256):
+        self.log = log
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, tenant):
+        self._ensure_thread()
+        stream = _Stream(self.max_queue)
+        with self._lock:
+            self._streams.setdefault(tenant, set()).add(stream)
+        return stream
+
+    def unsubscribe(self, tenant, stream):
+        with self._lock:
+            streams = self._streams.get(tenant)
+            if streams is not None:
+                streams.discard(stream)
+                if not streams:
+                    del self._streams[tenant]
+
+    def stream_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._streams.values())
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked worker where the parent's thread does not exist
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(self.log.latest_id(),),
+                                            name="live-events", daemon=True)
+            self._thread.start()
+
+    def _run(self, last_id):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = self.log.after(last_id)
+            except Exception as e:
+                logger.warning("Event poll failed: %s", e)
+                continue
+            for row in rows:
+                last_id = row[0]
+                with self._lock:
+                    streams = list(self._streams.get(row[1], ()))
+                for stream in streams:
+                    try:
+                        stream.put_nowait(row)
+                    except queue.Full:
+                        stream.overflowed = True  # a stalled client; dropped, it resyncs on reconnect
+
+
+def format_event(row):
+    event_id, _, kind, data = row
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+def stream_events(hub, tenant, last_event_id=None, heartbeat=15.0):
+    """Yield SSE text: events missed since Last-Event-ID, then live ones, with keep-alive comments"""
+    stream = hub.subscribe(tenant)
+    try:
+        yield "retry: 3000\n\n"
+        if last_event_id is None:
+            # A fresh page already shows everything up to now; skip what the poller has yet to deliver
+            sent = hub.log.latest_id()
+        else:
+            sent = last_event_id
+            for row in hub.log.after(last_event_id, tenant=tenant):
+                sent = row[0]
+                yield format_event(row)
+        while True:
+            try:
+                row = stream.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if row[0] > sent:
+                yield format_event(row)
+            if stream.overflowed:
+                return  # the browser reconnects with Last-Event-ID and replays the gap from the log
+    finally:
+        hub.unsubscribe(tenant, stream)
@@ -0,0 +1,68 @@
+# localstore.py - Host-local SQLite store for state shared by gunicorn workers
+import os
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStore:
+    """A SQLite database every worker process on the host can see.
+
+    Used for small pieces of cross-worker state (rate-limit buckets,
+    idempotency keys, ...). Connections are per thread and re-opened after a
+    fork; WAL mode lets readers run alongside the single writer.
+    """
+
+    def __init__(self, path):
+        # Resolved now: threads open their connections later, whatever the working directory is then
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Autocommit mode: callers open transactions explicitly with
+            # BEGIN IMMEDIATE when they read-modify-write.
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ensure_table(self, ddl):
+        """Run a CREATE TABLE IF NOT EXISTS statement"""
+        self.connection().execute(ddl)
+
+    def transaction(self):
+        """Return a context manager holding the write lock (BEGIN IMMEDIATE ... COMMIT)"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+_stores = {}
+
+def get_store(path=None):
+    """Return the shared LocalStore for `path` (LOCAL_STORE_PATH by default)"""
+    if path is None:
+        from config import app_config
+        path = app_config.LOCAL_STORE_PATH
+    path = os.path.abspath(path)
+    if path not in _stores:
+        _stores[path] = LocalStore(path)
+    return _stores[path]
@@ -0,0 +1,111 @@
+# logging_setup.py - Queue-based logging so request threads never wait on log I/O
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+_listener = None
+_handlers = []
+_lock = threading.Lock()
+
+
+def setup_logging(level="INFO", log_file=None):
+    """Route all records through a queue drained by one background listener.
+
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener, _handlers
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = logging.Formatter(LOG_FORMAT)
+        _handlers = [logging.StreamHandler(sys.stderr)]
+        if log_file:
+            _handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+        for handler in _handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.handlers[:] = [QueueHandler(log_queue)]
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, *_handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork; give the child its own.
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_handlers, respect_handler_level=True)
+        _listener.start()
+
+
+class SkipCounter:
+    """Count repeated problems in a loop and log them once as a summary"""
+
+    def __init__(self, logger, what):
+        self.logger = logger
+        self.what = what
+        self.counts = {}
+        self.examples = {}
+
+    def add(self, reason, example=None):
+        self.counts[reason] = self.counts.get(reason, 0) + 1
+        if example is not None:
+            self.examples.setdefault(reason, example)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def report(self, source=""):
+        for reason, count in self.counts.items():
+            if throttle.allow((self.logger.name, self.what, reason, source)):
+                self.logger.warning("Skipped %s invalid %s in %s (%s, e.g. %s)",
+                                    f"{count:,}", self.what, source or "input", reason,
+                                    self.examples.get(reason))
+
+
+class LogThrottle:
+    """Let a given warning through at most once per interval"""
+
+    def __init__(self, interval=60.0, max_keys=1024):
+        self.interval = interval
+        self.max_keys = max_keys
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                return False
+            if len(self._last) >= self.max_keys:
+                self._last.clear()
+            self._last[key] = now
+            return True
+
+
+throttle = LogThrottle()
@@ -0,0 +1,334 @@
+# metrics.py - Request and hot-path instrumentation in Prometheus text format
+import os
+import json
+import time
+import bisect
+import logging
+import sqlite3
+import threading
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self):
+        """Return this worker's values as JSON-ready [labels, value] pairs"""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def _add(values, labels, value):
+        # Counters and gauges from several workers are summed
+        values[labels] = values.get(labels, 0) + value
+
+    def render(self, values):
+        lines = self._header()
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge; merged across workers by summing, so keep it to per-worker quantities"""
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets; observe() only bumps one bucket counter"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), [list(counts), total]] for labels, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def _add(values, labels, value):
+        counts, total = value
+        series = values.get(labels)
+        if series is None:
+            values[labels] = [list(counts), total]
+        else:
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+
+    def render(self, values):
+        lines = self._header()
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', le))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def clear(self):
+        for metric in self._metrics:
+            with metric._lock:
+                metric._values.clear()
+
+    def snapshot(self):
+        """Return this worker's values as JSON-ready {metric name: [[labels, value], ...]}"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def merge(self, snapshots):
+        """Combine several workers' snapshots into one"""
+        merged = {}
+        for metric in self._metrics:
+            values = {}
+            for snapshot in snapshots:
+                for labels, value in snapshot.get(metric.name, ()):
+                    metric._add(values, tuple(labels), value)
+            merged[metric.name] = [[list(labels), value] for labels, value in values.items()]
+        return merged
+
+    def render(self, snapshot=None):
+        """Return every metric in Prometheus text exposition format (this worker's by default)"""
+        if snapshot is None:
+            snapshot = self.snapshot()
+        lines = []
+        for metric in self._metrics:
+            values = {}
+            for labels, value in snapshot.get(metric.name, ()):
+                metric._add(values, tuple(labels), value)
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+class WorkerSnapshots:
+    """Every worker's metric values on this host, shared through the LocalStore.
+
+    Workers publish their registry at most every `interval` seconds from
+    after_request, and whenever they answer a scrape; a scrape merges all
+    of them, so counters and histograms cover every worker, not just the
+    one that answered. Snapshots of workers that have exited are folded
+    into a single retired row, which keeps the totals from going backwards.
+    """
+    RETIRED = 0  # pid of the row holding exited workers' values
+
+    def __init__(self, store, registry, interval=5.0):
+        self.store = store
+        self.registry = registry
+        self.interval = interval
+        self._last_publish = None
+        self._ready = False
+
+    def _table(self):
+        if not self._ready:
+            self.store.ensure_table(
+                "CREATE TABLE IF NOT EXISTS metric_snapshots ("
+                "pid INTEGER PRIMARY KEY, updated REAL NOT NULL, data TEXT NOT NULL)")
+            self._ready = True
+
+    def publish(self):
+        """Store this worker's current values"""
+        self._table()
+        self._last_publish = time.monotonic()
+        data = json.dumps(self.registry.snapshot())
+        with self.store.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO metric_snapshots (pid, updated, data) VALUES (?, ?, ?)",
+                         (os.getpid(), time.time(), data))
+
+    def maybe_publish(self):
+        if self._last_publish is None or time.monotonic() - self._last_publish >= self.interval:
+            try:
+                self.publish()
+            except sqlite3.Error as e:
+                logger.warning("Could not publish metrics: %s", e)
+
+    def collect(self):
+        """Publish this worker's values and return the merged snapshot of every worker"""
+        self.publish()
+        with self.store.transaction() as conn:
+            rows = conn.execute("SELECT pid, data FROM metric_snapshots").fetchall()
+            snapshots, retired, exited = [], [], []
+            for pid, data in rows:
+                snapshot = json.loads(data)
+                snapshots.append(snapshot)
+                if pid == self.RETIRED:
+                    retired.append(snapshot)
+                elif not _alive(pid):
+                    retired.append(snapshot)
+                    exited.append(pid)
+            if exited:
+                conn.executemany("DELETE FROM metric_snapshots WHERE pid = ?", [(pid,) for pid in exited])
+                conn.execute("INSERT OR REPLACE INTO metric_snapshots (pid, updated, data) VALUES (?, ?, ?)",
+                             (self.RETIRED, time.time(), json.dumps(self.registry.merge(retired))))
+        return self.registry.merge(snapshots)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by someone else
+    return True
+
+
+REGISTRY = Registry()
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")))
+SPAN_LATENCY = REGISTRY.register(Histogram(
+    "span_duration_seconds", "Latency of instrumented code paths", ("span",)))
+# Sizes are aggregated across tenants: a label per tenant would expose
+# usernames and grow without bound
+PARTITION_OBJECTS = REGISTRY.register(Histogram(
+    "loaded_partition_objects", "Users / expenses in each loaded partition", ("kind",),
+    buckets=(1, 10, 100, 1000, 10_000, 100_000, 1_000_000)))
+
+
+class timed:
+    """Record the duration of a block or function under SPAN_LATENCY.
+
+    Usable as `with timed("load_group"):` or as `@timed("load_group")`.
+    """
+
+    def __init__(self, span):
+        self.span = span
+        self._starts = threading.local()
+
+    def __enter__(self):
+        stack = getattr(self._starts, "stack", None)
+        if stack is None:
+            stack = self._starts.stack = []
+        stack.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        SPAN_LATENCY.observe(time.perf_counter() - self._starts.stack.pop(), self.span)
+        return False
+
+    def __call__(self, f):
+        span = self.span
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                SPAN_LATENCY.observe(time.perf_counter() - start, span)
+        return wrapper
+
+
+def record_partition_size(group):
+    """Record user / expense counts for a freshly loaded group"""
+    PARTITION_OBJECTS.observe(len(group.users), "users")
+    PARTITION_OBJECTS.observe(len(group.expenses), "expenses")
+
+
+def init_app(app, store=None, publish_interval=5.0):
+    """Time every request and template render, and serve /metrics.
+
+    Each gunicorn worker keeps its own registry; with a LocalStore they
+    are shared as app.extensions["metrics"] (WorkerSnapshots) and a scrape
+    reports the sum over all workers on the host. Without one, a scrape
+    reports the worker that answered it. /metrics requires METRICS_TOKEN
+    when one is set; without one it only answers scrapes from this host.
+    """
+    snapshots = WorkerSnapshots(store, REGISTRY, publish_interval) if store is not None else None
+    app.extensions["metrics"] = snapshots
+
+    from flask import Response, g, request, abort, before_render_template, template_rendered
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+        if snapshots is not None:
+            snapshots.maybe_publish()
+        return response
+
+    def _template_started(sender, template, context, **extra):
+        g.setdefault("_template_starts", []).append(time.perf_counter())
+
+    def _template_finished(sender, template, context, **extra):
+        starts = g.get("_template_starts")
+        if starts:
+            SPAN_LATENCY.observe(time.perf_counter() - starts.pop(), f"render:{template.name}")
+
+    # weak=False: the receivers are local functions that would otherwise be collected
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics():
+        token = app.config.get("METRICS_TOKEN")
+        if token:
+            if request.headers.get("Authorization") != f"Bearer {token}":
+                abort(401)
+        elif request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+        snapshot = snapshots.collect() if snapshots is not None else None
+        return Response(REGISTRY.render(snapshot), mimetype="text/plain; version=0.0.4")
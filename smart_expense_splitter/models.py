@@ -43,7 +43,11 @@ class Expense:
         self.tags = tags if tags else []
         self.is_recurring = False
         self.recurrence_type = None
+        self.next_due_date = None
+        self.recurrence_parent_id = None
+        self.group_id = None
         self.custom_splits = {}
+        self.seq = 0  # partition sequence number of the last change (storage.py)
 
 
 class Budget:
@@ -85,11 +89,31 @@ class Group:
         self.budgets = []
         self.groups = []
         self.active_group = None
+        # Partition bookkeeping (see storage.py): which ExpenseGroup's
+        # expenses are in self.expenses and where they are stored
+        self.loaded_partition = None
+        self.segment_path = None
+        self.legacy_expenses = None
+        self._users_by_id = {}
+        self._users_by_id_source = None
+        self._users_by_id_count = 0
+        # Change feed bookkeeping for the loaded partition (see storage.save_group)
+        self.seq = 0
+        self.change_horizon = 0
+        self.tombstones = []
+        self.loaded_rows = {}
 
     def get_user_by_id(self, user_id):
         if not user_id:
             return None
-        return next((u for u in self.users if u.id == user_id), None)
+        # The id map is rebuilt whenever self.users is reassigned or changes size
+        if self._users_by_id_source is not self.users or self._users_by_id_count != len(self.users):
+            self._users_by_id = {}
+            for u in self.users:
+                self._users_by_id.setdefault(u.id, u)
+            self._users_by_id_source = self.users
+            self._users_by_id_count = len(self.users)
+        return self._users_by_id.get(user_id)
 
     def add_user(self, user):
         if not user or not user.name:
@@ -0,0 +1,140 @@
+# pagecache.py - Conditional GET and rendered-page caching for read-only views
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from metrics import REGISTRY, Counter
+
+PAGE_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "page_cache_requests_total", "Cached page lookups by result (not_modified, hit, miss, bypass)", ("result",)))
+
+
+def data_version(file_path):
+    """Return a token that changes whenever the tenant's header or any segment is rewritten.
+
+    Every save rewrites the header, and segments are compared too, so no
+    JSON has to be parsed to know whether a page is still current.
+    """
+    parts = []
+    try:
+        stat = os.stat(file_path)
+        parts.append((stat.st_mtime_ns, stat.st_size))
+    except FileNotFoundError:
+        parts.append(None)
+    root, _ = os.path.splitext(file_path)
+    try:
+        with os.scandir(f"{root}.groups") as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    parts.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    except FileNotFoundError:
+        pass
+    return repr(sorted(parts, key=repr))
+
+
+class PageCache:
+    """Bounded LRU of rendered pages, keyed by their ETag"""
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(etag, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[etag] = (body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def _release():
+    # Code or template changes must not be answered with 304 for pages rendered by the old release
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for folder in (here, os.path.join(here, "templates")):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith((".py", ".html")):
+                digest.update(f"{name}:{os.stat(os.path.join(folder, name)).st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+RELEASE = _release()
+
+
+def cached_page(file_for_user, flashes=True):
+    """Decorator for GET views that only depend on the user's group data and query string.
+
+    Rendered pages are kept in the app's PageCache, app.extensions["page_cache"].
+    The weak ETag is derived from (user, group data version, route, args),
+    so If-None-Match is answered with 304 before anything is loaded or
+    rendered. Requests with pending flash messages bypass the cache unless
+    `flashes` is False (JSON views never display them).
+    """
+    from flask import current_app, request, session, make_response
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            username = session.get("username")
+            if not username or (flashes and session.get("_flashes")):
+                PAGE_CACHE_REQUESTS.inc("bypass")
+                return f(*args, **kwargs)
+
+            key = "|".join([
+                RELEASE,
+                username,
+                data_version(file_for_user(username)),
+                request.path,
+                repr(sorted(request.args.items(multi=True))),
+                date.today().isoformat(),  # reports depend on the current month
+            ])
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                PAGE_CACHE_REQUESTS.inc("not_modified")
+                response = make_response("", 304)
+            else:
+                cache = current_app.extensions["page_cache"]
+                entry = cache.get(etag)
+                if entry is not None:
+                    PAGE_CACHE_REQUESTS.inc("hit")
+                    response = make_response(entry[0])
+                    response.mimetype = entry[1]
+                else:
+                    PAGE_CACHE_REQUESTS.inc("miss")
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or (flashes and session.get("_flashes")):
+                        return response  # redirects and pages that flashed are not reusable
+                    cache.put(etag, response.get_data(), response.mimetype)
+
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True  # always revalidate, usually with a 304
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,94 @@
+# ratelimit.py - Token-bucket rate limiting with pluggable backends
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    """Return the bucket's token count at `now`"""
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Token buckets in this process, O(1) state per key.
+
+    Keys idle for longer than `ttl` seconds (by then the bucket is full
+    again, so forgetting it changes nothing) are evicted, and at most
+    `max_keys` are kept.
+    """
+
+    def __init__(self, ttl=3600, max_keys=100_000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, capacity, rate, now=None):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now):
+        # Oldest-touched keys sit at the front of the OrderedDict
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated <= self.ttl and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    """Token buckets in the host-local store, shared by every worker process"""
+
+    def __init__(self, store, ttl=3600, cleanup_every=1000):
+        self.store = store
+        self.ttl = ttl
+        self.cleanup_every = cleanup_every
+        self._calls = 0
+        self._ready = False
+
+    def _table(self):
+        if not self._ready:
+            self.store.ensure_table(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._ready = True
+
+    def hit(self, key, capacity, rate, now=None):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        now = time.time() if now is None else now
+        self._table()
+        with self.store.transaction() as conn:
+            row = conn.execute("SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*(row or (capacity, now)), now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+
+            self._calls += 1
+            if self._calls % self.cleanup_every == 0:
+                conn.execute("DELETE FROM rate_limits WHERE updated < ?", (now - self.ttl,))
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+def create_backend(config, store):
+    """Return the backend named by config.RATE_LIMIT_BACKEND ('sqlite' in `store`, or 'memory')"""
+    if config.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(ttl=config.RATE_LIMIT_TTL)
+    return SQLiteBackend(store, ttl=config.RATE_LIMIT_TTL)
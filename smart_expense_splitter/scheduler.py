@@ -0,0 +1,303 @@
+# scheduler.py - Materializes due instances of recurring expenses
+import os
+import sys
+import glob
+import heapq
+import logging
+import calendar
+import threading
+from datetime import date, timedelta
+from models import Expense
+
+logger = logging.getLogger(__name__)
+
+RECURRENCE_TYPES = ("daily", "weekly", "monthly", "yearly")
+
+
+def advance_date(date_string, recurrence_type, anchor_day=None):
+    """Return the next occurrence (YYYY-MM-DD) after `date_string`.
+
+    `anchor_day` is the template's original day of month, so a series that
+    started on Jan 31 goes Feb 28, Mar 31, ... instead of drifting to the 28th.
+    """
+    current = date.fromisoformat(date_string[:10])
+    anchor_day = anchor_day or current.day
+    if recurrence_type == "daily":
+        return (current + timedelta(days=1)).isoformat()
+    if recurrence_type == "weekly":
+        return (current + timedelta(weeks=1)).isoformat()
+    if recurrence_type == "yearly":
+        year = current.year + 1
+        day = min(anchor_day, calendar.monthrange(year, current.month)[1])
+        return date(year, current.month, day).isoformat()
+
+    # monthly: clamp the day to the length of the next month (Jan 31 -> Feb 28)
+    year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+    day = min(anchor_day, calendar.monthrange(year, month)[1])
+    return date(year, month, day).isoformat()
+
+
+def make_recurring(expense, recurrence_type):
+    """Turn an expense into a recurring template whose next instance follows its date.
+
+    On a template that already recurs only the recurrence type changes: its
+    next due date stays put, so instances already created are not repeated.
+    """
+    if recurrence_type not in RECURRENCE_TYPES:
+        recurrence_type = "monthly"
+    if not (expense.is_recurring and expense.next_due_date):
+        expense.next_due_date = advance_date(expense.date, recurrence_type)
+    expense.is_recurring = True
+    expense.recurrence_type = recurrence_type
+    return expense
+
+
+def _anchor_day(template):
+    """Return the day of month a recurring template was first dated on"""
+    try:
+        return date.fromisoformat(template.date[:10]).day
+    except (TypeError, ValueError):
+        return None
+
+
+def _instantiate(template, due_date):
+    """Create one instance of a recurring template dated `due_date`"""
+    instance = Expense(
+        template.description,
+        template.amount,
+        template.payer,
+        template.participants,
+        category=template.category,
+        notes=template.notes,
+        tags=list(template.tags)
+    )
+    instance.date = due_date
+    instance.recurrence_parent_id = template.id
+    return instance
+
+
+class RecurringSchedule:
+    """Min-heap of a group's recurring templates keyed by next due date"""
+
+    def __init__(self, expenses):
+        self._heap = [
+            (e.next_due_date, e.id, e) for e in expenses
+            if e.is_recurring and e.next_due_date
+        ]
+        heapq.heapify(self._heap)
+
+    def next_due_date(self):
+        """Return the earliest due date, or None if nothing is scheduled"""
+        return self._heap[0][0] if self._heap else None
+
+    def materialize_due(self, today, max_catchup=366):
+        """Create every instance due on or before `today`, in date order.
+
+        Costs O(k log n) for k due instances and n templates. A template that
+        missed several periods (e.g. after downtime) gets one instance per
+        missed period, capped at `max_catchup` per template.
+        """
+        created = []
+        emitted = {}
+        while self._heap and self._heap[0][0] <= today:
+            due_date, expense_id, template = heapq.heappop(self._heap)
+            created.append(_instantiate(template, due_date))
+            template.next_due_date = advance_date(due_date, template.recurrence_type, _anchor_day(template))
+            emitted[expense_id] = emitted.get(expense_id, 0) + 1
+            if emitted[expense_id] < max_catchup:
+                heapq.heappush(self._heap, (template.next_due_date, expense_id, template))
+            elif template.next_due_date <= today:
+                logger.warning("Recurring expense %s hit the catch-up cap of %d", expense_id, max_catchup)
+        return created
+
+
+def materialize_group(group, today=None, max_catchup=366):
+    """Append all due recurring instances to `group`; return the new expenses"""
+    today = today or date.today().isoformat()
+    created = RecurringSchedule(group.expenses).materialize_due(today, max_catchup)
+    for expense in created:
+        expense.group_id = group.loaded_partition
+    group.expenses.extend(created)
+    return created
+
+
+class RecurringScheduler:
+    """Periodically materializes due recurring expenses for every tenant file.
+
+    A min-heap of (earliest due date, group file, partition) is built by one
+    full scan when the loop starts; after that a tick only loads the
+    partitions that have something due. Templates created or re-armed by
+    any worker reach the heap through the `recurring_due` table of the
+    host-local `store`. Only one process per host runs the loop: the others
+    fail to take the lock file and stay idle.
+    """
+
+    def __init__(self, data_folder="data", interval=3600, max_catchup=366, store=None):
+        self.data_folder = data_folder
+        self.interval = interval
+        self.max_catchup = max_catchup
+        self.store = store
+        self._heap = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def _group_files(self):
+        return glob.glob(os.path.join(self.data_folder, "expenses_*.json"))
+
+    def _table(self):
+        self.store.ensure_table(
+            "CREATE TABLE IF NOT EXISTS recurring_due ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, due_date TEXT NOT NULL, "
+            "file_path TEXT NOT NULL, partition TEXT NOT NULL)")
+
+    def schedule(self, file_path, due_date, partition=None):
+        """Register that a partition of `file_path` has something due on `due_date`.
+
+        With a store the entry is queued there for whichever process runs
+        the loop; without one it goes straight into this process's heap.
+        """
+        if not due_date:
+            return
+        # "" stands for the default partition so heap tuples stay comparable
+        entry = (due_date, file_path, partition or "")
+        if self.store is None:
+            with self._lock:
+                heapq.heappush(self._heap, entry)
+            return
+        self._table()
+        with self.store.transaction() as conn:
+            conn.execute("INSERT INTO recurring_due (due_date, file_path, partition) VALUES (?, ?, ?)", entry)
+
+    def drain(self):
+        """Move entries queued in the store into the heap; return how many"""
+        if self.store is None:
+            return 0
+        self._table()
+        with self.store.transaction() as conn:
+            rows = conn.execute("SELECT id, due_date, file_path, partition FROM recurring_due ORDER BY id").fetchall()
+            if rows:
+                conn.execute("DELETE FROM recurring_due WHERE id <= ?", (rows[-1][0],))
+        with self._lock:
+            for _, due_date, file_path, partition in rows:
+                heapq.heappush(self._heap, (due_date, file_path, partition))
+        return len(rows)
+
+    def scan(self):
+        """Rebuild the heap from every partition of every group file.
+
+        Reads every tenant, so it only runs when the loop starts (in a fresh
+        or forked worker); later changes arrive through schedule().
+        """
+        from storage import load_group, partition_ids
+
+        heap = []
+        for file_path in self._group_files():
+            try:
+                header = load_group(file_path, group_id=None)
+                for partition in partition_ids(header):
+                    group = header if partition is None else load_group(file_path, group_id=partition)
+                    due_date = RecurringSchedule(group.expenses).next_due_date()
+                    if due_date:
+                        heap.append((due_date, file_path, partition or ""))
+            except Exception as e:
+                logger.warning("Scheduler could not load %s: %s", file_path, e)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+
+    def run_once(self, today=None):
+        """Materialize everything due for every tenant; return the number of instances created"""
+        from storage import load_group, save_group, TenantLock
+
+        today = today or date.today().isoformat()
+        total = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > today:
+                    break
+                _, file_path, partition = heapq.heappop(self._heap)
+                # Drop stale duplicate entries for the same partition
+                while self._heap and self._heap[0][1:] == (file_path, partition) and self._heap[0][0] <= today:
+                    heapq.heappop(self._heap)
+
+            try:
+                with TenantLock(file_path):  # requests writing the same tenant wait for us
+                    group = load_group(file_path, group_id=partition or None)
+                    schedule = RecurringSchedule(group.expenses)
+                    created = schedule.materialize_due(today, self.max_catchup)
+                    if created:
+                        for expense in created:
+                            expense.group_id = group.loaded_partition
+                        group.expenses.extend(created)
+                        save_group(group, file_path)  # one write per partition per tick
+                if created:
+                    total += len(created)
+                    logger.info("Materialized %d recurring expenses for %s", len(created), file_path)
+                next_due = schedule.next_due_date()
+                if next_due:
+                    with self._lock:
+                        heapq.heappush(self._heap, (next_due, file_path, partition))
+            except Exception as e:
+                logger.error("Scheduler failed for %s: %s", file_path, e)
+        return total
+
+    def _acquire_host_lock(self):
+        """Take a non-blocking lock so only one worker per host runs the loop"""
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        os.makedirs(self.data_folder, exist_ok=True)
+        self._lock_file = open(os.path.join(self.data_folder, ".scheduler.lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def _loop(self):
+        self.scan()
+        while not self._stop.is_set():
+            self.drain()
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the background thread if no other process on this host runs one"""
+        if self._thread or not self._acquire_host_lock():
+            return False
+        self._thread = threading.Thread(target=self._loop, name="recurring-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Recurring scheduler started (interval %ss)", self.interval)
+        return True
+
+    def stop(self):
+        """Stop the background thread and give up the host lock"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def after_fork(self):
+        """Reset state inherited from the parent process in a forked child"""
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None  # the parent's descriptor; the child must not release it
+
+
+if __name__ == "__main__":
+    # CLI: python scheduler.py [YYYY-MM-DD]  - materialize everything due, then exit
+    from config import app_config
+
+    scheduler = RecurringScheduler(app_config.DATA_FOLDER, max_catchup=app_config.RECURRING_MAX_CATCHUP)
+    scheduler.scan()
+    count = scheduler.run_once(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"✅ Materialized {count} recurring expenses")
@@ -1,35 +1,42 @@
 from decimal import Decimal, ROUND_HALF_UP
 from collections import defaultdict
 import logging
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+def expense_balance_deltas(expense):
+    """Return the (user_id, Decimal) balance changes caused by one expense"""
+    if not expense.amount or not expense.participants:
+        return []
+        
+    amount = Decimal(str(expense.amount))
+    participants = expense.participants
+    
+    # Skip expenses with no participants to avoid division by zero
+    if len(participants) == 0:
+        logger.warning(f"Expense {expense.id} has no participants, skipping")
+        return []
+    
+    # Use Decimal for precise financial calculations
+    share = (amount / len(participants)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    deltas = [(user.id, -share) for user in participants]
+    deltas.append((expense.payer.id, amount))
+    return deltas
+
+@timed("calculate_balances")
 def calculate_balances(group):
     """Calculate balances with improved precision"""
     balances = defaultdict(Decimal)
 
     for expense in group.expenses:
-        if not expense.amount or not expense.participants:
-            continue
-            
-        amount = Decimal(str(expense.amount))
-        participants = expense.participants
-        
-        # Skip expenses with no participants to avoid division by zero
-        if len(participants) == 0:
-            logger.warning(f"Expense {expense.id} has no participants, skipping")
-            continue
-        
-        # Use Decimal for precise financial calculations
-        share = (amount / len(participants)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        for user in participants:
-            balances[user.id] -= share
-
-        balances[expense.payer.id] += amount
+        for user_id, delta in expense_balance_deltas(expense):
+            balances[user_id] += delta
 
     return balances
 
+@timed("settle_debts")
 def settle_debts(balances, users):
     """Settle debts with optimized algorithm"""
     debtors = []
@@ -0,0 +1,17 @@
+// idempotency.js - Give forms on cached pages their idempotency key when they are first submitted
+(function () {
+    if (!(window.crypto && crypto.randomUUID)) return;  // the form still posts, just without replay protection
+
+    // A key rendered into a cached page would be shared by every copy served from the cache,
+    // so forms marked data-idempotent get one here; a double submit reuses it.
+    document.addEventListener('submit', e => {
+        const form = e.target;
+        if (e.defaultPrevented || !form.matches('form[data-idempotent]')) return;
+        if (form.querySelector('input[name="idempotency_key"]')) return;
+        const key = document.createElement('input');
+        key.type = 'hidden';
+        key.name = 'idempotency_key';
+        key.value = crypto.randomUUID().replace(/-/g, '');
+        form.appendChild(key);
+    });
+})();
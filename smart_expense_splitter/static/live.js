@@ -0,0 +1,143 @@
+// live.js - Patch the dashboard and settlements page from the /events stream
+(function () {
+    if (!window.EventSource) return;
+
+    const source = new EventSource('/events');
+    const liveGroup = document.body.dataset.liveGroup;
+    const money = value => '₹ ' + Number(value).toFixed(2);
+
+    // The stream carries every group of the user; only the one on this page is applied
+    function on(type, handler) {
+        source.addEventListener(type, e => {
+            const data = JSON.parse(e.data);
+            if (data.group_id === liveGroup) handler(data);
+        });
+    }
+
+    function setStat(name, text) {
+        const el = document.querySelector('[data-stat="' + name + '"]');
+        if (el) el.textContent = text;
+    }
+
+    function button(tag, className, text) {
+        const el = document.createElement(tag);
+        el.className = className;
+        el.textContent = text;
+        return el;
+    }
+
+    function postForm(action, question) {
+        const form = document.createElement('form');
+        form.method = 'post';
+        form.action = action;
+        form.style.display = 'inline';
+        form.dataset.idempotent = '';  // idempotency.js adds the key on submit
+        form.addEventListener('submit', e => { if (!confirm(question)) e.preventDefault(); });
+        form.appendChild(button('button', 'btn btn-sm btn-danger', '🗑️'));
+        return form;
+    }
+
+    function expenseRow(x) {
+        const row = document.createElement('tr');
+        row.dataset.expenseId = x.id;
+        const select = document.createElement('td');
+        const box = document.createElement('input');
+        box.type = 'checkbox';
+        box.className = 'form-check-input';
+        box.name = 'expense_ids';
+        box.value = x.id;
+        box.setAttribute('form', 'bulkForm');
+        select.appendChild(box);
+        const description = document.createElement('td');
+        const span = document.createElement('span');
+        span.dataset.field = 'description';
+        description.appendChild(span);
+        const amount = document.createElement('td');
+        amount.className = 'text-nowrap';
+        amount.dataset.field = 'amount';
+        const payer = document.createElement('td');
+        payer.dataset.field = 'payer';
+
+        const actions = document.createElement('td');
+        const group = document.createElement('div');
+        group.className = 'btn-group';
+        const edit = button('a', 'btn btn-sm btn-warning', '✏️ Edit');
+        edit.href = '/edit-expense/' + encodeURIComponent(x.id);
+        group.appendChild(edit);
+        group.appendChild(postForm('/delete-expense/' + encodeURIComponent(x.id), 'Delete this expense?'));
+        actions.appendChild(group);
+
+        row.append(select, description, amount, payer, actions);
+        return row;
+    }
+
+    on('expense', x => {
+        const tbody = document.getElementById('expenseRows');
+        if (!tbody) return;
+        let row = tbody.querySelector('tr[data-expense-id="' + CSS.escape(x.id) + '"]');
+        if (x.op === 'delete') {
+            if (row) row.remove();
+            return;
+        }
+        if (!row) {
+            if (location.search) return;  // a filtered list; the new expense may not belong in it
+            row = expenseRow(x);
+            tbody.appendChild(row);
+        }
+        row.querySelector('[data-field="description"]').textContent = x.description;
+        row.querySelector('[data-field="amount"]').textContent = money(x.amount);
+        row.querySelector('[data-field="payer"]').textContent = x.payer;
+    });
+
+    on('totals', t => {
+        setStat('total', money(t.total));
+        setStat('average', money(t.average));
+        setStat('count', t.count);
+    });
+
+    function settlementRow(s, i) {
+        const path = encodeURIComponent(s.from_id[i]) + '/' + encodeURIComponent(s.to_id[i]) + '/' + s.amount[i];
+        const row = document.createElement('tr');
+        row.dataset.fromId = s.from_id[i];
+        row.dataset.toId = s.to_id[i];
+        const cells = [s.from[i], s.to[i]].map(name => {
+            const td = document.createElement('td');
+            td.appendChild(button('strong', '', name));
+            return td;
+        });
+        const owed = button('td', 'fw-bold text-danger text-nowrap', '₹ ' + s.amount[i]);
+        const actions = document.createElement('td');
+        const group = document.createElement('div');
+        group.className = 'btn-group';
+        const partial = button('a', 'btn btn-sm btn-warning', '✏️ Edit');
+        partial.href = '/settle-partial/' + path;
+        group.append(partial, postForm('/settle-full/' + path, 'Settle this debt fully?'));
+        actions.appendChild(group);
+        row.append(...cells, owed, actions);
+        return row;
+    }
+
+    function findSettlement(tbody, fromId, toId) {
+        return tbody.querySelector('tr[data-from-id="' + CSS.escape(fromId) + '"][data-to-id="' + CSS.escape(toId) + '"]');
+    }
+
+    // Only the settlements that changed arrive, unless the event is marked full
+    on('settlements', s => {
+        const tbody = document.getElementById('settlementRows');
+        if (!tbody) return;
+        if (s.full) tbody.replaceChildren();
+        (s.removed_from || []).forEach((fromId, i) => {
+            const row = findSettlement(tbody, fromId, s.removed_to[i]);
+            if (row) row.remove();
+        });
+        s.amount.forEach((amount, i) => {
+            const row = settlementRow(s, i);
+            const old = findSettlement(tbody, s.from_id[i], s.to_id[i]);
+            if (old) old.replaceWith(row);
+            else tbody.appendChild(row);
+        });
+        const empty = tbody.rows.length === 0;
+        document.getElementById('settlementTable').classList.toggle('d-none', empty);
+        document.getElementById('settledNote').classList.toggle('d-none', !empty);
+    });
+})();
@@ -0,0 +1,65 @@
+// picker.js - Member search for forms whose group is too large to list every member
+(function () {
+    document.querySelectorAll('.user-picker').forEach(picker => {
+        const input = picker.querySelector('[data-query]');
+        const results = picker.querySelector('[data-results]');
+        const selected = picker.querySelector('[data-selected]');
+        const multiple = picker.dataset.multiple === 'true';
+        let timer = null;
+        let controller = null;
+
+        // A chosen member is a badge carrying a hidden input, so the form posts ids only
+        function choose(id, name) {
+            if (!multiple) selected.replaceChildren();
+            if (!selected.querySelector('input[value="' + CSS.escape(id) + '"]')) {
+                const chip = document.createElement('span');
+                chip.className = 'badge bg-primary me-1 mb-1';
+                chip.textContent = name;
+                const remove = document.createElement('button');
+                remove.type = 'button';
+                remove.className = 'btn-close btn-close-white ms-1';
+                remove.style.fontSize = '0.6em';
+                remove.setAttribute('aria-label', 'Remove');
+                remove.addEventListener('click', () => chip.remove());
+                const hidden = document.createElement('input');
+                hidden.type = 'hidden';
+                hidden.name = picker.dataset.name;
+                hidden.value = id;
+                chip.append(remove, hidden);
+                selected.appendChild(chip);
+            }
+            input.value = '';
+            results.replaceChildren();
+        }
+
+        function search() {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch('/api/users/search?limit=10&q=' + encodeURIComponent(input.value), { signal: controller.signal })
+                .then(r => r.json())
+                .then(data => {
+                    results.replaceChildren(...data.id.map((id, i) => {
+                        const item = document.createElement('button');
+                        item.type = 'button';
+                        item.className = 'list-group-item list-group-item-action';
+                        item.textContent = data.name[i];
+                        item.addEventListener('click', () => choose(id, data.name[i]));
+                        return item;
+                    }));
+                })
+                .catch(() => {});  // aborted by a newer keystroke
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+        input.addEventListener('focus', search);
+        input.addEventListener('keydown', e => {
+            if (e.key !== 'Enter') return;
+            e.preventDefault();  // pick the first match instead of submitting the form
+            const first = results.querySelector('button');
+            if (first) first.click();
+        });
+    });
+})();
@@ -2,13 +2,14 @@
 import json
 import os
 import logging
-from models import Group, User, Expense
+import threading
+from models import Group, User, Expense, Budget, ExpenseGroup
 from datetime import datetime
+from metrics import timed, record_partition_size
+from logging_setup import SkipCounter
 
 FILE_PATH = "data/expenses.json"
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class StorageError(Exception):
@@ -40,24 +41,202 @@ def validate_user_data(user_data):
         raise StorageError("User name cannot be empty")
     return True
 
-def load_group(file_path):
-    """Load group data from JSON file with validation"""
-    try:
-        if not os.path.exists(file_path):
-            logger.info(f"File {file_path} not found, creating new group")
-            return Group("My Expense Group")
+# Expenses are partitioned by trip/event group. The user's file holds the
+# header (users, budgets, groups, active group) and each partition's
+# expenses live in their own segment under "<file>.groups/", so a request
+# only parses the active partition.
+DEFAULT_PARTITION = "default"
+_ACTIVE = object()
+
+def segment_path(file_path, group_id=None):
+    """Return the segment file holding one partition's expenses"""
+    root, _ = os.path.splitext(file_path)
+    return os.path.join(f"{root}.groups", f"{group_id or DEFAULT_PARTITION}.json")
+
+# Writers hold a tenant's lock from load to save. The thread lock orders
+# threads (and greenlets) of this process; the lock file then excludes other
+# workers and the scheduler. One thread lock per tenant file is kept.
+_tenant_locks = {}
+_tenant_locks_guard = threading.Lock()
+
+class TenantLock:
+    """Exclusive lock on a tenant's header and segments, across threads and processes"""
+
+    def __init__(self, file_path):
+        root, _ = os.path.splitext(file_path)
+        self.path = f"{root}.lock"
+        with _tenant_locks_guard:
+            self._thread_lock = _tenant_locks.setdefault(self.path, threading.Lock())
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            import fcntl
+        except ImportError:
+            return  # no flock (Windows): threads of this process are still serialized
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        except Exception:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing the descriptor drops the flock
+            self._file = None
+        self._thread_lock.release()
 
-        with open(file_path, 'r', encoding='utf-8') as f:
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+# Documents parsed before gunicorn forks its workers (see warmup.py). They
+# are shared read-only and only used while the file's mtime and size match.
+_snapshot = {}
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def preload(paths):
+    """Parse JSON files into the shared read-only snapshot; return how many were loaded"""
+    loaded = 0
+    for path in paths:
+        try:
+            key = _file_key(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                _snapshot[path] = (key, json.load(f))
+            loaded += 1
+        except (OSError, ValueError) as e:
+            logger.warning("Could not preload %s: %s", path, e)
+    return loaded
+
+def _read_json(path):
+    """Read a JSON object from disk, or None if the file is missing"""
+    try:
+        key = _file_key(path)
+    except FileNotFoundError:
+        return None
+    cached = _snapshot.get(path)
+    if cached is not None and cached[0] == key:
+        data = cached[1]
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
             data = json.load(f)
+    if not data or not isinstance(data, dict):
+        logger.warning("Invalid file format in %s, ignoring", path)
+        return None
+    return data
 
-        if not data or not isinstance(data, dict):
-            logger.warning("Invalid file format, creating new group")
-            return Group("My Expense Group")
+def _write_json(path, data):
+    """Write a JSON object to disk, keeping a timestamped backup of the old file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    # Create backup before saving
+    if os.path.exists(path):
+        backup_path = f"{path}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        try:
+            with open(path, 'r', encoding='utf-8') as src:
+                with open(backup_path, 'w', encoding='utf-8') as dst:
+                    dst.write(src.read())
+            logger.debug("Backup created: %s", backup_path)
+        except Exception as e:
+            logger.warning("Could not create backup: %s", e)
+
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def _load_expenses(rows, users_map, group_id, source=""):
+    """Build Expense objects from stored rows, skipping invalid ones"""
+    expenses = []
+    skipped = SkipCounter(logger, "expenses")
+    for e in rows:
+        try:
+            validate_expense_data(e)
+            payer = users_map.get(e["payer_id"])
+            if not payer:
+                skipped.add("payer not found", e["id"])
+                continue
+            
+            participants = [users_map[pid] for pid in e["participants"] if pid in users_map]
+            if not participants:
+                skipped.add("no valid participants", e["id"])
+                continue
+
+            expense = Expense(
+                e["description"].strip(),
+                e["amount"],
+                payer,
+                participants,
+                receipt_filename=e.get("receipt_filename"),
+                category=e.get("category", "Other"),
+                notes=e.get("notes", ""),
+                tags=list(e.get("tags", []))  # rows may belong to the shared snapshot
+            )
+            expense.id = e["id"]
+            expense.date = e.get("date", expense.date)
+            expense.paid = e.get("paid", False)
+            expense.paid_date = e.get("paid_date")
+            expense.is_recurring = e.get("is_recurring", False)
+            expense.recurrence_type = e.get("recurrence_type")
+            expense.next_due_date = e.get("next_due_date")
+            expense.recurrence_parent_id = e.get("recurrence_parent_id")
+            expense.group_id = group_id
+            expense.seq = e.get("seq", 0)
+            expenses.append(expense)
+        except StorageError as e:
+            skipped.add("failed validation", e)
+            continue
+    skipped.report(source)
+    return expenses
+
+def _serialize_expense(e):
+    return {
+        "id": e.id,
+        "description": e.description,
+        "amount": e.amount,
+        "payer_id": e.payer.id,
+        "participants": [p.id for p in e.participants],
+        "date": e.date,
+        "receipt_filename": e.receipt_filename,
+        "category": e.category,
+        "notes": e.notes,
+        "tags": e.tags,
+        "paid": e.paid,
+        "paid_date": e.paid_date,
+        "is_recurring": e.is_recurring,
+        "recurrence_type": e.recurrence_type,
+        "next_due_date": e.next_due_date,
+        "recurrence_parent_id": e.recurrence_parent_id,
+        "seq": e.seq
+    }
+
+@timed("load_group")
+def load_group(file_path, group_id=_ACTIVE):
+    """Load the group header and one partition's expenses (the active one by default)"""
+    try:
+        data = _read_json(file_path)
+        if data is None:
+            logger.info("File %s not found, creating new group", file_path)
+            group = Group("My Expense Group")
+            group.segment_path = segment_path(file_path)
+            return group
 
         group = Group(data.get("name", "My Expense Group"))
 
         # Load users with validation
         users_map = {}
+        skipped = SkipCounter(logger, "records")
         for u in data.get("users", []):
             try:
                 validate_user_data(u)
@@ -66,67 +245,73 @@ def load_group(file_path):
                 users_map[user.id] = user
                 group.users.append(user)
             except StorageError as e:
-                logger.warning(f"Skipping invalid user: {e}")
+                skipped.add("user", e)
                 continue
 
-        # Load expenses with validation
-        for e in data.get("expenses", []):
+        for b in data.get("budgets", []):
             try:
-                validate_expense_data(e)
-                payer = users_map.get(e["payer_id"])
-                if not payer:
-                    logger.warning(f"Payer not found for expense {e['id']}, skipping")
-                    continue
-                
-                participants = [users_map[pid] for pid in e["participants"] if pid in users_map]
-                if not participants:
-                    logger.warning(f"No valid participants for expense {e['id']}, skipping")
-                    continue
-
-                expense = Expense(
-                    e["description"].strip(),
-                    e["amount"],
-                    payer,
-                    participants,
-                    receipt_filename=e.get("receipt_filename"),
-                    category=e.get("category", "Other"),
-                    notes=e.get("notes", ""),
-                    tags=e.get("tags", [])
-                )
-                expense.id = e["id"]
-                expense.date = e.get("date", expense.date)
-                expense.paid = e.get("paid", False)
-                expense.paid_date = e.get("paid_date")
-                group.expenses.append(expense)
-            except StorageError as e:
-                logger.warning(f"Skipping invalid expense: {e}")
-                continue
+                budget = Budget(b["user_id"], b["amount"], b.get("period", "monthly"))
+                budget.id = b.get("id", budget.id)
+                budget.created_date = b.get("created_date", budget.created_date)
+                group.budgets.append(budget)
+            except (KeyError, ValueError) as e:
+                skipped.add("budget", e)
+
+        for g in data.get("groups", []):
+            try:
+                expense_group = ExpenseGroup(g["id"], g["name"], g.get("description", ""))
+                expense_group.created_date = g.get("created_date", expense_group.created_date)
+                expense_group.is_active = g.get("is_active", True)
+                group.groups.append(expense_group)
+            except (KeyError, ValueError) as e:
+                skipped.add("group", e)
 
-        logger.info(f"Successfully loaded group with {len(group.users)} users and {len(group.expenses)} expenses")
+        skipped.report(file_path)
+
+        active = data.get("active_group")
+        group.active_group = active if group.get_group_by_id(active) else None
+        partition = group.active_group if group_id is _ACTIVE else group_id
+
+        # Files written before partitioning keep every expense in the header;
+        # they belong to the default partition until the next save moves them.
+        path = segment_path(file_path, partition)
+        legacy_rows = data.get("expenses")
+        if legacy_rows is not None and os.path.exists(segment_path(file_path)):
+            legacy_rows = None
+
+        if partition is None and legacy_rows is not None:
+            rows = legacy_rows
+            segment = {}
+        else:
+            segment = _read_json(path) or {}
+            rows = segment.get("expenses", [])
+        group.legacy_expenses = legacy_rows
+        group.seq = segment.get("seq", 0)
+        group.change_horizon = segment.get("horizon", 0)
+        group.tombstones = list(segment.get("tombstones", []))
+        group.loaded_rows = {row.get("id"): row for row in rows}
+
+        group.expenses = _load_expenses(rows, users_map, partition, file_path if rows is legacy_rows else path)
+        group.loaded_partition = partition
+        group.segment_path = path
+
+        record_partition_size(group)
+        logger.debug("Loaded group with %s users and %s expenses", len(group.users), len(group.expenses))
         return group
         
     except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {e}")
+        logger.error("JSON decode error: %s", e)
         raise StorageError(f"Invalid JSON file format: {e}")
     except Exception as e:
-        logger.error(f"Unexpected error loading group: {e}")
+        logger.error("Unexpected error loading group: %s", e)
         raise StorageError(f"Failed to load group: {e}")
 
-def save_group(group, FILE_PATH):
-    """Save group data to JSON file with backup"""
+def save_header(group, FILE_PATH):
+    """Save users, budgets and groups without touching any expense segment"""
     try:
-        os.makedirs("data", exist_ok=True)
-
-        # Create backup before saving
-        if os.path.exists(FILE_PATH):
-            backup_path = f"{FILE_PATH}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            try:
-                with open(FILE_PATH, 'r', encoding='utf-8') as src:
-                    with open(backup_path, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-                logger.info(f"Backup created: {backup_path}")
-            except Exception as e:
-                logger.warning(f"Could not create backup: {e}")
+        if group.legacy_expenses is not None:
+            _write_json(segment_path(FILE_PATH), {"group_id": None, "expenses": group.legacy_expenses})
+            group.legacy_expenses = None
 
         data = {
             "name": group.name,
@@ -134,31 +319,119 @@ def save_group(group, FILE_PATH):
                 {"id": u.id, "name": u.name}
                 for u in group.users
             ],
-            "expenses": [
+            "budgets": [
+                {
+                    "id": b.id,
+                    "user_id": b.user_id,
+                    "amount": b.amount,
+                    "period": b.period,
+                    "created_date": b.created_date
+                }
+                for b in group.budgets
+            ],
+            "groups": [
                 {
-                    "id": e.id,
-                    "description": e.description,
-                    "amount": e.amount,
-                    "payer_id": e.payer.id,
-                    "participants": [p.id for p in e.participants],
-                    "date": e.date,
-                    "receipt_filename": e.receipt_filename,
-                    "category": e.category,
-                    "notes": e.notes,
-                    "tags": e.tags,
-                    "paid": e.paid,
-                    "paid_date": e.paid_date
+                    "id": g.id,
+                    "name": g.name,
+                    "description": g.description,
+                    "created_date": g.created_date,
+                    "is_active": g.is_active
                 }
-                for e in group.expenses
-            ]
+                for g in group.groups
+            ],
+            "active_group": group.active_group
         }
 
-        with open(FILE_PATH, "w", encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        _write_json(FILE_PATH, data)
+        logger.debug("Group header saved to %s", FILE_PATH)
+        return True
+
+    except Exception as e:
+        logger.error("Failed to save group header: %s", e)
+        raise StorageError(f"Failed to save group header: {e}")
+
+# Every change to a partition's expenses is stamped with the next value of
+# the partition's sequence number; deletions leave a tombstone so the change
+# feed (changes_since) can report them. Only the newest MAX_TOMBSTONES are
+# kept: clients that last synced before the oldest one must resync.
+MAX_TOMBSTONES = 1000
+
+def _stamp_changes(group, rows):
+    """Compare serialized rows with the ones loaded and stamp what changed"""
+    loaded = group.loaded_rows
+    for expense, row in zip(group.expenses, rows):
+        if loaded.get(expense.id) != row:
+            group.seq += 1
+            expense.seq = row["seq"] = group.seq
+
+    current = {e.id for e in group.expenses}
+    for expense_id in loaded:
+        if expense_id not in current:
+            group.seq += 1
+            group.tombstones.append({"id": expense_id, "seq": group.seq})
+
+    if len(group.tombstones) > MAX_TOMBSTONES:
+        dropped = group.tombstones[:-MAX_TOMBSTONES]
+        group.tombstones = group.tombstones[-MAX_TOMBSTONES:]
+        group.change_horizon = dropped[-1]["seq"]
+
+def changes_since(group, since, limit, tombstones=True):
+    """Return (changes, has_more): upserts and tombstones with seq > since, oldest first.
+
+    With tombstones=False only live rows are returned, which is a snapshot
+    of the partition when paged from since=0.
+    """
+    changes = [(e.seq, "upsert", e) for e in group.expenses if e.seq > since]
+    if tombstones:
+        changes += [(t["seq"], "delete", t["id"]) for t in group.tombstones if t["seq"] > since]
+    changes.sort(key=lambda change: change[0])
+    page = [
+        {"seq": seq, "op": op, "expense": _serialize_expense(item)} if op == "upsert"
+        else {"seq": seq, "op": op, "id": item}
+        for seq, op, item in changes[:limit]
+    ]
+    return page, len(changes) > limit
+
+@timed("save_group")
+def save_group(group, FILE_PATH):
+    """Save the loaded partition's expenses and the group header"""
+    try:
+        path = segment_path(FILE_PATH, group.loaded_partition)
+        rows = [_serialize_expense(e) for e in group.expenses]
+        _stamp_changes(group, rows)
+        _write_json(path, {
+            "group_id": group.loaded_partition,
+            "seq": group.seq,
+            "horizon": group.change_horizon,
+            "tombstones": group.tombstones,
+            "expenses": rows
+        })
+        group.loaded_rows = {row["id"]: row for row in rows}
+        group.segment_path = path
+        if group.loaded_partition is None:
+            group.legacy_expenses = None  # just written to the default segment
+        save_header(group, FILE_PATH)
         
-        logger.info(f"Group saved successfully to {FILE_PATH}")
+        logger.debug("Group saved to %s", FILE_PATH)
         return True
         
     except Exception as e:
-        logger.error(f"Failed to save group: {e}")
+        logger.error("Failed to save group: %s", e)
         raise StorageError(f"Failed to save group: {e}")
+
+def partition_ids(group):
+    """Return the id of every partition in a group, default (None) first"""
+    return [None] + [g.id for g in group.groups]
+
+def user_in_other_partitions(group, file_path, user_id):
+    """Check whether any partition other than the loaded one references a user"""
+    for partition in partition_ids(group):
+        if partition == group.loaded_partition:
+            continue
+        if partition is None and group.legacy_expenses is not None:
+            rows = group.legacy_expenses
+        else:
+            rows = (_read_json(segment_path(file_path, partition)) or {}).get("expenses", [])
+        if any(e.get("payer_id") == user_id or user_id in e.get("participants", []) for e in rows):
+            return True
+    return False
@@ -0,0 +1,48 @@
+# conftest.py - Shared fixtures; every test run works in a throwaway data directory
+import os
+import re
+import sys
+import uuid
+import tempfile
+
+import pytest
+
+# The app uses flat imports and paths relative to the working directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # tests that need limits turn them on
+os.chdir(tempfile.mkdtemp(prefix="expense-splitter-tests-"))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+def login(client, members=("Bob", "Cara")):
+    """Register and log in a fresh user with `members`; return (username, member ids)"""
+    username = f"user{uuid.uuid4().hex[:10]}"
+    client.post("/register", data={"username": username, "password": "secret1", "confirm_password": "secret1"})
+    client.post("/login", data={"username": username, "password": "secret1"})
+    for name in members:
+        client.post("/add-user", data={"name": name})
+    ids = re.findall(r"/edit-user/([\w-]+)", client.get("/dashboard").get_data(as_text=True))
+    return username, ids
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    return login(client)
+
+
+def add_expense(client, ids, description="Dinner", amount="90", **extra):
+    data = {"description": description, "amount": amount, "payer": ids[0], "participants": ids}
+    data.update(extra)
+    return client.post("/add-expense", data=data)
@@ -0,0 +1,52 @@
+# test_analytics_api.py - Shape of the analytics JSON API and its time-series granularities
+from app import group_file
+from storage import load_group, save_group
+from conftest import add_expense
+
+
+def _seed(client, user):
+    username, ids = user
+    dates = {"Dinner": "2023-12-30", "Taxi": "2024-01-02", "Lunch": "2024-02-10"}
+    add_expense(client, ids, description="Dinner", amount="90", category="Food")
+    add_expense(client, ids, description="Taxi", amount="40", category="Transport")
+    add_expense(client, ids, description="Lunch", amount="30", category="Food")
+    # The forms always record today's date; backdate so the series spans a year boundary
+    group = load_group(group_file(username))
+    for expense in group.expenses:
+        expense.date = dates[expense.description]
+    save_group(group, group_file(username))
+
+
+def test_summary_is_columnar(client, user):
+    _, ids = user
+    _seed(client, user)
+    data = client.get("/api/analytics/summary").get_json()
+
+    assert data["version"] == 1
+    assert data["total"] == 160 and data["count"] == 3 and data["average"] == 53.33
+    assert data["payers"]["id"] == [ids[0]] and data["payers"]["paid"] == [160]
+    assert dict(zip(data["categories"]["name"], data["categories"]["amount"])) == {"Food": 120, "Transport": 40}
+    assert data["top_expenses"]["description"] == ["Dinner", "Taxi", "Lunch"]
+
+
+def test_timeseries_granularities(client, user):
+    _seed(client, user)
+
+    def series(granularity):
+        data = client.get(f"/api/analytics/timeseries?granularity={granularity}").get_json()
+        assert data["granularity"] == granularity and len(data["date"]) == len(data["amount"])
+        return dict(zip(data["date"], data["amount"]))
+
+    assert series("day") == {"2023-12-30": 90, "2024-01-02": 40, "2024-02-10": 30}
+    assert series("week") == {"2023-12-25": 90, "2024-01-01": 40, "2024-02-05": 30}
+    assert series("month") == {"2023-12": 90, "2024-01": 40, "2024-02": 30}
+    assert client.get("/api/analytics/timeseries").get_json()["granularity"] == "day"
+
+
+def test_timeseries_rejects_unknown_granularity(client, user):
+    response = client.get("/api/analytics/timeseries?granularity=hour")
+    assert response.status_code == 400 and "granularity" in response.get_json()["error"]
+
+
+def test_analytics_api_requires_login(client):
+    assert client.get("/api/analytics/summary").status_code == 401
@@ -0,0 +1,35 @@
+# test_app_config.py - create_app builds its components from the config it is given
+import pytest
+
+from config import TestingConfig
+from conftest import add_expense, login
+
+
+class Small(TestingConfig):
+    PAGE_CACHE_ENTRIES = 3
+    RECURRING_SCHEDULER_INTERVAL = 7
+    CHANGE_FEED_PAGE_LIMIT = 2
+    LIVE_UPDATES = False
+
+
+@pytest.fixture(scope="module")
+def small_app():
+    from app import create_app
+    return create_app(Small)
+
+
+def test_components_follow_the_config(app, small_app):
+    assert small_app.extensions["page_cache"].max_entries == 3
+    assert small_app.extensions["recurring_scheduler"].interval == 7
+    assert small_app.extensions["page_cache"] is not app.extensions["page_cache"]
+    assert small_app.config["CHANGE_FEED_PAGE_LIMIT"] == 2
+
+
+def test_views_read_the_app_config(small_app):
+    client = small_app.test_client()
+    _, ids = login(client)
+    for n in range(3):
+        add_expense(client, ids, description=f"Item {n}")
+    page = client.get("/api/changes?since=0&limit=50").get_json()
+    assert len(page["changes"]) == 2 and page["has_more"]
+    assert client.get("/events").status_code == 404  # LIVE_UPDATES off for this app
@@ -0,0 +1,28 @@
+# test_assets.py - Precompressed bundles are negotiated on Accept-Encoding q-values
+import re
+
+import pytest
+
+import assets
+
+BEST = "br" if assets.brotli is not None else "gzip"  # .br variants need the brotli package
+
+
+@pytest.fixture
+def bundle(client):
+    page = client.get("/login").get_data(as_text=True)
+    return re.search(r'/assets/[\w.-]+\.css', page).group(0)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate, br", BEST),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.1", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("", None),
+])
+def test_encoding_follows_q_values(client, bundle, accept, expected):
+    response = client.get(bundle, headers={"Accept-Encoding": accept})
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == expected
+    assert "Accept-Encoding" in response.headers["Vary"]
@@ -0,0 +1,23 @@
+# test_auth.py - The account store follows the configured paths
+import os
+
+from auth import UserStore
+from conftest import login
+
+
+def test_store_uses_configured_database(app, client):
+    store = app.extensions["user_store"]
+    assert store.db_path == os.path.abspath(app.config["USERS_DB"])
+    assert store.legacy_file == os.path.abspath(app.config["USERS_FILE"])
+    username, _ = login(client, members=())
+    assert os.path.exists(store.db_path)
+    assert store.get(username) is not None
+
+
+def test_store_path_is_resolved_when_created(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = UserStore(os.path.join("data", "users.db"))
+    monkeypatch.chdir(tmp_path.parent)  # connections are opened later, from wherever the thread runs
+    store.insert("alice", {"password": "x", "created_at": None, "last_login": None, "is_active": True})
+    assert os.path.exists(tmp_path / "data" / "users.db")
+    assert store.get("alice") is not None
@@ -0,0 +1,76 @@
+# test_bulk.py - Bulk operations on the selected expenses of the current group
+from app import group_file
+from conftest import add_expense
+from storage import load_group
+
+
+def _expenses(username):
+    return {e.description: e for e in load_group(group_file(username)).expenses}
+
+
+def _bulk(client, operation, ids, value=""):
+    return client.post("/bulk-expenses", data={"operation": operation, "expense_ids": ids, "value": value},
+                       follow_redirects=True).get_data(as_text=True)
+
+
+def test_delete_ignores_unknown_ids(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Dinner")
+    add_expense(client, ids, description="Taxi")
+    add_expense(client, ids, description="Lunch")
+    expenses = _expenses(username)
+
+    page = _bulk(client, "delete", [expenses["Dinner"].id, "no-such-expense", expenses["Lunch"].id])
+    assert "2 expense(s) deleted" in page
+    assert list(_expenses(username)) == ["Taxi"]
+
+
+def test_set_category_only_counts_real_changes(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Dinner", category="Food")
+    add_expense(client, ids, description="Taxi", category="Transport")
+    expenses = _expenses(username)
+
+    page = _bulk(client, "set_category", [e.id for e in expenses.values()], value="Food")
+    assert "1 expense(s) recategorized" in page
+    assert {e.category for e in _expenses(username).values()} == {"Food"}
+    assert "Enter a category or tag" in _bulk(client, "set_category", [expenses["Taxi"].id])
+
+
+def test_mark_paid_and_unpaid(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Dinner")
+    add_expense(client, ids, description="Taxi")
+    dinner = _expenses(username)["Dinner"]
+
+    assert "1 expense(s) marked as paid" in _bulk(client, "mark_paid", [dinner.id])
+    expenses = _expenses(username)
+    assert expenses["Dinner"].paid and expenses["Dinner"].paid_date and not expenses["Taxi"].paid
+
+    assert "0 expense(s) marked as paid" in _bulk(client, "mark_paid", [dinner.id])
+    assert "1 expense(s) marked as unpaid" in _bulk(client, "mark_unpaid", [dinner.id])
+    assert not _expenses(username)["Dinner"].paid
+
+
+def test_empty_selection_and_unknown_operation_change_nothing(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Dinner")
+    dinner = _expenses(username)["Dinner"]
+
+    assert "Select at least one expense" in _bulk(client, "delete", [])
+    assert "Unknown bulk operation" in _bulk(client, "explode", [dinner.id])
+    assert list(_expenses(username)) == ["Dinner"]
+
+
+def test_ids_from_another_group_are_ignored(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Home rent")
+    rent = _expenses(username)["Home rent"]
+    client.post("/create-group", data={"name": "Trip"})
+    add_expense(client, ids, description="Trip taxi")
+
+    page = _bulk(client, "delete", [rent.id, _expenses(username)["Trip taxi"].id])
+    assert "1 expense(s) deleted" in page
+    assert _expenses(username) == {}
+    client.get("/switch-group/default")
+    assert list(_expenses(username)) == ["Home rent"]
@@ -0,0 +1,60 @@
+# test_changes.py - The /api/changes feed: sequence numbers, paging, tombstones and the horizon
+import re
+
+import storage
+from conftest import add_expense
+
+
+def _expense_ids(client):
+    return re.findall(r'data-expense-id="([\w-]+)"', client.get("/dashboard").get_data(as_text=True))
+
+
+def test_feed_pages_upserts_and_deletes_in_order(client, user):
+    _, ids = user
+    for i in range(4):
+        add_expense(client, ids, description=f"E{i}", amount=str(10 + i))
+    page = client.get("/api/changes?since=0&limit=3").get_json()
+    assert page["snapshot"] and page["has_more"]
+    assert [c["expense"]["description"] for c in page["changes"]] == ["E0", "E1", "E2"]
+
+    expense_ids = _expense_ids(client)
+    client.post(f"/toggle-payment/{expense_ids[0]}")
+    client.post(f"/delete-expense/{expense_ids[1]}")
+    feed = client.get("/api/changes?since=4").get_json()
+    assert [(c["seq"], c["op"]) for c in feed["changes"]] == [(5, "upsert"), (6, "delete")]
+    assert feed["next"] == 6 and not feed["has_more"]
+    assert client.get("/api/changes?since=6").get_json()["changes"] == []
+
+
+def test_since_zero_is_a_snapshot_after_compaction(client, user, monkeypatch):
+    monkeypatch.setattr(storage, "MAX_TOMBSTONES", 1)
+    _, ids = user
+    for i in range(4):
+        add_expense(client, ids, description=f"E{i}")
+    for expense_id in _expense_ids(client)[:3]:
+        client.post(f"/delete-expense/{expense_id}")  # seqs 5-7; only 7 is kept
+
+    stale = client.get("/api/changes?since=2")
+    assert stale.status_code == 410 and stale.get_json()["resync"] is True
+
+    snapshot = client.get("/api/changes?since=0").get_json()
+    assert [c["op"] for c in snapshot["changes"]] == ["upsert"]
+    assert snapshot["changes"][0]["expense"]["description"] == "E3"
+    assert snapshot["next"] == snapshot["seq"] == 7
+
+    follow = client.get(f"/api/changes?since={snapshot['next']}")
+    assert follow.status_code == 200 and follow.get_json()["changes"] == []
+
+
+def test_snapshot_paging_keeps_deletions_made_meanwhile(client, user):
+    _, ids = user
+    for i in range(3):
+        add_expense(client, ids, description=f"E{i}")
+    first = client.get("/api/changes?since=0&limit=2").get_json()
+    client.post(f"/delete-expense/{first['changes'][0]['expense']['id']}")
+
+    rest = client.get(f"/api/changes?since=0&limit=2&after={first['after']}&through={first['through']}").get_json()
+    assert [c["expense"]["description"] for c in rest["changes"]] == ["E2"]
+    assert not rest["has_more"] and rest["next"] == 3
+    feed = client.get(f"/api/changes?since={rest['next']}").get_json()
+    assert [c["op"] for c in feed["changes"]] == ["delete"]
@@ -0,0 +1,86 @@
+# test_compression.py - Which responses are compressed, with which encoding and headers
+import io
+import gzip
+
+import pytest
+from flask import Flask, Response, send_file
+
+import compression
+
+BODY = "<p>" + "expense row " * 200 + "</p>"
+
+
+def _app(monkeypatch, brotli_available):
+    if not brotli_available:
+        monkeypatch.setattr(compression, "brotli", None)
+    app = Flask(__name__)
+    compression.init_app(app, min_size=100)
+
+    @app.route("/page")
+    def page():
+        response = Response(BODY, mimetype="text/html")
+        response.set_etag("v1")
+        return response
+
+    @app.route("/small")
+    def small():
+        return Response("<p>hi</p>", mimetype="text/html")
+
+    @app.route("/partial")
+    def partial():
+        response = Response(BODY[:500], status=206, mimetype="text/html")
+        response.headers["Content-Range"] = f"bytes 0-499/{len(BODY)}"
+        return response
+
+    @app.route("/not-modified")
+    def not_modified():
+        return Response(status=304)
+
+    @app.route("/file")
+    def file():
+        return send_file(io.BytesIO(BODY.encode()), mimetype="text/html")
+
+    return app.test_client()
+
+
+def test_gzip_weakens_the_etag_and_varies(monkeypatch):
+    client = _app(monkeypatch, brotli_available=False)
+    response = client.get("/page", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()).decode() == BODY
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_identity_responses_still_vary(monkeypatch):
+    client = _app(monkeypatch, brotli_available=False)
+    for headers in ({}, {"Accept-Encoding": "gzip;q=0, identity"}):
+        response = client.get("/page", headers=headers)
+        assert "Content-Encoding" not in response.headers and response.get_data(as_text=True) == BODY
+        assert response.headers["ETag"] == '"v1"' and "Accept-Encoding" in response.headers["Vary"]
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_q_values_pick_the_encoding(monkeypatch):
+    client = _app(monkeypatch, brotli_available=False)
+    # br is preferred but this process cannot produce it
+    response = client.get("/page", headers={"Accept-Encoding": "br;q=1.0, gzip;q=0.5"})
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_brotli_when_preferred(monkeypatch):
+    client = _app(monkeypatch, brotli_available=True)
+    response = client.get("/page", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert compression.brotli.decompress(response.get_data()).decode() == BODY
+    assert client.get("/page", headers={"Accept-Encoding": "gzip, br;q=0.1"}).headers["Content-Encoding"] == "gzip"
+
+
+@pytest.mark.parametrize("path", ["/partial", "/not-modified", "/file"])
+def test_partial_unmodified_and_passthrough_responses_are_left_alone(monkeypatch, path):
+    client = _app(monkeypatch, brotli_available=False)
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    if path == "/file":
+        assert response.get_data(as_text=True) == BODY
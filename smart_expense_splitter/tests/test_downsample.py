@@ -0,0 +1,75 @@
+# test_downsample.py - Calendar bucketing and LTTB thinning of time series
+from datetime import date, timedelta
+
+from downsample import bucket, choose_granularity, downsample, lttb
+
+
+def _days(start, count):
+    first = date.fromisoformat(start)
+    return [(first + timedelta(days=i)).isoformat() for i in range(count)]
+
+
+class _Index:
+    """Just the rollups downsample() reads from a PartitionIndex"""
+
+    def __init__(self, by_date):
+        self._by_date = by_date
+
+    def by_date(self):
+        return dict(self._by_date)
+
+    def by_month(self):
+        return bucket(self._by_date, "month")
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    labels = _days("2024-01-01", 100)
+    values = [float((i * 37) % 11) for i in range(100)]
+    kept_labels, kept_values = lttb(labels, values, 10)
+
+    assert len(kept_labels) == len(kept_values) == 10
+    assert kept_labels[0] == labels[0] and kept_labels[-1] == labels[-1]
+    assert kept_values[0] == values[0] and kept_values[-1] == values[-1]
+    assert kept_labels == sorted(kept_labels)
+
+
+def test_lttb_keeps_spikes():
+    labels = _days("2024-01-01", 50)
+    values = [1.0] * 50
+    values[20] = 100.0
+    assert "2024-01-21" in lttb(labels, values, 8)[0]
+
+
+def test_lttb_returns_short_series_unchanged():
+    labels, values = _days("2024-01-01", 5), [1, 2, 3, 4, 5]
+    assert lttb(labels, values, 5) == (labels, values)
+    assert lttb(labels, values, 50) == (labels, values)
+    assert lttb(labels, values, 2) == (labels, values)  # too few points to keep a shape
+
+
+def test_bucket_across_a_year_boundary():
+    by_date = {"2024-12-30": 10, "2024-12-31": 5, "2025-01-01": 7, "2025-01-06": 3}
+    assert bucket(by_date, "day") == by_date
+    # 2024-12-30 is a Monday: the first three days share an ISO week
+    assert bucket(by_date, "week") == {"2024-12-30": 22, "2025-01-06": 3}
+    assert bucket(by_date, "month") == {"2024-12": 15, "2025-01": 10}
+
+
+def test_choose_granularity():
+    assert choose_granularity({}, 10) == "day"
+    daily = {day: 1 for day in _days("2024-01-01", 30)}
+    assert choose_granularity(daily, 30) == "day"
+    assert choose_granularity(daily, 10) == "week"
+    assert choose_granularity({day: 1 for day in _days("2023-01-01", 730)}, 52) == "month"
+
+
+def test_downsample_stays_within_the_target():
+    index = _Index({day: i % 7 for i, day in enumerate(_days("2023-06-01", 400))})
+
+    granularity, labels, values = downsample(index, target=20)
+    assert granularity == "month" and len(labels) == len(values) <= 20
+    assert labels[0] == "2023-06" and labels[-1] == "2024-07"
+
+    granularity, labels, values = downsample(index, target=20, granularity="day")
+    assert granularity == "day" and len(labels) == 20
+    assert labels[0] == "2023-06-01" and labels[-1] == "2024-07-04"
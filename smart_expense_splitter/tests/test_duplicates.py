@@ -0,0 +1,69 @@
+# test_duplicates.py - Duplicate warnings on add-expense and the cached duplicate index
+import re
+
+import indexes
+from conftest import add_expense
+from duplicates import DuplicateIndex, find_duplicates
+from models import Expense, User
+
+
+def _flashes(client):
+    """Pop the pending duplicate warnings"""
+    with client.session_transaction() as session:
+        messages = [m for _, m in session.pop("_flashes", []) if "duplicate" in m]
+    return " ".join(messages)
+
+
+def test_warns_on_duplicate(client, user):
+    _, ids = user
+    add_expense(client, ids, description="Taxi", amount="30")
+    add_expense(client, ids, description="  taxi ", amount="30.005")
+    assert "duplicate of 'Taxi'" in _flashes(client)
+
+
+def test_index_is_cached_and_follows_edits(client, user, monkeypatch):
+    _, ids = user
+    builds = []
+    original = DuplicateIndex.from_expenses.__func__
+    monkeypatch.setattr(DuplicateIndex, "from_expenses",
+                        classmethod(lambda cls, *a, **k: builds.append(1) or original(cls, *a, **k)))
+
+    add_expense(client, ids, description="Lunch", amount="20")
+    add_expense(client, ids, description="Coffee", amount="4")
+    add_expense(client, ids, description="Snacks", amount="7")
+    assert len(builds) == 1  # built once, then updated in place by save_changes
+
+    expense_id = re.search(r'data-expense-id="([\w-]+)"', client.get("/dashboard").get_data(as_text=True)).group(1)
+    client.post(f"/edit-expense/{expense_id}", data={"description": "Brunch", "amount": "25"})
+    _flashes(client)
+    add_expense(client, ids, description="Lunch", amount="20")
+    assert _flashes(client) == ""
+    add_expense(client, ids, description="Brunch", amount="25")
+    assert "duplicate of 'Brunch'" in _flashes(client)
+    assert len(builds) == 1
+
+
+def test_remove_keeps_bucket_bounds():
+    payer = User("Ann")
+    cheap, dear = Expense("Tea", "1.00", payer, [payer]), Expense("Tea", "1.004", payer, [payer])
+    index = DuplicateIndex.from_expenses([cheap, dear])
+    index.remove(dear.id)
+    probe = Expense("Tea", "1.00", payer, [payer])
+    assert index.first_match(probe).id == cheap.id
+    index.remove(cheap.id)
+    assert index.first_match(probe) is None and not index.buckets
+
+
+def test_find_duplicates_clusters():
+    payer = User("Ann")
+    rows = [Expense("Fuel", amount, payer, [payer]) for amount in ("50", "50.01", "80")]
+    assert [len(c) for c in find_duplicates(rows)] == [2]
+
+
+def test_an_indexed_expense_still_finds_its_duplicate():
+    payer = User("Ann")
+    first, second = Expense("Fuel", "50", payer, [payer]), Expense("Fuel", "50", payer, [payer])
+    index = DuplicateIndex.from_expenses([first, second])
+    # first is the bucket's first member; probing it must not stop at itself
+    assert index.first_match(first).id == second.id
+    assert index.first_match(second).id == first.id
@@ -0,0 +1,46 @@
+# test_hashing.py - The bounded password hashing pool
+import time
+
+import pytest
+
+from hashing import HashingBusy, PasswordHasher
+
+
+def test_inline_hash_and_verify():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0)
+    pwhash = hasher.hash("secret1")
+    assert hasher.verify(pwhash, "secret1") and not hasher.verify(pwhash, "wrong")
+
+
+def test_pool_uses_a_fresh_process_and_rejects_when_saturated():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1, max_queue=0)
+    try:
+        pwhash = hasher.hash("secret1")
+        assert hasher.verify(pwhash, "secret1")
+        assert hasher._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+
+        hasher._slots.acquire()  # the only slot is taken by another request
+        with pytest.raises(HashingBusy):
+            hasher.verify(pwhash, "secret1")
+        hasher._slots.release()
+    finally:
+        hasher.shutdown()
+
+
+def test_timed_out_hashes_keep_their_slot_until_they_finish():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1, max_queue=0, timeout=0.2)
+    try:
+        with pytest.raises(HashingBusy):
+            hasher._run(time.sleep, 1.5)  # still running in the pool after the caller gives up
+        hasher.timeout = 10
+        with pytest.raises(HashingBusy, match="busy"):
+            hasher.hash("secret1")
+
+        deadline = time.monotonic() + 10
+        while not hasher._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        hasher._slots.release()
+        assert hasher.verify(hasher.hash("secret1"), "secret1")
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,52 @@
+# test_idempotency.py - Replayed form submissions versus distinct ones
+import re
+
+from app import group_file
+from conftest import add_expense
+from storage import load_group
+
+
+def _settlements(username):
+    return [e for e in load_group(group_file(username)).expenses if e.category == "Settlement"]
+
+
+def _flashes(client):
+    with client.session_transaction() as session:
+        return session.pop("_flashes", [])
+
+
+def test_replayed_post_is_applied_once(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Dinner", amount="90", idempotency_key="k1")
+    _flashes(client)
+    add_expense(client, ids, description="Dinner", amount="90", idempotency_key="k1")
+    assert [e.description for e in load_group(group_file(username)).expenses] == ["Dinner"]
+    assert ("info", "ℹ️ This form was already submitted") in _flashes(client)
+
+
+def test_cached_settlements_page_does_not_share_keys(client, user):
+    username, (bob, cara) = user
+    add_expense(client, [bob, cara], amount="90")
+    _flashes(client)
+
+    first = client.get("/settlements")
+    second = client.get("/settlements")  # served from the page cache
+    assert first.get_data() == second.get_data()
+    page = second.get_data(as_text=True)
+    assert "data-idempotent" in page and 'name="idempotency_key"' not in page
+
+    # Two settlements made from copies of the same cached page carry distinct client-side keys
+    action = re.search(r'action="(/settle-full/[^"]+)"', page).group(1).replace("45.0", "10")
+    client.post(action, data={"idempotency_key": "tab-1"})
+    client.post(action, data={"idempotency_key": "tab-2"})
+    assert len(_settlements(username)) == 2
+    client.post(action, data={"idempotency_key": "tab-2"})  # a double submit of the second
+    assert len(_settlements(username)) == 2
+
+
+def test_rejected_submission_can_be_retried(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Lunch", idempotency_key="k2", payer="no-such-user")
+    assert ("danger", "❌ Payer not found") in _flashes(client)
+    add_expense(client, ids, description="Lunch", idempotency_key="k2")
+    assert [e.description for e in load_group(group_file(username)).expenses] == ["Lunch"]
@@ -0,0 +1,101 @@
+# test_live.py - Live update deltas replayed over the /events stream
+import json
+
+import pytest
+
+from config import TestingConfig
+from app import group_file
+from conftest import add_expense, login
+from storage import load_group
+
+
+class Live(TestingConfig):
+    LIVE_UPDATES = True
+    LIVE_HEARTBEAT = 0.05
+
+
+@pytest.fixture(scope="module")
+def live_app():
+    from app import create_app
+    return create_app(Live)
+
+
+def _events_since(client, last_id):
+    """Return the (type, data) events the stream replays after `last_id`"""
+    response = client.get("/events", headers={"Last-Event-ID": str(last_id)}, buffered=False)
+    events = []
+    try:
+        for chunk in response.response:
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith(": keep-alive"):
+                break  # the replay is over
+            if chunk.startswith("id:"):
+                _, kind, data = chunk.strip().split("\n")
+                events.append((kind[len("event: "):], json.loads(data[len("data: "):])))
+    finally:
+        response.close()
+    return events
+
+
+def _latest(live_app):
+    return live_app.extensions["event_hub"].log.latest_id()
+
+
+def test_deltas_carry_only_changed_rows(live_app):
+    client = live_app.test_client()
+    _, (bob, cara, dan) = login(client, members=("Bob", "Cara", "Dan"))
+    add_expense(client, [bob, cara], description="Dinner", amount="90")
+
+    mark = _latest(live_app)
+    add_expense(client, [dan, cara], description="Taxi", amount="20")
+    events = dict(_events_since(client, mark))
+    assert events["expense"]["description"] == "Taxi"
+    assert sorted(events["balances"]["user_id"]) == sorted([cara, dan])  # Bob's balance did not move
+    settlements = events["settlements"]
+    assert (settlements["from_id"], settlements["to_id"], settlements["amount"]) == ([cara], [dan], [10.0])
+    assert settlements["removed_from"] == []
+
+
+def test_renaming_a_member_resends_their_rows(live_app):
+    client = live_app.test_client()
+    _, (bob, cara) = login(client)
+    add_expense(client, [bob, cara], description="Dinner", amount="90")
+
+    mark = _latest(live_app)
+    client.post(f"/edit-user/{bob}", data={"name": "Robert"})
+    events = dict(_events_since(client, mark))
+    assert "expense" not in events and "totals" not in events
+    assert events["balances"]["name"] == ["Robert"]
+    assert events["settlements"]["to"] == ["Robert"]
+
+
+def test_settling_up_removes_the_row(live_app):
+    client = live_app.test_client()
+    _, (bob, cara) = login(client)
+    add_expense(client, [bob, cara], description="Dinner", amount="90")
+
+    mark = _latest(live_app)
+    client.post(f"/settle-full/{cara}/{bob}/45.0")
+    events = dict(_events_since(client, mark))
+    assert events["settlements"]["amount"] == []
+    assert (events["settlements"]["removed_from"], events["settlements"]["removed_to"]) == ([cara], [bob])
+
+
+def test_events_name_their_group(live_app):
+    client = live_app.test_client()
+    username, (bob, cara) = login(client)
+    add_expense(client, [bob, cara], description="Default dinner")
+    client.post("/create-group", data={"name": "Trip"})  # and switch to it
+    trip = load_group(group_file(username)).active_group
+    assert trip
+
+    mark = _latest(live_app)
+    add_expense(client, [bob, cara], description="Trip taxi")
+    assert {data["group_id"] for _, data in _events_since(client, mark)} == {trip}
+    assert f'data-live-group="{trip}"' in client.get("/dashboard").get_data(as_text=True)
+
+    client.get("/switch-group/default")
+    mark = _latest(live_app)
+    add_expense(client, [bob, cara], description="Back home")
+    assert {data["group_id"] for _, data in _events_since(client, mark)} == {"default"}
+    assert 'data-live-group="default"' in client.get("/dashboard").get_data(as_text=True)
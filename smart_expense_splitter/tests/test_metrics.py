@@ -0,0 +1,68 @@
+# test_metrics.py - Access to /metrics and what it exposes
+import os
+import sys
+import json
+import time
+import subprocess
+
+from metrics import REGISTRY, REQUEST_LATENCY
+from pagecache import PAGE_CACHE_REQUESTS
+
+REMOTE = {"REMOTE_ADDR": "203.0.113.5"}
+
+
+def test_metrics_without_token_only_answer_this_host(client, user):
+    username, _ = user
+    assert client.get("/metrics", environ_base=REMOTE).status_code == 404
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "loaded_partition_objects_bucket" in body
+    assert username not in body
+
+
+def test_metrics_token_is_required_when_set(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", environ_base=REMOTE, headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+
+
+def _add_worker(app, pid, snapshot):
+    snapshots = app.extensions["metrics"]
+    snapshots.publish()  # creates the table
+    with snapshots.store.transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO metric_snapshots (pid, updated, data) VALUES (?, ?, ?)",
+                     (pid, time.time(), json.dumps(snapshot)))
+
+
+def test_scrapes_sum_every_worker(app, client):
+    other = {"page_cache_requests_total": [[["other-worker"], 3]]}
+    _add_worker(app, os.getppid(), other)  # a live process standing in for another worker
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'page_cache_requests_total{result="other-worker"} 3' in body
+
+    REGISTRY.clear()
+    PAGE_CACHE_REQUESTS.inc("other-worker", amount=2)
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'page_cache_requests_total{result="other-worker"} 5' in body
+
+
+def test_exited_workers_are_folded_into_one_row(app, client):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    _add_worker(app, exited.pid, {"page_cache_requests_total": [[["exited-worker"], 4]]})
+
+    for _ in range(2):  # the total survives the fold and is not counted twice
+        body = client.get("/metrics").get_data(as_text=True)
+        assert 'page_cache_requests_total{result="exited-worker"} 4' in body
+    with app.extensions["metrics"].store.transaction() as conn:
+        assert conn.execute("SELECT 1 FROM metric_snapshots WHERE pid = ?", (exited.pid,)).fetchone() is None
+
+
+def test_histograms_merge_bucket_counts():
+    buckets = len(REQUEST_LATENCY.buckets) + 1
+    one = {"http_request_duration_seconds": [[["GET", "/x", "200"], [[1] + [0] * (buckets - 1), 0.0005]]]}
+    two = {"http_request_duration_seconds": [[["GET", "/x", "200"], [[0, 2] + [0] * (buckets - 2), 0.004]]]}
+    body = REGISTRY.render(REGISTRY.merge([one, two]))
+    assert 'http_request_duration_seconds_count{method="GET",route="/x",status="200"} 3' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/x",status="200",le="0.001"} 1' in body
@@ -0,0 +1,59 @@
+# test_near_duplicates.py - The near-duplicate review reuses its scan until the group changes
+import os
+import sys
+import subprocess
+
+import pytest
+
+import indexes
+from app import group_file
+from storage import load_group
+from conftest import add_expense
+
+
+def test_scan_is_cached_per_segment_version(client, user, monkeypatch):
+    _, ids = user
+    add_expense(client, ids, description="Dinner at Luigi's pizzeria", amount="90", date="2024-03-01")
+    add_expense(client, ids, description="Dinner at Luigis pizzeria", amount="91", date="2024-03-02")
+
+    scans = []
+    real = indexes.find_near_duplicates
+    monkeypatch.setattr(indexes, "find_near_duplicates", lambda *a, **kw: scans.append(1) or real(*a, **kw))
+
+    first = client.get("/near-duplicates").get_data(as_text=True)
+    second = client.get("/near-duplicates").get_data(as_text=True)
+    assert len(scans) == 1
+    assert "Luigis pizzeria" in first and "Luigis pizzeria" in second
+
+    add_expense(client, ids, description="Taxi to the airport", amount="40", date="2024-03-05")
+    client.get("/near-duplicates")
+    assert len(scans) == 2  # the save changed the segment
+
+
+def test_large_partitions_are_scanned_in_the_background(app, client, user, monkeypatch):
+    username, ids = user
+    add_expense(client, ids, description="Dinner at Luigi's pizzeria", amount="90", date="2024-03-01")
+    add_expense(client, ids, description="Dinner at Luigis pizzeria", amount="91", date="2024-03-02")
+    monkeypatch.setitem(app.config, "NEAR_DUPLICATE_INLINE_LIMIT", 0)
+
+    first = client.get("/near-duplicates").get_data(as_text=True)
+    assert "fresh scan is running" in first and "Luigis pizzeria" not in first
+
+    indexes._near_duplicate_executor.submit(lambda: None).result()  # wait for the queued scan
+    second = client.get("/near-duplicates").get_data(as_text=True)
+    assert "fresh scan is running" not in second and "Luigis pizzeria" in second
+    assert os.path.exists(load_group(group_file(username)).segment_path + ".near")
+
+
+def test_page_reads_the_batch_job_result(app, client, user, monkeypatch):
+    username, ids = user
+    add_expense(client, ids, description="Dinner at Luigi's pizzeria", amount="90", date="2024-03-01")
+    add_expense(client, ids, description="Dinner at Luigis pizzeria", amount="91", date="2024-03-02")
+
+    script = os.path.join(os.path.dirname(indexes.__file__), "near_duplicates.py")
+    done = subprocess.run([sys.executable, script, group_file(username)], capture_output=True, text=True)
+    assert done.returncode == 0 and "default: 1 near-duplicate pairs saved" in done.stdout
+
+    indexes._near_duplicate_cache.clear()
+    monkeypatch.setattr(indexes, "find_near_duplicates", lambda *a, **kw: pytest.fail("page rescanned"))
+    assert "Luigis pizzeria" in client.get("/near-duplicates").get_data(as_text=True)
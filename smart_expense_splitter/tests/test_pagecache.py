@@ -0,0 +1,66 @@
+# test_pagecache.py - Read-only pages revalidate with 304s and are reused until the data changes
+import pagecache
+from pagecache import PageCache
+from conftest import add_expense
+
+
+def test_matching_etag_is_answered_with_304(client, user):
+    first = client.get("/dashboard")
+    assert first.status_code == 200 and first.headers["ETag"].startswith('W/"')
+
+    again = client.get("/dashboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.get_data() == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_pending_flashes_bypass_the_cache(client, user):
+    client.get("/dashboard")  # cached without any message
+    with client.session_transaction() as session:
+        session["_flashes"] = [("success", "✅ Something happened")]
+
+    page = client.get("/dashboard")
+    assert "Something happened" in page.get_data(as_text=True)
+    assert "ETag" not in page.headers
+    assert "Something happened" not in client.get("/dashboard").get_data(as_text=True)
+
+
+def test_saves_change_the_etag(client, user):
+    _, ids = user
+    add_expense(client, ids, description="Dinner", amount="90")
+    client.get("/dashboard")  # consume the flash
+    before = client.get("/dashboard")
+
+    add_expense(client, ids, description="Museum tickets", amount="30")
+    client.get("/dashboard")
+    after = client.get("/dashboard", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200 and after.headers["ETag"] != before.headers["ETag"]
+    assert "Museum tickets" in after.get_data(as_text=True)
+
+
+def test_cached_pages_are_reused(app, client, user, monkeypatch):
+    client.get("/dashboard")
+    hits = []
+    monkeypatch.setattr(pagecache.PAGE_CACHE_REQUESTS, "inc", lambda result: hits.append(result))
+    assert client.get("/dashboard").status_code == 200
+    assert hits == ["hit"]
+
+
+def test_cache_evicts_least_recently_used_entries():
+    cache = PageCache(max_entries=2, max_bytes=1024)
+    cache.put("a", b"1", "text/html")
+    cache.put("b", b"2", "text/html")
+    cache.get("a")
+    cache.put("c", b"3", "text/html")
+    assert cache.get("b") is None
+    assert cache.get("a") == (b"1", "text/html") and cache.get("c") == (b"3", "text/html")
+
+
+def test_cache_stays_within_its_byte_budget():
+    cache = PageCache(max_entries=10, max_bytes=10)
+    cache.put("a", b"x" * 4, "text/html")
+    cache.put("b", b"x" * 4, "text/html")
+    cache.put("c", b"x" * 4, "text/html")
+    assert cache.get("a") is None and cache._bytes == 8
+
+    cache.put("huge", b"x" * 11, "text/html")  # larger than the whole budget: never stored
+    assert cache.get("huge") is None and cache.get("b") is not None
@@ -0,0 +1,127 @@
+# test_partitions.py - Partitioned storage, its cached indexes and concurrent writers
+import json
+import os
+import threading
+
+import indexes
+from app import group_file
+from conftest import add_expense, login
+from models import Expense, Group, User
+from storage import TenantLock, load_group, save_group, segment_path, user_in_other_partitions
+
+
+def _legacy_file(tmp_path):
+    bob, cara = User("Bob"), User("Cara")
+    path = str(tmp_path / "expenses_legacy.json")
+    row = {"id": "e1", "description": "Dinner", "amount": 90.0, "payer_id": bob.id,
+           "participants": [bob.id, cara.id], "date": "2024-03-01"}
+    with open(path, "w") as f:
+        json.dump({"name": "Old", "users": [{"id": u.id, "name": u.name} for u in (bob, cara)],
+                   "expenses": [row]}, f)
+    return path
+
+
+def test_legacy_header_rows_move_to_the_default_segment(tmp_path):
+    path = _legacy_file(tmp_path)
+    group = load_group(path)
+    assert group.loaded_partition is None and [e.id for e in group.expenses] == ["e1"]
+    assert not os.path.exists(segment_path(path))
+
+    save_group(group, path)
+    with open(path) as f:
+        assert "expenses" not in json.load(f)
+    with open(segment_path(path)) as f:
+        assert [row["id"] for row in json.load(f)["expenses"]] == ["e1"]
+    assert [e.id for e in load_group(path).expenses] == ["e1"]
+
+
+def test_switching_groups_shows_only_their_expenses(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Home rent")
+    client.post("/create-group", data={"name": "Trip"})  # becomes the active group
+    add_expense(client, ids, description="Trip taxi")
+    trip = load_group(group_file(username)).active_group
+
+    page = client.get("/dashboard").get_data(as_text=True)
+    assert "Trip taxi" in page and "Home rent" not in page
+    client.get("/switch-group/default")
+    page = client.get("/dashboard").get_data(as_text=True)
+    assert "Home rent" in page and "Trip taxi" not in page
+    assert [e.description for e in load_group(group_file(username), group_id=trip).expenses] == ["Trip taxi"]
+
+
+def test_members_used_in_another_group_cannot_be_deleted(client):
+    username, (bob, cara, dan) = login(client, members=("Bob", "Cara", "Dan"))
+    client.post("/create-group", data={"name": "Trip"})
+    add_expense(client, [dan, cara], description="Trip taxi")
+    client.get("/switch-group/default")
+
+    group = load_group(group_file(username))
+    assert user_in_other_partitions(group, group_file(username), dan)
+    assert not user_in_other_partitions(group, group_file(username), bob)
+    assert "another group" in client.post(f"/delete-user/{dan}").get_data(as_text=True)
+    client.post(f"/delete-user/{bob}")
+    assert [u.name for u in load_group(group_file(username)).users] == ["Cara", "Dan"]
+
+
+def test_index_is_reused_until_the_segment_changes(tmp_path):
+    path = str(tmp_path / "expenses_index.json")
+    group = Group("Index")
+    bob = User("Bob")
+    group.users.append(bob)
+    group.expenses.append(Expense("Lunch", 30, bob, [bob]))
+    save_group(group, path)
+
+    first = indexes.partition_index(load_group(path))
+    assert indexes.partition_index(load_group(path)) is first
+
+    other = load_group(path)  # another writer
+    other.expenses.append(Expense("Dinner", 60, bob, [bob]))
+    save_group(other, path)
+    os.utime(segment_path(path), ns=(1, 1))  # a distinct version even on coarse mtime clocks
+    rebuilt = indexes.partition_index(load_group(path))
+    assert rebuilt is not first and rebuilt.count == 2
+    assert indexes.partition_index(load_group(path), build=True) is rebuilt
+
+
+def test_concurrent_writers_do_not_lose_expenses(app):
+    first = app.test_client()
+    owner, ids = login(first)
+    clients = [app.test_client() for _ in range(6)]  # one per thread, all logged in as `owner`
+    for client in clients:
+        with client.session_transaction() as session:
+            session["username"] = owner
+
+    def writer(client, n):
+        for i in range(5):
+            add_expense(client, ids, description=f"W{n}-{i}", amount=str(10 + i))
+
+    threads = [threading.Thread(target=writer, args=(c, n)) for n, c in enumerate(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    group = load_group(group_file(owner))
+    assert len(group.expenses) == 30
+    index = indexes.partition_index(group)
+    assert index.count == 30 and index.total == sum(float(e.amount) for e in group.expenses)
+    assert len(index.search("w3-")) == 5
+
+
+def test_tenant_lock_excludes_other_threads(tmp_path):
+    path = str(tmp_path / "expenses_lock.json")
+    order = []
+
+    def waiter():
+        with TenantLock(path):
+            order.append("waiter")
+
+    with TenantLock(path):
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()  # blocked while we hold it
+        order.append("holder")
+    thread.join(timeout=2)
+    assert order == ["holder", "waiter"]
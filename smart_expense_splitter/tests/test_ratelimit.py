@@ -0,0 +1,61 @@
+# test_ratelimit.py - Token buckets, their shared backend and client addresses behind a proxy
+import uuid
+
+import pytest
+
+from config import TestingConfig
+from localstore import LocalStore
+from ratelimit import MemoryBackend, SQLiteBackend
+
+
+@pytest.mark.parametrize("make", [MemoryBackend, lambda: SQLiteBackend(LocalStore(f"data/rl-{uuid.uuid4().hex}.db"))])
+def test_bucket_allows_burst_then_refills(make):
+    backend = make()
+    results = [backend.hit("k", 3, 1.0, now=100.0)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+    assert backend.hit("k", 3, 1.0, now=100.5) == (False, pytest.approx(0.5))
+    assert backend.hit("k", 3, 1.0, now=101.0)[0]
+
+
+def test_sqlite_buckets_are_shared_between_instances():
+    path = f"data/rl-{uuid.uuid4().hex}.db"
+    first, second = SQLiteBackend(LocalStore(path)), SQLiteBackend(LocalStore(path))
+    assert first.hit("ip", 1, 0.001, now=10.0)[0]
+    assert not second.hit("ip", 1, 0.001, now=10.0)[0]
+
+
+class BehindProxy(TestingConfig):
+    TRUSTED_PROXY_COUNT = 1
+    RATE_LIMIT_ENABLED = True
+
+
+def _login_attempts(client, ip, count):
+    """Return how many of `count` failed logins from `ip` were let through"""
+    allowed = 0
+    for _ in range(count):
+        response = client.post("/login", data={"username": "nobody", "password": "wrong-password"},
+                               headers={"X-Forwarded-For": ip})
+        allowed += response.status_code == 200  # limited requests redirect
+    return allowed
+
+
+def test_limits_key_on_forwarded_client_address():
+    from app import create_app
+
+    client = create_app(BehindProxy).test_client()
+    first, second = f"10.0.0.{uuid.uuid4().int % 250}", "192.0.2.7"
+    limit = BehindProxy.LOGIN_RATE_LIMIT[0]
+    assert _login_attempts(client, first, limit + 1) == limit
+    assert _login_attempts(client, second, 1) == 1  # another client behind the same proxy
+
+
+class TightLogin(TestingConfig):
+    RATE_LIMIT_ENABLED = True
+    LOGIN_RATE_LIMIT = (2, 3600)
+
+
+def test_limits_come_from_the_app_config():
+    from app import create_app
+
+    assert _login_attempts(create_app(TightLogin).test_client(), "192.0.2.8", 3) == 2
+    assert _login_attempts(create_app(TestingConfig).test_client(), "192.0.2.8", 3) == 3  # limits off
@@ -0,0 +1,46 @@
+# test_receipts.py - Uploaded receipts: conditional and ranged responses, and who may fetch them
+import io
+import re
+
+import pytest
+
+from conftest import add_expense, login
+
+CONTENT = b"%PDF-1.4 receipt " + b"x" * 4000
+
+
+@pytest.fixture
+def receipt_url(client, user):
+    _, ids = user
+    add_expense(client, ids, receipt=(io.BytesIO(CONTENT), "lunch.pdf"))
+    return re.search(r'href="(/receipts/[^"]+)"', client.get("/dashboard").get_data(as_text=True)).group(1)
+
+
+def test_serves_full_ranged_and_conditional(client, receipt_url):
+    full = client.get(receipt_url)
+    assert full.status_code == 200 and full.get_data() == CONTENT
+    assert "immutable" in full.headers["Cache-Control"] and full.headers["ETag"]
+
+    ranged = client.get(receipt_url, headers={"Range": "bytes=0-9"})
+    assert ranged.status_code == 206 and ranged.get_data() == CONTENT[:10]
+
+    cached = client.get(receipt_url, headers={"If-None-Match": full.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_other_users_cannot_fetch_it(app, client, receipt_url):
+    other = app.test_client()
+    login(other)
+    assert other.get(receipt_url).status_code == 404
+    assert client.get(receipt_url.replace("/receipts/", "/static/receipts/")).status_code == 404
+
+
+def test_legacy_receipts_leave_static(tmp_path):
+    from app import move_legacy_receipts
+
+    legacy, uploads = tmp_path / "static" / "receipts", tmp_path / "uploads"
+    legacy.mkdir(parents=True)
+    (legacy / "receipt_old.png").write_bytes(b"png")
+    move_legacy_receipts(str(legacy), str(uploads))
+    assert not (legacy / "receipt_old.png").exists()
+    assert (uploads / "receipt_old.png").read_bytes() == b"png"
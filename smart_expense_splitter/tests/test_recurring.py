@@ -0,0 +1,64 @@
+# test_recurring.py - Recurring templates and the background scheduler
+import uuid
+
+import storage
+from app import group_file
+from localstore import LocalStore
+from conftest import add_expense
+from scheduler import RecurringScheduler, advance_date, materialize_group
+from storage import load_group, save_group
+
+
+def test_advance_date_clamps_to_month_end():
+    assert advance_date("2024-01-31", "monthly") == "2024-02-29"
+    assert advance_date("2024-02-29", "monthly", anchor_day=31) == "2024-03-31"
+
+
+def test_rearming_template_keeps_due_date(client, user):
+    username, ids = user
+    add_expense(client, ids, description="Rent")
+    path = group_file(username)
+    group = load_group(path)
+    template = group.expenses[0]
+    template.date = "2024-07-15"
+    save_group(group, path)
+
+    client.post(f"/add-recurring/{template.id}", data={"recurrence_type": "monthly"})
+    group = load_group(path)
+    materialize_group(group, today="2024-10-20")
+    save_group(group, path)
+    assert group.expenses[0].next_due_date == "2024-11-15"
+
+    # Submitting the form again must not rewind the series
+    client.post(f"/add-recurring/{template.id}", data={"recurrence_type": "monthly"})
+    group = load_group(path)
+    assert group.expenses[0].next_due_date == "2024-11-15"
+    materialize_group(group, today="2024-10-20")
+    dates = sorted(e.date for e in group.expenses if e.recurrence_parent_id == template.id)
+    assert dates == ["2024-08-15", "2024-09-15", "2024-10-15"]
+
+
+def test_new_templates_reach_the_runner_without_a_rescan(app, client, user, monkeypatch):
+    username, ids = user
+    path = group_file(username)
+    store = LocalStore(f"data/recurring-{uuid.uuid4().hex}.db")
+    # This worker only queues; the runner is another process sharing the host-local store
+    monkeypatch.setitem(app.config, "RECURRING_SCHEDULER_ENABLED", True)
+    monkeypatch.setitem(app.extensions, "recurring_scheduler", RecurringScheduler("data", store=store))
+    runner = RecurringScheduler("data", store=store)
+    runner.scan()
+
+    add_expense(client, ids, description="Gym")
+    group = load_group(path)
+    group.expenses[0].date = "2024-01-01"
+    save_group(group, path)
+    client.post(f"/add-recurring/{group.expenses[0].id}", data={"recurrence_type": "weekly"})
+
+    loads = []
+    real = storage.load_group
+    monkeypatch.setattr(storage, "load_group", lambda *a, **kw: loads.append(a[0]) or real(*a, **kw))
+    assert runner.drain() == 1
+    assert runner.run_once(today="2024-01-05") == 0 and loads == []  # nothing due yet: no file is read
+    assert runner.run_once(today="2024-01-20") >= 2
+    assert loads == [path]
+    assert any(e.recurrence_parent_id for e in load_group(path).expenses)
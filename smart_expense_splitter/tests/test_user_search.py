@@ -0,0 +1,53 @@
+# test_user_search.py - Member name prefix search and the picker's API
+from conftest import login
+from indexes import UserNameIndex
+from models import User
+
+
+def _names(matches):
+    return [name for _, name in matches]
+
+
+def test_any_word_of_a_name_matches():
+    index = UserNameIndex([User("John Smith"), User("Smita Rao"), User("Asha")])
+    assert _names(index.search("smi")) == ["John Smith", "Smita Rao"]
+    assert _names(index.search("john s")) == ["John Smith"]
+    assert index.search("xyz") == []
+
+
+def test_search_is_casefolded():
+    index = UserNameIndex([User("STRASSE Müller"), User("Ärzte Ölsen")])
+    assert _names(index.search("straße")) == ["STRASSE Müller"]
+    assert _names(index.search("  ÄRZ ")) == ["Ärzte Ölsen"]
+
+
+def test_limit_and_empty_query():
+    users = [User(f"Member {i:02d}") for i in range(20)]
+    index = UserNameIndex(users)
+    assert len(index.search("member", limit=5)) == 5
+    assert len(index.search("", limit=7)) == 7  # an empty query lists members for the picker
+    assert len(index.search("member", limit=50)) == 20
+
+
+def test_api_shape_and_limit(app, client):
+    _, ids = login(client, members=("John Smith", "Jane Smithers", "Bob"))
+    data = client.get("/api/users/search?q=smi").get_json()
+    assert data["name"] == ["Jane Smithers", "John Smith"]
+    assert set(data["id"]) == set(ids[:2])
+
+    assert len(client.get("/api/users/search?q=&limit=2").get_json()["id"]) == 2
+    limit = app.config["USER_SEARCH_LIMIT"]
+    assert client.get(f"/api/users/search?q=&limit={limit + 100}").status_code == 200
+    assert client.get("/api/users/search?q=zz").get_json() == {"version": 1, "id": [], "name": []}
+
+
+def test_api_sees_added_and_renamed_members(client):
+    _, (bob, _) = login(client)
+    assert client.get("/api/users/search?q=dan").get_json()["name"] == []
+
+    client.post("/add-user", data={"name": "Dana"})
+    assert client.get("/api/users/search?q=dan").get_json()["name"] == ["Dana"]
+
+    client.post(f"/edit-user/{bob}", data={"name": "Robert"})
+    assert client.get("/api/users/search?q=bob").get_json()["name"] == []
+    assert client.get("/api/users/search?q=rob").get_json()["name"] == ["Robert"]
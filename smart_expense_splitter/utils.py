@@ -2,10 +2,12 @@
 import os
 import csv
 import logging
+from collections import OrderedDict
+from functools import wraps
 from datetime import datetime
 from decimal import Decimal
 from io import StringIO, BytesIO
-from hashlib import md5
+from hashlib import md5, sha256
 
 logger = logging.getLogger(__name__)
 
@@ -156,10 +158,30 @@ def get_user_share(group, user_id):
     
     return total
 
+def synchronized(method):
+    """Run a method while holding its instance's `lock` (for indexes shared across threads)"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def normalize_description(description):
+    """Normalize a description for duplicate matching (case and whitespace)"""
+    return " ".join((description or "").lower().split())
+
+def amount_bucket(amount, threshold=0.01):
+    """Map an amount to a bucket of width `threshold`.
+
+    Two amounts within `threshold` of each other always fall in the same or
+    an adjacent bucket, so probing bucket-1..bucket+1 finds every match.
+    """
+    return int(Decimal(str(amount)) // Decimal(str(threshold)))
+
 def is_duplicate_expense(expense1, expense2, threshold=0.01):
     """Check if two expenses are likely duplicates"""
     # Same description and amount within threshold
-    if expense1.description.lower() != expense2.description.lower():
+    if normalize_description(expense1.description) != normalize_description(expense2.description):
         return False
     
     diff = abs(Decimal(str(expense1.amount)) - Decimal(str(expense2.amount)))
@@ -171,11 +193,41 @@ def validate_email(email):
         raise ValidationError("Invalid email format")
     return email.strip().lower()
 
-def generate_expense_hash(expense):
-    """Generate a hash for duplicate detection"""
-    key = f"{expense.description}{expense.amount}{expense.payer.id}"
+def generate_expense_hash(expense, threshold=0.01, bucket=None):
+    """Generate a hash for duplicate detection.
+
+    The key is the normalized description, the amount bucket and the payer.
+    Pass `bucket` explicitly to probe a neighbouring amount bucket.
+    """
+    if bucket is None:
+        bucket = amount_bucket(expense.amount, threshold)
+    key = f"{normalize_description(expense.description)}|{bucket}|{expense.payer.id}"
     return md5(key.encode()).hexdigest()
 
+# path -> (mtime_ns, size, digest), so unchanged files are hashed only once
+# path -> (mtime_ns, size, digest), least recently used first
+_file_hash_cache = OrderedDict()
+_FILE_HASH_CACHE_SIZE = 4096
+
+def file_content_hash(path, chunk_size=64 * 1024):
+    """Return a sha256 hex digest of a file's content, cached by mtime and size"""
+    stat = os.stat(path)
+    cached = _file_hash_cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        _file_hash_cache.move_to_end(path)
+        return cached[2]
+
+    digest = sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    _file_hash_cache[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    _file_hash_cache.move_to_end(path)
+    while len(_file_hash_cache) > _FILE_HASH_CACHE_SIZE:
+        _file_hash_cache.popitem(last=False)
+    return _file_hash_cache[path][2]
+
 def format_date(date_string):
     """Format date string for display"""
     try:
@@ -0,0 +1,79 @@
+# warmup.py - Warm caches in the gunicorn master so forked workers share them
+import os
+import gc
+import glob
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def precompile_templates(app):
+    """Compile every Jinja template into the environment's cache; return the count"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def _tenant_files(header_path):
+    root, _ = os.path.splitext(header_path)
+    return [header_path] + glob.glob(os.path.join(f"{root}.groups", "*.json"))
+
+
+def hottest_tenants(data_folder, limit):
+    """Return the `limit` tenant files with the most data on disk, largest first"""
+    sizes = []
+    for path in glob.glob(os.path.join(data_folder, "expenses_*.json")):
+        try:
+            sizes.append((sum(os.path.getsize(f) for f in _tenant_files(path)), path))
+        except OSError:
+            continue
+    return [path for _, path in sorted(sizes, reverse=True)[:limit]]
+
+
+def preload_tenants(paths):
+    """Parse the tenants' files into the storage snapshot and build their indexes"""
+    from storage import preload, load_group
+    from indexes import partition_index
+
+    files = 0
+    for path in paths:
+        files += preload(_tenant_files(path))
+        try:
+            partition_index(load_group(path))
+        except Exception as e:
+            logger.warning("Could not warm index for %s: %s", path, e)
+    return files
+
+
+def warm(app):
+    """Warm templates and the hottest tenants, then freeze the heap for copy-on-write"""
+    start = time.perf_counter()
+    templates = precompile_templates(app)
+    count = app.config["WARMUP_TENANTS"]
+    tenants = hottest_tenants(app.config["DATA_FOLDER"], count) if count else []
+    files = preload_tenants(tenants)
+
+    # Objects that exist now are never scanned by the collector again, so
+    # workers do not dirty (and copy) the pages they share with the master.
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    logger.info("Warm-up: %d templates, %d tenants (%d files) in %.0fms",
+                templates, len(tenants), files, (time.perf_counter() - start) * 1000)
+
+
+def after_fork(app):
+    """Re-create per-process state in a freshly forked worker"""
+    from metrics import REGISTRY
+
+    recurring_scheduler = app.extensions["recurring_scheduler"]
+    # The master's warm-up timings would otherwise be counted once per worker
+    REGISTRY.clear()
+    # Store connections and the hashing pool re-open themselves when they
+    # see a new pid; threads and their locks have to be reset explicitly.
+    app.extensions["login_telemetry"].after_fork()
+    recurring_scheduler.after_fork()
+    if app.config["RECURRING_SCHEDULER_ENABLED"]:
+        recurring_scheduler.start()